@@ -46,6 +46,38 @@ DATABASES = {
     },
 }
 DATABASES['default']['ATOMIC_REQUESTS'] = True
+# https://docs.djangoproject.com/en/dev/topics/db/multi-db/#using-routers
+DATABASE_ROUTERS = ['puppy_interactions.interactions.sharding.TeamRouter']
+# one database per Slack team (see `interactions.sharding`), named like this
+INTERACTIONS_SHARD_BY_TEAM = env.bool('INTERACTIONS_SHARD_BY_TEAM', default=False)
+INTERACTIONS_SHARD_NAME = env('INTERACTIONS_SHARD_NAME',
+                              default='puppy_interactions.{shard}.db')
+
+# CACHES
+# ------------------------------------------------------------------------------
+# https://docs.djangoproject.com/en/dev/ref/settings/#caches
+RESPONSE_CACHE_TIMEOUT = env.int('INTERACTIONS_RESPONSE_CACHE_TIMEOUT', default=60 * 60)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': ''
+    },
+    # log responses: an LRU-bounded in-process tier in front of a file tier in
+    # /tmp, which outlives the process on a warm Lambda container
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'TIMEOUT': RESPONSE_CACHE_TIMEOUT,
+        'OPTIONS': {'MAX_ENTRIES': 500},
+    },
+    'responses_file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': env('INTERACTIONS_RESPONSE_CACHE_DIR',
+                        default='/tmp/puppy_interactions_cache'),
+        'TIMEOUT': RESPONSE_CACHE_TIMEOUT,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
 
 # URLS
 # ------------------------------------------------------------------------------
@@ -61,6 +93,7 @@ DJANGO_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.sites',
+    'django.contrib.messages',
     'django.contrib.staticfiles',
     # 'django.contrib.humanize', # Handy template tags
     'django.contrib.admin',
@@ -124,11 +157,14 @@ AUTH_PASSWORD_VALIDATORS = [
 # MIDDLEWARE
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#middleware
+# sessions, users and messages are for the admin. they are lazy, so slash commands,
+# which carry no session cookie, never touch their tables
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    # 'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    # 'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -241,3 +277,86 @@ ACCOUNT_ADAPTER = 'puppy_interactions.users.adapters.AccountAdapter'
 
 # Your stuff...
 # ------------------------------------------------------------------------------
+# Slack
+# ------------------------------------------------------------------------------
+# https://api.slack.com/web - a bot token with the `users:read` scope
+SLACK_API_TOKEN = env('SLACK_API_TOKEN', default='')
+SLACK_API_URL = env('SLACK_API_URL', default='https://slack.com/api/')
+# seconds a synced display name is served from the in-process cache
+SLACK_DISPLAY_NAME_TTL = env.int('SLACK_DISPLAY_NAME_TTL', default=60 * 60 * 6)
+
+# Interactions
+# ------------------------------------------------------------------------------
+# seconds a write keeps retrying while SQLite reports "database is locked"; Slack
+# gives up on slash commands after 3
+INTERACTIONS_WRITE_DEADLINE = env.float('INTERACTIONS_WRITE_DEADLINE', default=2.5)
+# pragmas for SQLite on local disk (see `config.settings.server` and
+# `interactions.sqlite`) - https://www.sqlite.org/pragma.html
+INTERACTIONS_SQLITE_PRAGMAS = {
+    # readers don't block the writer, nor the writer readers
+    'journal_mode': 'WAL',
+    # WAL is still durable against application crashes with NORMAL
+    'synchronous': 'NORMAL',
+    'mmap_size': env.int('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024),
+    # negative values are KiB
+    'cache_size': env.int('SQLITE_CACHE_SIZE', default=-64 * 1024),
+    # milliseconds one statement waits on the lock before "database is locked".
+    # a fifth of the write deadline, so `write_transaction` still has time for its
+    # jittered retries before the deadline, and Slack's 3 seconds
+    'busy_timeout': env.int('SQLITE_BUSY_TIMEOUT',
+                            default=int(INTERACTIONS_WRITE_DEADLINE * 1000 / 5)),
+}
+# shared secret for the batch endpoint; it is disabled while empty
+INTERACTIONS_BATCH_TOKEN = env('INTERACTIONS_BATCH_TOKEN', default='')
+# seconds a read API token from `/interactions token` is good for
+INTERACTIONS_API_TOKEN_MAX_AGE = env.int('INTERACTIONS_API_TOKEN_MAX_AGE',
+                                         default=60 * 60 * 24 * 90)
+# seconds a cache in front of the read API may serve a response before
+# revalidating it
+INTERACTIONS_API_MAX_AGE = env.int('INTERACTIONS_API_MAX_AGE', default=60)
+# pair scores (see `PairScore`) halve over this many days
+INTERACTIONS_SCORE_HALF_LIFE_DAYS = env.float('INTERACTIONS_SCORE_HALF_LIFE_DAYS',
+                                              default=30)
+# upload database changes by the page (see `interactions.replication`): STORAGE is
+# '' (off), 'local' (LOCATION is a directory) or 's3' (LOCATION is a bucket)
+INTERACTIONS_REPLICATION = {
+    'STORAGE': env('INTERACTIONS_REPLICATION_STORAGE', default=''),
+    'LOCATION': env('INTERACTIONS_REPLICATION_LOCATION', default=''),
+    'SNAPSHOT_EVERY': env.int('INTERACTIONS_REPLICATION_SNAPSHOT_EVERY', default=100),
+    # 'gzip', 'zstd' (needs zstandard) or 'none'; empty picks zstd when installed
+    'SNAPSHOT_CODEC': env('INTERACTIONS_REPLICATION_SNAPSHOT_CODEC', default=''),
+}
+# opt-in request profiles (see `interactions.profiling`): a request is profiled at
+# SAMPLE_RATE, or when signed with SECRET. MODE is 'cprofile' or 'sample'. profiles
+# are stored like replicas: STORAGE is '' (off), 'local' or 's3'
+INTERACTIONS_PROFILING = {
+    'SAMPLE_RATE': env.float('INTERACTIONS_PROFILING_SAMPLE_RATE', default=0),
+    'SECRET': env('INTERACTIONS_PROFILING_SECRET', default=''),
+    'MODE': env('INTERACTIONS_PROFILING_MODE', default='cprofile'),
+    'STORAGE': env('INTERACTIONS_PROFILING_STORAGE', default=''),
+    'LOCATION': env('INTERACTIONS_PROFILING_LOCATION', default=''),
+}
+# raters whose default logs a warm-up caches, most recently active first
+INTERACTIONS_WARMUP_RATERS = env.int('INTERACTIONS_WARMUP_RATERS', default=10)
+# concurrent `chat.postMessage` calls while sending the weekly digest
+INTERACTIONS_DIGEST_SENDERS = env.int('INTERACTIONS_DIGEST_SENDERS', default=8)
+# cache tiers for `do_logs` results, checked in order
+INTERACTIONS_RESPONSE_CACHES = ['responses', 'responses_file']
+# seconds a write command's response is kept to answer Slack retries
+INTERACTIONS_IDEMPOTENCY_TTL = env.int('INTERACTIONS_IDEMPOTENCY_TTL', default=60 * 5)
+# retries of payloads without a `trigger_id` match within a window of this many
+# seconds, or the one before it
+INTERACTIONS_IDEMPOTENCY_WINDOW = env.int('INTERACTIONS_IDEMPOTENCY_WINDOW', default=60)
+# per-user token buckets: up to `capacity` commands at once, refilled at
+# `per_minute`. point the cache at a store every instance shares
+INTERACTIONS_RATE_LIMIT_CACHE = env('INTERACTIONS_RATE_LIMIT_CACHE', default='default')
+INTERACTIONS_RATE_LIMITS = {
+    'read': {
+        'capacity': env.int('INTERACTIONS_READ_BURST', default=20),
+        'per_minute': env.int('INTERACTIONS_READS_PER_MINUTE', default=20),
+    },
+    'write': {
+        'capacity': env.int('INTERACTIONS_WRITE_BURST', default=10),
+        'per_minute': env.int('INTERACTIONS_WRITES_PER_MINUTE', default=10),
+    },
+}
@@ -21,7 +21,9 @@ CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': ''
-    }
+    },
+    'responses': CACHES['responses'],  # noqa F405
+    'responses_file': CACHES['responses_file'],  # noqa F405
 }
 
 # TEMPLATES
@@ -0,0 +1,60 @@
+"""
+Long-running server mode: a multi-worker WSGI server (see `requirements/server.txt`)
+in front of a SQLite file on local disk, rather than Lambda and s3sqlite.
+
+    DJANGO_SETTINGS_MODULE=config.settings.server gunicorn config.wsgi -w 4
+"""
+
+from .base import *  # noqa
+from .base import env
+
+# GENERAL
+# ------------------------------------------------------------------------------
+# https://docs.djangoproject.com/en/dev/ref/settings/#secret-key
+SECRET_KEY = env('DJANGO_SECRET_KEY')
+# https://docs.djangoproject.com/en/dev/ref/settings/#allowed-hosts
+ALLOWED_HOSTS = env.list('DJANGO_ALLOWED_HOSTS', default=['localhost'])
+
+# DATABASES
+# ------------------------------------------------------------------------------
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': env('SQLITE_PATH', default='puppy_interactions.db'),
+        # https://docs.djangoproject.com/en/dev/ref/databases/#persistent-connections
+        'CONN_MAX_AGE': env.int('CONN_MAX_AGE', default=600),
+        'ATOMIC_REQUESTS': True,
+        # applied to every new connection, see `interactions.sqlite`
+        'PRAGMAS': INTERACTIONS_SQLITE_PRAGMAS,  # noqa F405
+    },
+}
+
+# LOGGING
+# ------------------------------------------------------------------------------
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'verbose': {
+            'format': '%(levelname)s %(asctime)s %(module)s '
+                      '%(process)d %(thread)d %(message)s'
+        },
+    },
+    'handlers': {
+        'console': {
+            'level': 'DEBUG',
+            'class': 'logging.StreamHandler',
+            'formatter': 'verbose',
+        },
+    },
+    'loggers': {
+        'puppy_interactions': {
+            'level': 'INFO',
+            'handlers': ['console'],
+            'propagate': True
+        }
+    }
+}
+
+# Your stuff...
+# ------------------------------------------------------------------------------
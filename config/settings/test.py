@@ -2,6 +2,9 @@
 With these settings, tests run faster.
 """
 
+import os
+import tempfile
+
 from .base import *  # noqa
 from .base import env
 
@@ -20,7 +23,15 @@ TEST_RUNNER = "django.test.runner.DiscoverRunner"
 CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": ""
-    }
+    },
+    "responses": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "responses",
+    },
+    "responses_file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(tempfile.gettempdir(), "puppy_interactions_test_cache"),
+    },
 }
 
 # PASSWORDS
@@ -53,3 +64,8 @@ EMAIL_PORT = 1025
 
 # Your stuff...
 # ------------------------------------------------------------------------------
+# keep throttling out of the way of tests that aren't about it
+INTERACTIONS_RATE_LIMITS = {
+    "read": {"capacity": 10 ** 6, "per_minute": 10 ** 6},
+    "write": {"capacity": 10 ** 6, "per_minute": 10 ** 6},
+}
@@ -4,10 +4,17 @@ from django.contrib import admin
 from django.urls import include, path
 from django.views import defaults as default_views
 
-from puppy_interactions.interactions.views import InteractionView
+from puppy_interactions.interactions.views import (
+    InteractionView, BatchInteractionView, LogsAPIView, TopAPIView, WarmUpView
+)
 
 urlpatterns = [
                   path("", InteractionView.as_view(), name="interactions"),
+                  path("batch/", BatchInteractionView.as_view(),
+                       name="interactions-batch"),
+                  path("warmup/", WarmUpView.as_view(), name="interactions-warmup"),
+                  path("api/logs/", LogsAPIView.as_view(), name="interactions-api-logs"),
+                  path("api/top/", TopAPIView.as_view(), name="interactions-api-top"),
                   # Django Admin, use {% url 'admin:index' %}
                   path(settings.ADMIN_URL, admin.site.urls),
               ] + static(
@@ -10,7 +10,7 @@ from django.db import migrations
 def update_site_forward(apps, schema_editor):
     """Set site domain and name."""
     Site = apps.get_model("sites", "Site")
-    Site.objects.update_or_create(
+    Site.objects.using(schema_editor.connection.alias).update_or_create(
         id=settings.SITE_ID,
         defaults={
             "domain": "pi.starlingiot.com",
@@ -22,7 +22,7 @@ def update_site_forward(apps, schema_editor):
 def update_site_backward(apps, schema_editor):
     """Revert site domain and name to default."""
     Site = apps.get_model("sites", "Site")
-    Site.objects.update_or_create(
+    Site.objects.using(schema_editor.connection.alias).update_or_create(
         id=settings.SITE_ID, defaults={"domain": "example.com", "name": "example.com"}
     )
 
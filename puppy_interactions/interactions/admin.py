@@ -0,0 +1,172 @@
+"""
+admin for tables too large for the defaults. changelists join the people they
+show (`list_select_related`) and never count a whole table: `EstimatedCountPaginator`
+reads the largest rowid instead, and filtered lists count at most
+`COUNT_LIMIT` + 1 rows. person FKs use raw id widgets rather than a select of
+every Person. people are searched through their trigrams (see `search`).
+
+the bulk actions replace `delete_selected`, which loads every object it deletes.
+they run outside the request's transaction, one chunk per transaction (see
+`sqlite.write_transaction`), so the write lock is released between chunks.
+
+with team shards, the "database" filter picks the default database or a recorded
+shard (see `sharding.all_databases`), and every view of the model, its edit and
+delete pages and actions included, is routed there.
+"""
+from math import ceil
+
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count
+from django.http import QueryDict
+from django.utils.decorators import method_decorator
+from django.utils.functional import cached_property
+
+from puppy_interactions.interactions.bulk import LOOKUP_BATCH_SIZE
+from puppy_interactions.interactions.identity import merge_into
+from puppy_interactions.interactions.models import Interaction, Person, PersonTrigram
+from puppy_interactions.interactions.search import FIND_THRESHOLD, trigrams
+from puppy_interactions.interactions.sharding import (
+    all_databases, database_for, use_database
+)
+from puppy_interactions.interactions.sqlite import write_transaction
+from puppy_interactions.interactions.utils import purge_person
+
+COUNT_LIMIT = 1000
+DATABASE_PARAM = "database"
+
+
+def estimated_rows(model, using: str) -> int:
+    """the largest rowid in `model`'s table, which over-counts deleted rows but is
+    read from the end of the table's B-tree rather than by counting"""
+    connection = connections[using]
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT MAX(_rowid_) FROM {table}")
+        return cursor.fetchone()[0] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where and connections[queryset.db].vendor == "sqlite":
+            return estimated_rows(queryset.model, queryset.db)
+        # deeper pages are still reached by filtering further
+        return queryset[:COUNT_LIMIT + 1].count()
+
+
+class DatabaseFilter(admin.SimpleListFilter):
+    """picks the database `ScalableAdmin` routes to; the queryset is already there"""
+    title = "database"
+    parameter_name = DATABASE_PARAM
+
+    def lookups(self, request, model_admin):
+        aliases = all_databases()
+        return [(alias, alias) for alias in aliases] if len(aliases) > 1 else []
+
+    def queryset(self, request, queryset):
+        return queryset
+
+    def choices(self, changelist):
+        current = self.value() or DEFAULT_DB_ALIAS
+        for alias, title in self.lookup_choices:
+            yield {"selected": alias == current, "display": title,
+                   "query_string": changelist.get_query_string(
+                       {self.parameter_name: alias})}
+
+
+def request_database(request) -> str:
+    """the database picked with `DatabaseFilter`, on the changelist or carried
+    from it in `_changelist_filters`"""
+    alias = (request.GET.get(DATABASE_PARAM) or
+             QueryDict(request.GET.get("_changelist_filters", "")).get(DATABASE_PARAM))
+    return database_for(alias)
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # the "(N total)" link would count the whole table
+    show_full_result_count = False
+
+    def get_list_filter(self, request):
+        return [DatabaseFilter, *super().get_list_filter(request)]
+
+    @method_decorator(transaction.non_atomic_requests)
+    def changelist_view(self, request, extra_context=None):
+        with use_database(request_database(request)):
+            return super().changelist_view(request, extra_context)
+
+    def change_view(self, request, object_id, form_url="", extra_context=None):
+        with use_database(request_database(request)):
+            return super().change_view(request, object_id, form_url, extra_context)
+
+    def delete_view(self, request, object_id, extra_context=None):
+        with use_database(request_database(request)):
+            return super().delete_view(request, object_id, extra_context)
+
+    def history_view(self, request, object_id, extra_context=None):
+        with use_database(request_database(request)):
+            return super().history_view(request, object_id, extra_context)
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop("delete_selected", None)
+        return actions
+
+
+@admin.register(Interaction)
+class InteractionAdmin(ScalableAdmin):
+    list_display = ("created", "rater", "ratee", "rating", "conversation")
+    list_select_related = ("rater", "ratee")
+    list_filter = ("rating",)
+    date_hierarchy = "created"
+    ordering = ("-created",)
+    raw_id_fields = ("rater", "ratee")
+    readonly_fields = ("created", "modified")
+
+
+@admin.register(Person)
+class PersonAdmin(ScalableAdmin):
+    list_display = ("user_id", "display_name", "created")
+    search_fields = ("user_id", "display_name")
+    ordering = ("user_id",)
+    readonly_fields = ("normalized_id", "data_version", "created", "modified")
+    actions = ["merge_selected", "purge_selected"]
+
+    def get_search_results(self, request, queryset, search_term):
+        grams = trigrams(search_term)
+        if not grams:
+            return queryset, False
+        matching = (PersonTrigram.objects.filter(trigram__in=grams)
+                    .values("person_id").annotate(hits=Count("trigram"))
+                    .filter(hits__gte=ceil(len(grams) * FIND_THRESHOLD))
+                    .values("person_id"))
+        return queryset.filter(pk__in=matching), False
+
+    def merge_selected(self, request, queryset):
+        people = list(queryset.order_by("created"))
+        if len(people) < 2:
+            self.message_user(request, "Select at least two people to merge.",
+                              messages.WARNING)
+            return
+        # the earliest keyed Slack user: lookups find keyed people, and raw names
+        # usually stand for a Slack user
+        survivor = min(people, key=lambda person: (
+            person.normalized_id is None, not person.user_id.startswith("@")))
+        others = [person for person in people if person.pk != survivor.pk]
+        merged = 0
+        for start in range(0, len(others), LOOKUP_BATCH_SIZE):
+            merged += write_transaction(merge_into, survivor,
+                                        others[start:start + LOOKUP_BATCH_SIZE])
+        self.message_user(request, f"Merged {merged} people into {survivor}.")
+    merge_selected.short_description = "Merge selected people into one"
+
+    def purge_selected(self, request, queryset):
+        people = list(queryset)
+        deleted = sum(purge_person(person) for person in people)
+        self.message_user(request, f"Purged {len(people)} people and their "
+                                   f"{deleted} interactions.")
+    purge_selected.short_description = ("Purge selected people and every "
+                                         "interaction they made or received")
@@ -0,0 +1,116 @@
+"""
+a read-only JSON API over a rater's own logs, for dashboards (see `views`).
+
+callers authenticate with `Authorization: Bearer <token>`, a token the rater gets
+from `/interactions token`: their Person and team (for `sharding`) signed with
+`SECRET_KEY`, good for `INTERACTIONS_API_TOKEN_MAX_AGE` seconds. tokens are signed,
+not encrypted, and only say whom they're for.
+
+every response carries an ETag made from the rater's `data_version`, which every
+write to their interactions bumps, and the day, since results cover the last N
+days. a request whose `If-None-Match` still matches is answered 304 after reading
+just the rater's row by primary key, without computing or serializing anything.
+`Cache-Control` lets a cache in front of the API serve polling for
+`INTERACTIONS_API_MAX_AGE` seconds, and then revalidate; it's kept per token by
+`Vary: Authorization`.
+"""
+import hashlib
+import uuid
+from typing import Iterable, List, Mapping, NamedTuple, Optional
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from puppy_interactions.interactions.models import Interaction, Person
+from puppy_interactions.interactions.utils import LogRecord
+
+SALT = "puppy_interactions.api"
+MAX_DAYS = 365
+MAX_LIMIT = 500
+RATINGS = {"positive": Interaction.POSITIVE, "negative": Interaction.NEGATIVE}
+
+
+class Token(NamedTuple):
+    person: uuid.UUID
+    user_id: str
+    team_id: Optional[str]
+    enterprise_id: Optional[str]
+
+
+def make_token(person: Person, team_id: Optional[str] = None,
+               enterprise_id: Optional[str] = None) -> str:
+    return signing.dumps([person.guid.hex, person.user_id, team_id, enterprise_id],
+                         salt=SALT, compress=True)
+
+
+def read_token(authorization: str) -> Optional[Token]:
+    """the token in an `Authorization` header, or None unless it's one of ours and
+    hasn't expired"""
+    scheme, _, value = authorization.partition(" ")
+    if scheme != "Bearer" or not value:
+        return None
+    try:
+        guid, user_id, team_id, enterprise_id = signing.loads(
+            value, salt=SALT, max_age=settings.INTERACTIONS_API_TOKEN_MAX_AGE)
+        return Token(uuid.UUID(guid), user_id, team_id, enterprise_id)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+
+
+def etag(rater: Person, path: str) -> str:
+    """changes with the rater's interactions, the day and the request's path and
+    query"""
+    day = timezone.now().date().isoformat()
+    digest = hashlib.sha256(
+        f"{rater.guid.hex}:{rater.data_version}:{day}:{path}".encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def cacheable(response, tag: str):
+    response["ETag"] = tag
+    patch_cache_control(response, public=True, must_revalidate=True,
+                        max_age=settings.INTERACTIONS_API_MAX_AGE)
+    patch_vary_headers(response, ["Authorization"])
+    return response
+
+
+def int_param(query: Mapping[str, str], name: str, default: int, low: int,
+              high: int) -> int:
+    value = query.get(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a whole number")
+    if not low <= number <= high:
+        raise ValueError(f"{name} must be from {low} to {high}")
+    return number
+
+
+def choice_param(query: Mapping[str, str], name: str, choices: Iterable[str],
+                 default: Optional[str] = None) -> Optional[str]:
+    value = query.get(name, default)
+    if value is not None and value not in choices:
+        raise ValueError(f"{name} must be one of {', '.join(choices)}")
+    return value
+
+
+def rating_param(query: Mapping[str, str],
+                 default: Optional[str] = None) -> Optional[str]:
+    """`rating=positive|negative`, as `Interaction.POSITIVE` or `NEGATIVE`; "+"
+    would need encoding in a query string"""
+    rating = choice_param(query, "rating", RATINGS, default)
+    return RATINGS.get(rating)
+
+
+def logs_json(logs: List[LogRecord]) -> List[dict]:
+    return [{"name": log.ratee, "rating": log.rating,
+             "created": log.created.isoformat()} for log in logs]
+
+
+def totals_json(totals: dict) -> List[dict]:
+    """aggregates or top people as a list, keeping their order"""
+    return [{"name": str(key), **stats} for key, stats in totals.items()]
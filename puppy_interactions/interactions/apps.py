@@ -1,4 +1,19 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save
+
+
+def index_saved_person(sender, instance, raw=False, using=None, **kwargs):
+    from puppy_interactions.interactions.search import index_people
+    if not raw:
+        index_people([instance], using=using)
+
+
+def prepare_default_database(sender, **kwargs):
+    from puppy_interactions.interactions.replication import prepare
+    prepare(DEFAULT_DB_ALIAS)
 
 
 class InteractionsAppConfig(AppConfig):
@@ -8,4 +23,17 @@ class InteractionsAppConfig(AppConfig):
     verbose_name = "PuPPY Interactions"
 
     def ready(self):
-        pass
+        from puppy_interactions.interactions.profiling import install_recorder
+        from puppy_interactions.interactions.sqlite import configure_connection
+        connection_created.connect(configure_connection,
+                                   dispatch_uid="interactions.configure_connection")
+        connection_created.connect(install_recorder,
+                                   dispatch_uid="interactions.install_recorder")
+        # bulk writes index people themselves, see `search`
+        post_save.connect(index_saved_person, sender=self.get_model("Person"),
+                          dispatch_uid="interactions.index_saved_person")
+        # restore the database from its replica before a request opens it, rather
+        # than on every process start (management commands, shells) - scheduled
+        # jobs and shards prepare theirs in `sharding`
+        request_started.connect(prepare_default_database,
+                                dispatch_uid="interactions.prepare_default_database")
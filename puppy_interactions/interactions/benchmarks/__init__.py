@@ -0,0 +1,91 @@
+"""
+benchmarks, run with `python manage.py benchmark <scenario>`. every scenario works on
+a temporary SQLite database of synthetic data, never the configured one.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+import traceback
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional, Sequence
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections
+
+# scenario name -> module with a `run(stdout, **options)` function
+SCENARIOS = {
+    "sqlite_concurrency":
+        "puppy_interactions.interactions.benchmarks.sqlite_concurrency",
+    "lock_stress": "puppy_interactions.interactions.benchmarks.lock_stress",
+    "top_people": "puppy_interactions.interactions.benchmarks.top_people",
+    "replication": "puppy_interactions.interactions.benchmarks.replication",
+    "snapshot_format": "puppy_interactions.interactions.benchmarks.snapshot_format",
+    "memory": "puppy_interactions.interactions.benchmarks.memory",
+}
+
+BENCHMARK_ALIAS = "benchmark"
+
+
+@contextmanager
+def temporary_database(alias: str = BENCHMARK_ALIAS,
+                       directory: Optional[str] = None) -> Iterator[str]:
+    """register a migrated, empty SQLite database under `alias` for the duration,
+    and yield its file path"""
+    owned = directory is None
+    directory = directory or tempfile.mkdtemp(prefix="puppy_interactions_bench")
+    path = os.path.join(directory, f"{alias}.db")
+    connections.databases[alias] = dict(
+        settings.DATABASES["default"], ENGINE="django.db.backends.sqlite3",
+        NAME=path, PRAGMAS={}, CONN_MAX_AGE=0, ATOMIC_REQUESTS=False, TEST={},
+    )
+    try:
+        call_command("migrate", database=alias, verbosity=0)
+        yield path
+    finally:
+        connections[alias].close()
+        del connections.databases[alias]
+        if hasattr(connections._connections, alias):
+            delattr(connections._connections, alias)
+        if owned:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def use_database_file(path: str, **overrides) -> None:
+    """in a forked worker, point the default database at the SQLite file at `path`"""
+    connections.databases["default"].update(NAME=path, ATOMIC_REQUESTS=False,
+                                            **overrides)
+    # after renaming, since Django won't close a connection to an in-memory database
+    connections.close_all()
+
+
+class WorkerError(Exception):
+    pass
+
+
+def _run_worker(target, queue, args):
+    try:
+        queue.put((True, target(*args)))
+    except BaseException:
+        queue.put((False, traceback.format_exc()))
+    finally:
+        connections.close_all()
+
+
+def run_workers(target: Callable[..., Any], args_list: Sequence[tuple]) -> List[Any]:
+    """run `target(*args)` for each of `args_list` in its own forked process, like
+    the workers of a WSGI server, and return their results in completion order"""
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    processes = [context.Process(target=_run_worker, args=(target, queue, args))
+                 for args in args_list]
+    for process in processes:
+        process.start()
+    outcomes = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+    for ok, result in outcomes:
+        if not ok:
+            raise WorkerError(result)
+    return [result for _, result in outcomes]
@@ -0,0 +1,94 @@
+"""
+writers contending for one SQLite file, with and without `sqlite.write_transaction`
+retrying transactions that lost the race for the write lock.
+
+each worker is a forked process with its own rater that, for a set time, mostly
+creates one interaction at a time and now and then clears its logs. it keeps a ledger
+of the writes that were acknowledged, so afterwards every rater's row count can be
+checked against it: a write is "dropped" when it raised instead of being applied,
+and "lost" when it was acknowledged but its row isn't there.
+"""
+import logging
+import os
+import random
+import shutil
+import time
+
+from django.db import connection, connections, OperationalError
+from django.db.models import Count
+from django.test.utils import override_settings
+
+from puppy_interactions.interactions.benchmarks import (
+    temporary_database, use_database_file, run_workers
+)
+from puppy_interactions.interactions.models import Interaction
+from puppy_interactions.interactions.utils import create_interactions, clear_logs
+
+# a short busy timeout, so contention shows up as lock errors rather than waits
+BUSY_TIMEOUT = 0.05
+CLEAR_RATIO = 0.05
+
+
+def rater_for(num: int) -> str:
+    return f"@W{num:04d}"
+
+
+def worker(path: str, num: int, seconds: float, deadline: float) -> tuple:
+    use_database_file(path, OPTIONS={"timeout": BUSY_TIMEOUT})
+    # give-ups are expected without retries, and counted below
+    logging.disable(logging.WARNING)
+    rng = random.Random(num)
+    rater = rater_for(num)
+    expected = applied = dropped = 0
+    started = time.monotonic()
+    with override_settings(INTERACTIONS_WRITE_DEADLINE=deadline):
+        while time.monotonic() < started + seconds:
+            try:
+                if rng.random() < CLEAR_RATIO:
+                    clear_logs(rater_user_id=rater)
+                    expected = 0
+                else:
+                    create_interactions(rater, (f"@U{rng.randrange(500):06d}", "+"))
+                    expected += 1
+                applied += 1
+            except OperationalError:
+                dropped += 1
+            connection.close()
+    return rater, expected, applied, dropped, time.monotonic() - started
+
+
+def stress(path: str, using: str, workers: int, seconds: float,
+           deadline: float) -> dict:
+    """run `workers` writers for `seconds` against the database file at `path`,
+    which is registered under the `using` alias, and check them against it"""
+    results = run_workers(worker, [(path, num, seconds, deadline)
+                                   for num in range(workers)])
+    expected = {rater: count for rater, count, *_ in results}
+    counts = dict.fromkeys(expected, 0)
+    counts.update(Interaction.objects.using(using)
+                  .filter(rater__user_id__in=list(expected))
+                  .values_list("rater__user_id")
+                  .annotate(count=Count("guid")))
+    return {
+        "applied": sum(result[2] for result in results),
+        "dropped": sum(result[3] for result in results),
+        "lost": sum(abs(expected[rater] - counts[rater]) for rater in expected),
+        "seconds": max(result[4] for result in results),
+    }
+
+
+def run(stdout, seconds: float = 5, workers: int = 4, **options):
+    stdout.write(f"{workers} writers, {seconds}s each, "
+                 f"{BUSY_TIMEOUT * 1000:.0f}ms busy timeout\n")
+    stdout.write(f"{'retry':<10}{'writes/s':>12}{'dropped':>10}{'lost':>8}\n")
+    with temporary_database() as seed_path:
+        connections["benchmark"].close()
+        directory = os.path.dirname(seed_path)
+        for name, deadline in (("none", 0), ("2.5s", 2.5)):
+            path = os.path.join(directory, f"retry-{deadline}.db")
+            shutil.copyfile(seed_path, path)
+            connections["benchmark"].close()
+            connections["benchmark"].settings_dict["NAME"] = path
+            result = stress(path, "benchmark", workers, seconds, deadline)
+            stdout.write(f"{name:<10}{result['applied'] / result['seconds']:>12.1f}"
+                         f"{result['dropped']:>10}{result['lost']:>8}\n")
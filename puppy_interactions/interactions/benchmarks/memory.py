@@ -0,0 +1,198 @@
+"""
+memory per slash command, for sizing the Lambda function, which gets CPU in
+proportion to the memory it's configured with. each command runs through
+`InteractionView` against synthetic databases of increasing size. the report
+shows the peak RSS of the process, the peak of Python allocations (tracemalloc)
+and the `utils.py` lines holding the most memory. it then recommends a memory
+setting: the largest peak RSS with `HEADROOM`, rounded up to `STEP_MB`.
+
+each measurement runs in its own forked worker on its own copy of the database,
+since tracing inflates RSS and `clear` deletes what the next one would read.
+commands are run once as another rater first, so imports and the connection are
+not counted against them.
+"""
+import linecache
+import os
+import re
+import resource
+import shutil
+import sys
+import tracemalloc
+from collections import Counter
+from math import ceil
+from typing import Callable, Dict, List
+
+from django.core.cache import caches
+from django.db import connections
+from django.test import RequestFactory
+
+from puppy_interactions.interactions import utils
+from puppy_interactions.interactions.benchmarks import (
+    BENCHMARK_ALIAS, temporary_database, use_database_file, run_workers
+)
+from puppy_interactions.interactions.benchmarks.synthetic import populate
+from puppy_interactions.interactions.views import InteractionView
+
+# command -> slash command text, run in this order (`clear` empties the rater)
+COMMANDS = {
+    "create": "<@U000001> + Random Guy3 -",
+    "logs": "365",
+    "logs person": "365 person",
+    "logs time": "365 time",
+    "top": "top 50 365",
+    "trend": "trend",
+    "find": "find random",
+    "help": "help",
+    "clear": "clear",
+}
+RATER = "R000000"
+WARM_RATER = "R000001"
+# frames kept per allocation, enough to reach `utils.py` from the SQLite cursor
+TRACE_FRAMES = 100
+TOP_SITES = 5
+HEADROOM = 1.5
+MIN_MB = 128
+STEP_MB = 64
+
+
+def run_command(text: str, user_id: str = RATER) -> None:
+    # cached responses and rate limits would skip the work being measured
+    for cache in caches.all():
+        cache.clear()
+    request = RequestFactory().post("/", data={"user_id": user_id, "text": text})
+    response = InteractionView.as_view()(request)
+    assert response.status_code == 200, response.status_code
+
+
+def _hwm_kb() -> int:
+    with open("/proc/self/status") as status:
+        return int(re.search(r"VmHWM:\s+(\d+)", status.read()).group(1))
+
+
+def peak_rss(func: Callable[[], None]) -> int:
+    """the peak resident set size in bytes while `func` runs. on Linux the peak is
+    reset first, elsewhere it's the peak of the process so far"""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+    func()
+    try:
+        return _hwm_kb() * 1024
+    except (OSError, AttributeError):
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def python_peak(func: Callable[[], None]) -> int:
+    """the peak bytes of Python allocations made while `func` runs"""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def utils_sites(func: Callable[[], None]) -> Counter:
+    """bytes held per `utils.py` line at the largest point `func` reaches when a
+    `utils.py` function returns, with its locals still alive. each allocation is
+    counted against the innermost `utils.py` line it was made under"""
+    filename = utils.__file__
+    state = {"current": 0, "sites": Counter()}
+
+    def on_return(frame, event, arg):
+        if event != "return" or frame.f_code.co_filename != filename:
+            return
+        current = tracemalloc.get_traced_memory()[0]
+        if current <= state["current"]:
+            return
+        sites = Counter()  # type: Counter
+        for trace in tracemalloc.take_snapshot().traces:
+            for frame_ in reversed(trace.traceback):
+                if frame_.filename == filename:
+                    sites[frame_.lineno] += trace.size
+                    break
+        state.update(current=current, sites=sites)
+
+    tracemalloc.start(TRACE_FRAMES)
+    sys.setprofile(on_return)
+    try:
+        func()
+    finally:
+        sys.setprofile(None)
+        tracemalloc.stop()
+    return state["sites"]
+
+
+MEASURES = {"rss": peak_rss, "python": python_peak, "sites": utils_sites}
+
+
+def worker(path: str, measure: str) -> Dict[str, object]:
+    copy = f"{path}.{measure}"
+    shutil.copyfile(path, copy)
+    use_database_file(copy)
+    for text in COMMANDS.values():
+        run_command(text, WARM_RATER)
+    results = {"baseline": peak_rss(lambda: None)}  # type: Dict[str, object]
+    for name, text in COMMANDS.items():
+        results[name] = MEASURES[measure](lambda: run_command(text))
+    connections.close_all()
+    os.remove(copy)
+    return results
+
+
+def recommend_mb(peak_bytes: int) -> int:
+    """a Lambda memory setting for a peak RSS of `peak_bytes`"""
+    mb = peak_bytes * HEADROOM / (1024 * 1024)
+    return max(MIN_MB, ceil(mb / STEP_MB) * STEP_MB)
+
+
+def _mb(value: float) -> str:
+    return f"{value / (1024 * 1024):.1f}"
+
+
+def run(stdout, size: int = 20000, **options):
+    sizes = [size // 4, size // 2, size]
+    results = {}  # type: Dict[int, Dict[str, dict]]
+    sites = Counter()  # type: Counter
+    for count in sizes:
+        with temporary_database() as path:
+            # two raters, so each has about half the interactions: a heavy user
+            populate(using=BENCHMARK_ALIAS, interactions=count, raters=2,
+                     ratees=max(100, count // 20))
+            connections[BENCHMARK_ALIAS].close()
+            results[count] = {measure: run_workers(worker, [(path, measure)])[0]
+                              for measure in ("rss", "python")}
+            if count == size:
+                sites, = run_workers(worker, [(path, "sites")])
+
+    stdout.write("peak RSS / peak Python allocations in MB, by interactions\n")
+    stdout.write(f"{'command':<14}" + "".join(f"{count:>16}" for count in sizes)
+                 + "\n")
+    stdout.write(f"{'(baseline)':<14}" + "".join(
+        f"{_mb(results[count]['rss']['baseline']):>16}" for count in sizes) + "\n")
+    for name in COMMANDS:
+        cells = [f"{_mb(results[count]['rss'][name])} / "
+                 f"{_mb(results[count]['python'][name])}" for count in sizes]
+        stdout.write(f"{name:<14}" + "".join(f"{cell:>16}" for cell in cells) + "\n")
+
+    stdout.write(f"\nutils.py lines holding the most memory, {size} interactions\n")
+    for name in COMMANDS:
+        top = sites[name].most_common(TOP_SITES)  # type: List
+        if not top:
+            continue
+        stdout.write(f"{name}\n")
+        for line, held in top:
+            source = linecache.getline(utils.__file__, line).strip()
+            stdout.write(f"  {held / 1024:>8.1f} KB  utils.py:{line:<5} {source}\n")
+
+    peak = max(results[size]["rss"][name] for name in COMMANDS)
+    worst = max(COMMANDS, key=lambda name: results[size]["rss"][name])
+    growth = max((results[size]["rss"][name] - results[sizes[0]]["rss"][name])
+                 / (size - sizes[0]) * 10000 for name in COMMANDS)
+    stdout.write(f"\nlargest peak RSS: {_mb(peak)} MB ({worst}), growing by up to "
+                 f"{_mb(growth)} MB per 10000 interactions\n")
+    stdout.write(f"recommended Lambda memory_size for {size} interactions: "
+                 f"{recommend_mb(peak)} MB\n")
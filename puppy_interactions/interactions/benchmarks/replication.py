@@ -0,0 +1,40 @@
+"""
+bytes uploaded per write: the whole database file, as `s3sqlite` uploads it, against
+the page deltas (and periodic snapshots) of `interactions.replication`.
+"""
+import random
+import tempfile
+
+from django.test.utils import override_settings
+
+from puppy_interactions.interactions import metrics, replication
+from puppy_interactions.interactions.benchmarks import (
+    BENCHMARK_ALIAS, temporary_database
+)
+from puppy_interactions.interactions.benchmarks.synthetic import populate
+from puppy_interactions.interactions.sharding import use_database
+from puppy_interactions.interactions.utils import create_interactions
+
+WRITES = 200
+
+
+def run(stdout, size: int = 20000, **options):
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as bucket, override_settings(
+            INTERACTIONS_REPLICATION={"STORAGE": "local", "LOCATION": bucket,
+                                      "SNAPSHOT_EVERY": 100}):
+        with temporary_database() as path, use_database(BENCHMARK_ALIAS):
+            populate(using=BENCHMARK_ALIAS, interactions=size)
+            replication.prepare(BENCHMARK_ALIAS)
+            metrics.reset()
+            for _ in range(WRITES):
+                create_interactions(f"@R{rng.randrange(50):06d}",
+                                    (f"@U{rng.randrange(500):06d}", "+"))
+            replication.forget(BENCHMARK_ALIAS)
+    stats = metrics.snapshot("replication.")
+    writes = stats["replication.writes"]
+    stdout.write(f"{size} interactions, {writes} creates, "
+                 f"{stats.get('replication.snapshots', 0)} snapshots\n")
+    stdout.write(f"{'upload':<12}{'bytes/write':>14}\n")
+    stdout.write(f"{'whole file':<12}{stats['replication.file_bytes'] / writes:>14.0f}\n")
+    stdout.write(f"{'pages':<12}{stats['replication.bytes_uploaded'] / writes:>14.0f}\n")
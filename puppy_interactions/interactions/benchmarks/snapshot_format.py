@@ -0,0 +1,59 @@
+"""
+snapshot size and end-to-end sync latency for each snapshot codec: the time to
+upload a snapshot (`Replicator.start`) and to restore the file from it on a cold
+start (`replication.restore`), against a directory bucket, plus the transfer time
+to a real bucket, estimated from the object size at `LINK_MB_PER_S`.
+"""
+import os
+import tempfile
+import time
+
+from django.db import connections
+
+from puppy_interactions.interactions import replication, snapshot
+from puppy_interactions.interactions.benchmarks import (
+    BENCHMARK_ALIAS, temporary_database
+)
+from puppy_interactions.interactions.benchmarks.synthetic import populate
+
+# rough single-stream throughput between Lambda and S3
+LINK_MB_PER_S = 50
+ROUNDS = 3
+
+
+def measure(path: str, codec: str) -> tuple:
+    """(snapshot bytes, upload seconds, restore seconds), best of `ROUNDS`"""
+    uploads, restores = [], []
+    for _ in range(ROUNDS):
+        with tempfile.TemporaryDirectory() as bucket:
+            storage = replication.LocalDirectoryStorage(bucket)
+            replicator = replication.Replicator(path, storage, name="bench.db",
+                                                snapshot_every=100, codec=codec)
+            start = time.perf_counter()
+            replicator.start()
+            uploads.append(time.perf_counter() - start)
+            size = len(storage.get(storage.list("bench.db/snapshots")[-1]))
+
+            copy = os.path.join(bucket, "restored.db")
+            start = time.perf_counter()
+            replication.restore(storage, "bench.db", copy)
+            restores.append(time.perf_counter() - start)
+    return size, min(uploads), min(restores)
+
+
+def run(stdout, size: int = 20000, **options):
+    codecs = ["none", "gzip"] + (["zstd"] if snapshot.zstandard else [])
+    with temporary_database() as path:
+        populate(using=BENCHMARK_ALIAS, interactions=size)
+        connections[BENCHMARK_ALIAS].close()
+        file_size = os.path.getsize(path)
+        stdout.write(f"{size} interactions, {file_size} byte file, transfer "
+                     f"estimated at {LINK_MB_PER_S} MB/s\n")
+        stdout.write(f"{'codec':<8}{'bytes':>12}{'ratio':>8}{'upload ms':>12}"
+                     f"{'restore ms':>12}\n")
+        for codec in codecs:
+            stored, upload, restore = measure(path, codec)
+            transfer = stored / (LINK_MB_PER_S * 1024 * 1024)
+            stdout.write(f"{codec:<8}{stored:>12}{file_size / stored:>8.1f}"
+                         f"{(upload + transfer) * 1000:>12.0f}"
+                         f"{(restore + transfer) * 1000:>12.0f}\n")
@@ -0,0 +1,83 @@
+"""
+concurrent readers and writers against one SQLite file, under the connection settings
+of `config.settings.base` (a new connection per request, rollback journal) and of
+`config.settings.server` (persistent connections and tuned pragmas).
+
+each worker is a forked process, like a WSGI server worker, that repeatedly runs a
+logs query or a create inside a transaction and then closes its connection the way
+Django's `request_finished` handler would for the profile's `CONN_MAX_AGE`.
+"""
+import os
+import random
+import shutil
+import time
+
+from django.conf import settings
+from django.db import connection, connections, transaction, OperationalError
+
+from puppy_interactions.interactions.benchmarks import (
+    temporary_database, use_database_file, run_workers
+)
+from puppy_interactions.interactions.benchmarks.synthetic import populate
+from puppy_interactions.interactions.models import Person
+from puppy_interactions.interactions.utils import retrieve_logs, create_interactions
+
+PROFILES = {
+    "base": {"CONN_MAX_AGE": 0, "PRAGMAS": {}},
+    # the pragmas of `config.settings.server`
+    "server": {"CONN_MAX_AGE": 600, "PRAGMAS": settings.INTERACTIONS_SQLITE_PRAGMAS},
+}
+
+
+def worker(path: str, profile: dict, role: str, seconds: float, seed: int) -> tuple:
+    use_database_file(path, **profile)
+    rng = random.Random(seed)
+    raters = list(Person.objects.filter(user_id__startswith="@R"))
+    ops = errors = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        rater = rng.choice(raters)
+        try:
+            if role == "read":
+                with transaction.atomic():
+                    retrieve_logs(rater, days=30, limit=20)
+            else:
+                create_interactions(rater.user_id, (f"@U{rng.randrange(500):06d}", "+"))
+            ops += 1
+        except OperationalError:
+            errors += 1
+        connection.close_if_unusable_or_obsolete()
+    return role, ops, errors
+
+
+def run_profile(path: str, profile: dict, readers: int, writers: int,
+                seconds: float) -> dict:
+    roles = ["read"] * readers + ["write"] * writers
+    totals = {"read": [0, 0], "write": [0, 0]}
+    for role, ops, errors in run_workers(
+            worker, [(path, profile, role, seconds, num)
+                     for num, role in enumerate(roles)]):
+        totals[role][0] += ops
+        totals[role][1] += errors
+    return {role: (ops / seconds, errors) for role, (ops, errors) in totals.items()}
+
+
+def run(stdout, seconds: float = 5, size: int = 20000, workers: int = 4, **options):
+    with temporary_database() as seed_path:
+        populate(using="benchmark", interactions=size)
+        connections["benchmark"].close()
+
+        # each profile gets a fresh copy, since journal_mode=WAL sticks to the file
+        directory = os.path.dirname(seed_path)
+        readers, writers = workers, max(1, workers // 2)
+        stdout.write(f"{size} interactions, {readers} readers, {writers} writers, "
+                     f"{seconds}s per profile\n")
+        stdout.write(f"{'profile':<10}{'reads/s':>12}{'writes/s':>12}"
+                     f"{'failed':>10}\n")
+        for name, profile in PROFILES.items():
+            path = os.path.join(directory, f"{name}.db")
+            shutil.copyfile(seed_path, path)
+            result = run_profile(path, profile, readers, writers, seconds)
+            stdout.write(f"{name:<10}{result['read'][0]:>12.1f}"
+                         f"{result['write'][0]:>12.1f}"
+                         f"{result['read'][1] + result['write'][1]:>10}\n")
@@ -0,0 +1,54 @@
+import random
+import uuid
+from datetime import timedelta
+from typing import List
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from puppy_interactions.interactions.identity import normalize_user_id
+from puppy_interactions.interactions.models import Interaction, Person
+
+INSERT_BATCH_SIZE = 5000
+
+
+def populate(using: str = "default", interactions: int = 20000, raters: int = 50,
+             ratees: int = 500, days: int = 365, seed: int = 0) -> List[Person]:
+    """fill a database with `interactions` spread over `days` between `raters` Slack
+    users and `ratees` people, a mix of Slack ids and raw names. returns the raters
+
+    rows are inserted directly, since `created` is `auto_now_add` and the ORM won't
+    backdate it"""
+    rng = random.Random(seed)
+    rater_persons = [Person(user_id=f"@R{num:06d}") for num in range(raters)]
+    ratee_persons = [Person(user_id=f"@U{num:06d}" if num % 3 else f"Random Guy{num}")
+                     for num in range(ratees)]
+    for person in rater_persons + ratee_persons:
+        person.normalized_id = normalize_user_id(person.user_id)
+    Person.objects.using(using).bulk_create(rater_persons + ratee_persons)
+
+    connection = connections[using]
+    fields = [Interaction._meta.get_field(name) for name in
+              ("guid", "created", "modified", "conversation", "rater", "ratee",
+               "rating")]
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        connection.ops.quote_name(Interaction._meta.db_table),
+        ", ".join(connection.ops.quote_name(f.column) for f in fields),
+        ", ".join(["%s"] * len(fields)),
+    )
+    now = timezone.now()
+    span = days * 24 * 60 * 60
+
+    def row():
+        created = now - timedelta(seconds=rng.randrange(span))
+        values = (uuid.UUID(int=rng.getrandbits(128)), created, created,
+                  uuid.UUID(int=rng.getrandbits(128)), rng.choice(rater_persons).pk,
+                  rng.choice(ratee_persons).pk,
+                  rng.choice([Interaction.POSITIVE, Interaction.NEGATIVE]))
+        return [f.get_db_prep_save(v, connection) for f, v in zip(fields, values)]
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        for start in range(0, interactions, INSERT_BATCH_SIZE):
+            count = min(INSERT_BATCH_SIZE, interactions - start)
+            cursor.executemany(sql, [row() for num in range(count)])
+    return rater_persons
@@ -0,0 +1,54 @@
+"""
+`/interactions top` for raters with thousands of distinct ratees: counting per ratee
+in the database and picking the top N with a bounded heap (`retrieve_top_people`),
+against loading the per-person aggregate and sorting all of it.
+"""
+import time
+
+from django.db import connections
+
+from puppy_interactions.interactions.benchmarks import (
+    temporary_database, use_database_file, run_workers
+)
+from puppy_interactions.interactions.benchmarks.synthetic import populate
+from puppy_interactions.interactions.models import Interaction, Person
+from puppy_interactions.interactions.utils import (
+    retrieve_aggregated_logs, retrieve_top_people
+)
+
+TOP = 10
+DAYS = 365
+
+
+def sort_everything(rater: Person) -> list:
+    aggregated = retrieve_aggregated_logs(rater, days=DAYS, aggregate="person")
+    return sorted(aggregated.items(), key=lambda item: -item[1]["positive"])[:TOP]
+
+
+def worker(path: str, seconds: float) -> dict:
+    use_database_file(path)
+    rater = Person.objects.get(user_id="@R000000")
+    results = {"ratees": Interaction.objects.filter(rater=rater)
+               .values("ratee").distinct().count()}
+    for name, func in (("heap", lambda: retrieve_top_people(rater, TOP, DAYS)),
+                       ("sort", lambda: sort_everything(rater))):
+        calls = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            func()
+            calls += 1
+        results[name] = (time.perf_counter() - started) / calls * 1000
+    return results
+
+
+def run(stdout, seconds: float = 5, size: int = 20000, **options):
+    with temporary_database() as path:
+        # two raters, so each has met most of the ratees
+        populate(using="benchmark", interactions=size, raters=2,
+                 ratees=max(1000, size // 4))
+        connections["benchmark"].close()
+        results, = run_workers(worker, [(path, seconds / 2)])
+    stdout.write(f"top {TOP} of {results['ratees']} ratees over {DAYS} days\n")
+    stdout.write(f"{'method':<10}{'ms/call':>10}\n")
+    for name in ("heap", "sort"):
+        stdout.write(f"{name:<10}{results[name]:>10.2f}\n")
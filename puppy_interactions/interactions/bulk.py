@@ -0,0 +1,67 @@
+from typing import Any, Dict, Iterable, Iterator, List, Type
+
+from django.db import connections
+from django.db.models import Case, Model, QuerySet, Value, When
+
+# stay under SQLite's limit on query parameters
+LOOKUP_BATCH_SIZE = 500
+# `update_field_by_key` binds each key three times: WHEN, THEN and IN
+UPDATE_BATCH_SIZE = LOOKUP_BATCH_SIZE // 3
+
+
+def update_field_by_key(qs: QuerySet, key_field: str, value_field: str,
+                        values: Dict[Any, Any],
+                        batch_size: int = UPDATE_BATCH_SIZE) -> int:
+    """set `value_field` from a `{key: value}` mapping with a single CASE UPDATE per
+    `batch_size` keys, rather than one UPDATE per row"""
+    keys = list(values)
+    updated = 0
+    for start in range(0, len(keys), batch_size):
+        batch = keys[start:start + batch_size]
+        whens = [When(**{key_field: key}, then=Value(values[key])) for key in batch]
+        updated += qs.filter(**{f"{key_field}__in": batch}).update(
+            **{value_field: Case(*whens, output_field=qs.model._meta.get_field(
+                value_field))}
+        )
+    return updated
+
+
+def copy_rows(model: Type[Model], objs: Iterable[Model], using: str) -> int:
+    """insert model instances into the `using` database exactly as they are, skipping
+    any whose primary key is already there, and return how many were inserted
+
+    unlike `bulk_create`, `auto_now` and `auto_now_add` fields keep their values, so
+    rows can be copied between databases. a row that clashes with another on any
+    other unique column (say, a Person's `user_id` under a different guid) raises
+    `IntegrityError` rather than being dropped"""
+    connection = connections[using]
+    fields = model._meta.concrete_fields
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        connection.ops.quote_name(model._meta.db_table),
+        ", ".join(connection.ops.quote_name(field.column) for field in fields),
+        ", ".join(["%s"] * len(fields)),
+    )
+    existing = model._base_manager.using(using)
+    count = 0
+    with connection.cursor() as cursor:
+        for batch in _batches(objs, LOOKUP_BATCH_SIZE):
+            copied = set(existing.filter(pk__in=[obj.pk for obj in batch])
+                         .values_list("pk", flat=True))
+            rows = [[field.get_db_prep_save(getattr(obj, field.attname), connection)
+                     for field in fields]
+                    for obj in batch if obj.pk not in copied]
+            if rows:
+                cursor.executemany(sql, rows)
+            count += len(rows)
+    return count
+
+
+def _batches(objs: Iterable[Model], size: int) -> Iterator[List[Model]]:
+    batch = []
+    for obj in objs:
+        batch.append(obj)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
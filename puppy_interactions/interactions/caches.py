@@ -0,0 +1,100 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from puppy_interactions.interactions import metrics
+
+
+class DisplayNameCache:
+    """in-process `user_id` -> display name lookups between Slack syncs
+
+    entries are written by `slack.sync_display_names` (or primed from the database
+    with `load`) and expire after `ttl` seconds. lookups never touch the network or
+    the database, so rendering can always afford them."""
+
+    def __init__(self, ttl: Optional[int] = None):
+        self._ttl = ttl
+        self._names = {}  # type: Dict[str, Tuple[str, float]]
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self) -> int:
+        if self._ttl is not None:
+            return self._ttl
+        return settings.SLACK_DISPLAY_NAME_TTL
+
+    def get(self, user_id: str, default: Optional[str] = None) -> Optional[str]:
+        entry = self._names.get(user_id)
+        if entry is None or entry[1] < time.monotonic():
+            return default
+        return entry[0]
+
+    def update(self, names: Dict[str, str]) -> None:
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            self._names.update((user_id, (name, expires))
+                               for user_id, name in names.items() if name)
+
+    def load(self, rows: Iterable[Tuple[str, str]]) -> None:
+        """prime from `(user_id, display_name)` rows, like a `values_list` query"""
+        self.update(dict(rows))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._names.clear()
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+display_names = DisplayNameCache()
+
+
+class ResponseCache:
+    """`do_logs` results cached per rater, across `INTERACTIONS_RESPONSE_CACHES`
+
+    keys include the rater's `data_version`, which every write bumps, so entries
+    never need invalidating - they just stop being asked for. they include the day
+    too, since results cover the last N days and move on at midnight. tiers are checked in
+    order and a hit in a later tier is copied into the earlier ones. hits (per
+    tier) and misses are counted in `metrics` under `response_cache.`"""
+
+    _missing = object()
+
+    @property
+    def tiers(self):
+        return [(alias, caches[alias])
+                for alias in settings.INTERACTIONS_RESPONSE_CACHES]
+
+    @staticmethod
+    def key(rater, *args) -> str:
+        parts = ":".join(str(arg) for arg in args)
+        day = timezone.now().date()
+        return f"logs:{rater.guid.hex}:{rater.data_version}:{day}:{parts}"
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        tiers = self.tiers
+        for num, (alias, cache) in enumerate(tiers):
+            value = cache.get(key, self._missing)
+            if value is not self._missing:
+                metrics.incr(f"response_cache.hit.{alias}")
+                for _, earlier in tiers[:num]:
+                    earlier.set(key, value)
+                return value
+
+        metrics.incr("response_cache.miss")
+        value = compute()
+        for _, cache in tiers:
+            cache.set(key, value)
+        return value
+
+    @staticmethod
+    def stats() -> Dict[str, int]:
+        return metrics.snapshot("response_cache.")
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,142 @@
+import heapq
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import groupby
+from operator import itemgetter
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from puppy_interactions.interactions.models import Interaction
+from puppy_interactions.interactions.sharding import each_database
+from puppy_interactions.interactions.slack import SlackClient
+
+logger = logging.getLogger('puppy_interactions')
+
+DIGEST_DAYS = 7
+DIGEST_TOP_PEOPLE = 3
+# rows fetched from the database at a time while streaming
+DIGEST_CHUNK_SIZE = 2000
+
+
+class Digest(NamedTuple):
+    """one rater's summary of the last `DIGEST_DAYS`, against the period before"""
+    user_id: str
+    total: int
+    positive: int
+    previous_total: int
+    previous_positive: int
+    top: List[Tuple[str, int]]  # (ratee, interactions), most first
+
+    @property
+    def positive_ratio(self) -> float:
+        return self.positive / self.total if self.total else 0.0
+
+
+def _summarize(rows: Iterable[tuple], current_since: datetime, top: int) -> Digest:
+    total = positive = previous_total = previous_positive = 0
+    people = Counter()  # type: Counter
+    for _, user_id, ratee_user_id, ratee_display_name, rating, created in rows:
+        is_positive = rating == Interaction.POSITIVE
+        if created >= current_since:
+            total += 1
+            positive += is_positive
+            people[ratee_display_name or ratee_user_id] += 1
+        else:
+            previous_total += 1
+            previous_positive += is_positive
+    most = heapq.nsmallest(top, people.items(), key=lambda item: (-item[1], item[0]))
+    return Digest(user_id, total, positive, previous_total, previous_positive, most)
+
+
+def iter_digests(now: Optional[datetime] = None, days: int = DIGEST_DAYS,
+                 top: int = DIGEST_TOP_PEOPLE) -> Iterator[Digest]:
+    """yield a Digest for every rater with interactions in the last `days`
+
+    both periods are read with a single query ordered by rater and summarized as
+    the rows stream past, so only one rater is held in memory at a time and the
+    query count doesn't grow with the number of raters"""
+    now = now or timezone.now()
+    current_since = now - timedelta(days=days)
+    rows = (Interaction.objects
+            .filter(created__gte=now - timedelta(days=days * 2), created__lt=now)
+            .order_by("rater_id")
+            .values_list("rater_id", "rater__user_id", "ratee__user_id",
+                         "ratee__display_name", "rating", "created")
+            .iterator(chunk_size=DIGEST_CHUNK_SIZE))
+    for _, rater_rows in groupby(rows, key=itemgetter(0)):
+        digest = _summarize(rater_rows, current_since, top)
+        if digest.total:
+            yield digest
+
+
+def iter_all_digests(now: Optional[datetime] = None, days: int = DIGEST_DAYS,
+                     top: int = DIGEST_TOP_PEOPLE) -> Iterator[Digest]:
+    """`iter_digests` of the default database and then of every shard (see
+    `sharding.each_database`)"""
+    for _ in each_database():
+        yield from iter_digests(now, days, top)
+
+
+def render_digest(digest: Digest) -> str:
+    """the digest as a Slack message"""
+    change = digest.total - digest.previous_total
+    if change > 0:
+        trend = f"up {change} from"
+    elif change < 0:
+        trend = f"down {-change} from"
+    else:
+        trend = "the same as"
+    lines = [f"This week you logged *{digest.total}* interactions, {trend} the week "
+             f"before. *{digest.positive_ratio:.0%}* were positive."]
+    if digest.top:
+        people = ", ".join(f"{name} ({count})" for name, count in digest.top)
+        lines.append(f"Most often with: {people}")
+    return "\n".join(lines)
+
+
+def send_digests(digests: Iterable[Digest], client: Optional[SlackClient] = None,
+                 workers: Optional[int] = None) -> Tuple[int, int]:
+    """post each digest to its rater with `chat.postMessage`, `workers` at a time
+    (`INTERACTIONS_DIGEST_SENDERS` by default), and return `(sent, failed)`
+
+    at most twice `workers` digests are waiting to be sent at once, so a slow
+    Slack holds back reading more of `digests` rather than filling memory"""
+    client = client or SlackClient()
+    workers = workers or settings.INTERACTIONS_DIGEST_SENDERS
+    slots = threading.BoundedSemaphore(workers * 2)
+    outcomes = Counter()  # type: Counter
+    lock = threading.Lock()
+
+    def send(digest: Digest):
+        try:
+            client.call("chat.postMessage", channel=digest.user_id.lstrip("@"),
+                        text=render_digest(digest))
+            outcome = "sent"
+        except Exception as e:
+            logger.warning(f"Weekly digest for {digest.user_id} failed: {e}")
+            outcome = "failed"
+        finally:
+            slots.release()
+        with lock:
+            outcomes[outcome] += 1
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for digest in digests:
+            slots.acquire()
+            executor.submit(send, digest)
+    logger.info(f"Sent {outcomes['sent']} weekly digests, {outcomes['failed']} failed.")
+    return outcomes["sent"], outcomes["failed"]
+
+
+def send_weekly_digest(client: Optional[SlackClient] = None) -> Tuple[int, int]:
+    return send_digests(iter_all_digests(), client=client)
+
+
+def scheduled_digest(event=None, context=None) -> Tuple[int, int]:
+    """entry point for a Zappa scheduled event, see `zappa_settings.json` `events`"""
+    return send_weekly_digest()
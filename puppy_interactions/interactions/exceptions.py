@@ -6,3 +6,8 @@ class UnrecognizedCommandException(Exception):
 class CheaterException(Exception):
     """When someone tries to rate themselves"""
     pass
+
+
+class SlackAPIError(Exception):
+    """When the Slack Web API answers with `"ok": false` or an HTTP error"""
+    pass
@@ -0,0 +1,235 @@
+"""
+who rates whom, across every rater: reciprocity, mutual positive pairs and how
+many people rate each person positively.
+
+`RatingGraph.build` reads every pair score (see `scores`) with one query of four
+columns, decays the scores to now and packs them into a sparse matrix in CSR form:
+`array`s of row offsets, column indexes and scores, with raters as rows and ratees
+as columns, both indexing one list of people. the transpose comes from a counting
+sort of the same arrays. everything else is a single pass over those arrays,
+without a Python object per edge (numpy and scipy would be a lot to add to the
+Lambda package for this).
+
+building reads every pair, so the graph is built once per database per process
+per period of `PERIOD_DAYS`, without checking the database on every call.
+
+`reciprocity` answers `/interactions mutual` without naming anyone. a rater who
+could change one rating and ask again would learn how that person rates them, so:
+
+* nothing is said until the rater rates `MIN_PEOPLE` people positively, and how
+  many of them rate back only from `MIN_MUTUAL_PEOPLE`,
+* counts about others get up to `NOISE` added or taken away, then are given in
+  bands of `BAND`,
+* the answer is stored (`ReciprocityAnswer`) and given again for the rest of the
+  period, whatever changes, so differencing within a period learns nothing.
+"""
+import json
+import random
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import date, timedelta
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from django.utils import timezone
+
+from puppy_interactions.interactions.models import (
+    PairScore, Person, ReciprocityAnswer
+)
+from puppy_interactions.interactions.scores import SCORE_FLOOR, decayed
+from puppy_interactions.interactions.sharding import current_alias
+
+MIN_PEOPLE = 5
+MIN_MUTUAL_PEOPLE = 20
+BAND = 5
+NOISE = 2
+PERIOD_DAYS = 7
+
+_graphs = {}  # type: Dict[str, Tuple[date, RatingGraph]]
+_lock = threading.Lock()
+
+
+def current_period() -> date:
+    """the first day of the current period of `PERIOD_DAYS`"""
+    today = timezone.now().date()
+    return today - timedelta(days=today.toordinal() % PERIOD_DAYS)
+
+
+def _counting_sort(keys: array, size: int, order: array) -> array:
+    """`order` stably reordered by `keys[position]`, for keys in `range(size)`"""
+    starts = array("l", bytes(8 * (size + 1)))
+    for position in order:
+        starts[keys[position] + 1] += 1
+    for key in range(size):
+        starts[key + 1] += starts[key]
+    result = array("l", bytes(8 * len(order)))
+    for position in order:
+        key = keys[position]
+        result[starts[key]] = position
+        starts[key] += 1
+    return result
+
+
+class RatingGraph:
+    """rater -> ratee net scores as a CSR matrix, with per-person summaries"""
+
+    def __init__(self, people: Dict[object, int], raters: array, ratees: array,
+                 scores: array):
+        self.people = people
+        size = len(people)
+        # sorted by column, then stably by row: rows in order, columns sorted
+        order = _counting_sort(raters, size, _counting_sort(
+            ratees, size, array("l", range(len(scores)))))
+        self.indptr, self.indices, self.scores = self._pack(raters, ratees, scores,
+                                                            order, size)
+        # the transpose's rows come out sorted too, from iterating in row order
+        self.t_indptr, self.t_indices, self.t_scores = self._pack(
+            ratees, raters, scores, _counting_sort(ratees, size, order), size)
+        self._summarize(size)
+
+    @staticmethod
+    def _pack(rows: array, columns: array, scores: array, order: array,
+              size: int) -> Tuple[array, array, array]:
+        indptr = array("l", bytes(8 * (size + 1)))
+        for position in order:
+            indptr[rows[position] + 1] += 1
+        for row in range(size):
+            indptr[row + 1] += indptr[row]
+        return (indptr, array("l", (columns[position] for position in order)),
+                array("d", (scores[position] for position in order)))
+
+    def _summarize(self, size: int) -> None:
+        """per person: people rated positively, rating them positively, and both.
+        and overall: the share of edges whose reverse exists"""
+        indptr, indices, scores = self.indptr, self.indices, self.scores
+        t_indptr, t_indices, t_scores = self.t_indptr, self.t_indices, self.t_scores
+        self.out_positive = array("l", bytes(8 * size))
+        self.in_positive = array("l", bytes(8 * size))
+        self.mutual_positive = array("l", bytes(8 * size))
+        returned = 0
+        for person in range(size):
+            out, out_end = indptr[person], indptr[person + 1]
+            into, into_end = t_indptr[person], t_indptr[person + 1]
+            self.out_positive[person] = sum(1 for score in scores[out:out_end]
+                                            if score > 0)
+            self.in_positive[person] = sum(1 for score in t_scores[into:into_end]
+                                           if score > 0)
+            # both sorted: merge the people rated with the people rating
+            while out < out_end and into < into_end:
+                if indices[out] < t_indices[into]:
+                    out += 1
+                elif indices[out] > t_indices[into]:
+                    into += 1
+                else:
+                    returned += 1
+                    if scores[out] > 0 and t_scores[into] > 0:
+                        self.mutual_positive[person] += 1
+                    out += 1
+                    into += 1
+        self.edges = len(scores)
+        self.reciprocity = returned / self.edges if self.edges else 0.0
+        self.mutual_pairs = sum(self.mutual_positive) // 2
+        self._in_sorted = array("l", sorted(count for count in self.in_positive
+                                            if count))
+
+    @classmethod
+    def build(cls, using: Optional[str] = None) -> "RatingGraph":
+        """every pair score decayed to now, leaving out those closer to zero than
+        `scores.SCORE_FLOOR`. one query"""
+        now = timezone.now()
+        people = {}  # type: Dict[object, int]
+        raters, ratees, scores = array("l"), array("l"), array("d")
+        rows = (PairScore.objects.using(using).order_by()
+                .values_list("rater_id", "ratee_id", "score", "as_of"))
+        for rater_id, ratee_id, score, as_of in rows.iterator():
+            score = decayed(score, as_of, now)
+            if abs(score) < SCORE_FLOOR:
+                continue
+            raters.append(people.setdefault(rater_id, len(people)))
+            ratees.append(people.setdefault(ratee_id, len(people)))
+            scores.append(score)
+        return cls(people, raters, ratees, scores)
+
+    def in_positive_share(self, person: int) -> float:
+        """the share of positively rated people with fewer positive raters"""
+        if not self._in_sorted:
+            return 0.0
+        return bisect_left(self._in_sorted, self.in_positive[person]) / len(
+            self._in_sorted)
+
+
+def get_graph(using: Optional[str] = None) -> RatingGraph:
+    """the graph of `using` (by default the current shard), built once per
+    period"""
+    using = using or current_alias()
+    period = current_period()
+    cached = _graphs.get(using)
+    if cached is not None and cached[0] == period:
+        return cached[1]
+    with _lock:
+        graph = RatingGraph.build(using)
+        _graphs[using] = (period, graph)
+    return graph
+
+
+class Reciprocity(NamedTuple):
+    """a rater's place in the graph, with counts about others noisy and banded
+    (see `band`)"""
+    rated_positive: str
+    # None below `MIN_MUTUAL_PEOPLE`
+    mutual_positive: Optional[str]
+    rated_by_positive: str
+    # percent of positively rated people with fewer positive raters, in tens
+    percentile: int
+    # percent of all ratings (of either kind) that are returned
+    overall: int
+
+
+def band(count: int) -> str:
+    """a count as "fewer than `BAND`" or a range of `BAND`"""
+    if count < BAND:
+        return f"fewer than {BAND}"
+    low = count - count % BAND
+    return f"{low}-{low + BAND - 1}"
+
+
+def noisy(count: int) -> int:
+    return max(count + random.randint(-NOISE, NOISE), 0)
+
+
+def _compute(person: Person, using: Optional[str]) -> Optional[Reciprocity]:
+    graph = get_graph(using)
+    index = graph.people.get(person.pk)
+    if index is None or graph.out_positive[index] < MIN_PEOPLE:
+        return None
+    out_positive = graph.out_positive[index]
+    return Reciprocity(
+        rated_positive=band(out_positive),
+        mutual_positive=(band(noisy(graph.mutual_positive[index]))
+                         if out_positive >= MIN_MUTUAL_PEOPLE else None),
+        rated_by_positive=band(noisy(graph.in_positive[index])),
+        percentile=int(graph.in_positive_share(index) * 10) * 10,
+        overall=round(graph.reciprocity * 100),
+    )
+
+
+def reciprocity(person: Person, using: Optional[str] = None) -> Optional[Reciprocity]:
+    """`person`'s reciprocity, or None until they rate `MIN_PEOPLE` people
+    positively. the first answer of a period is stored and given for the rest of
+    it. expects to be run in a transaction"""
+    period = current_period()
+    answers = ReciprocityAnswer.objects.using(using)
+    stored = (answers.filter(person=person, period=period)
+              .values_list("answer", flat=True).first())
+    if stored is not None:
+        return Reciprocity(*json.loads(stored))
+    summary = _compute(person, using)
+    if summary is not None:
+        answers.filter(period__lt=period).delete()
+        answers.create(person=person, period=period, answer=json.dumps(summary))
+    return summary
+
+
+def forget_graphs() -> None:
+    _graphs.clear()
+
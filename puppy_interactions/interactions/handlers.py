@@ -0,0 +1,258 @@
+import logging
+from typing import List, Mapping
+
+from django.conf import settings
+from django.db import transaction
+
+from puppy_interactions.interactions.api import make_token
+from puppy_interactions.interactions.exceptions import UnrecognizedCommandException
+from puppy_interactions.interactions.graph import (
+    MIN_MUTUAL_PEOPLE, MIN_PEOPLE, reciprocity
+)
+from puppy_interactions.interactions.help_message import HELP_MESSAGE
+from puppy_interactions.interactions.identity import get_or_create_person
+from puppy_interactions.interactions.idempotency import (
+    command_keys, find_receipt, store_receipt, find_receipts, store_receipts,
+    receipt_keys
+)
+from puppy_interactions.interactions.models import Interaction
+from puppy_interactions.interactions.renderers import (
+    render_log_attachments, render_aggregate_attachments, render_score_attachments,
+    render_match_attachments, render_conversation_attachments
+)
+from puppy_interactions.interactions.regex import find_pattern
+from puppy_interactions.interactions.scores import retrieve_trend
+from puppy_interactions.interactions.search import find_people
+from puppy_interactions.interactions.sharding import current_alias
+from puppy_interactions.interactions.sqlite import is_lock_error
+from puppy_interactions.interactions.utils import (
+    parse_webhook_text, do_create, do_logs, clear_logs, text_to_interaction_tuples,
+    create_interactions_batch, parse_top_request_text, do_top,
+    parse_conversations_request_text, do_conversations, undo_last_conversation
+)
+
+logger = logging.getLogger('puppy_interactions')
+
+UNRECOGNIZED_MESSAGE = dict(HELP_MESSAGE, text="We don't know that one! Try these: ")
+ERROR_MESSAGE = {"response_type": "ephemeral", "text": "Sorry, that didn't work. :-( "}
+
+
+def rater_user_id(payload: Mapping[str, str]) -> str:
+    return f"@{payload.get('user_id')}"
+
+
+def created_message(created_count: int) -> dict:
+    return {
+        "response_type": "ephemeral",
+        "text": f"We logged {created_count} interactions for you. Thanks!",
+    }
+
+
+def handle_command(payload: Mapping[str, str], command: str) -> dict:
+    """run a parsed slash command and build the Slack response. expects to be run
+    in a transaction"""
+    text = payload.get("text")
+    rater_uid = rater_user_id(payload)
+
+    # a Slack retry of a command we already applied gets the same answer
+    keys = receipt_keys(payload, command)
+    if keys:
+        receipt = find_receipt(*keys)
+        if receipt is not None:
+            return receipt
+
+    if command == "create":
+        data = created_message(do_create(rater_user_id=rater_uid, text=text))
+
+    elif command == "logs":
+        logs = do_logs(rater_user_id=rater_uid, text=text)
+        if isinstance(logs, list):
+            data = {"response_type": "ephemeral",
+                    "text": "These are some of your interaction logs!",
+                    "attachments": render_log_attachments(logs)}
+            data["attachments"].append(
+                {"text": "See more by adding an aggregation term"
+                         " like `/interactions 90 person`."})
+        elif isinstance(logs, dict):
+            data = {
+                "response_type": "ephemeral",
+                "text": "These are your aggregated interaction logs!",
+                "attachments": render_aggregate_attachments(logs)
+            }
+        else:
+            data = None
+
+    elif command == "top":
+        count, days, rating = parse_top_request_text(text)
+        top = do_top(rater_user_id=rater_uid, count=count, days=days, rating=rating)
+        kind = "positive" if rating == Interaction.POSITIVE else "negative"
+        if top:
+            data = {"response_type": "ephemeral",
+                    "text": f"Your top {len(top)} people for {kind} interactions in "
+                            f"the last {days} days!",
+                    "attachments": render_aggregate_attachments(top)}
+        else:
+            data = {"response_type": "ephemeral",
+                    "text": f"No {kind} interactions in the last {days} days."}
+
+    elif command == "trend":
+        rater = get_or_create_person(rater_uid)
+        rising, falling = retrieve_trend(rater)
+        if rising or falling:
+            data = {"response_type": "ephemeral",
+                    "text": "Your recent interactions, weighted toward the latest!",
+                    "attachments": render_score_attachments(rising + falling)}
+        else:
+            data = {"response_type": "ephemeral",
+                    "text": "No recent interactions to show a trend for."}
+
+    elif command == "find":
+        query = find_pattern.match(text.strip()).group("text")
+        rater = get_or_create_person(rater_uid)
+        matches = find_people(rater, query)
+        if matches:
+            data = {"response_type": "ephemeral",
+                    "text": f"People you've rated matching \"{query}\":",
+                    "attachments": render_match_attachments(matches)}
+        else:
+            data = {"response_type": "ephemeral",
+                    "text": f"Nobody you've rated matches \"{query}\"."}
+
+    elif command == "conversations":
+        days = parse_conversations_request_text(text)
+        conversations = do_conversations(rater_user_id=rater_uid, days=days)
+        if conversations:
+            data = {"response_type": "ephemeral",
+                    "text": f"Your latest conversations in the last {days} days!",
+                    "attachments": render_conversation_attachments(conversations)}
+        else:
+            data = {"response_type": "ephemeral",
+                    "text": f"No conversations in the last {days} days."}
+
+    elif command == "mutual":
+        summary = reciprocity(get_or_create_person(rater_uid))
+        if summary is None:
+            data = {"response_type": "ephemeral",
+                    "text": f"Rate at least {MIN_PEOPLE} people positively to see "
+                            f"who rates you back. We never say who."}
+        else:
+            if summary.mutual_positive is None:
+                rated = (f"You rate {summary.rated_positive} people positively; "
+                         f"rate at least {MIN_MUTUAL_PEOPLE} to see how many rate "
+                         f"you back.")
+            else:
+                rated = (f"Of the {summary.rated_positive} people you rate "
+                         f"positively, {summary.mutual_positive} rate you "
+                         f"positively too.")
+            data = {"response_type": "ephemeral",
+                    "text": f"{rated} {summary.rated_by_positive} people "
+                            f"rate you positively, more than "
+                            f"{summary.percentile}% of people rated positively. "
+                            f"Across everyone, {summary.overall}% of ratings are "
+                            f"returned."}
+
+    elif command == "token":
+        token = make_token(get_or_create_person(rater_uid), payload.get("team_id"),
+                           payload.get("enterprise_id"))
+        data = {"response_type": "ephemeral",
+                "text": f"Your token for the read API, good for "
+                        f"{settings.INTERACTIONS_API_TOKEN_MAX_AGE // 86400} days. "
+                        f"Send it as `Authorization: Bearer <token>` and keep it "
+                        f"to yourself:\n`{token}`"}
+
+    elif command == "undo":
+        undone = undo_last_conversation(rater_user_id=rater_uid)
+        if undone:
+            names = ", ".join(f"{ratee} {rating}" for ratee, rating in undone)
+            data = {"response_type": "ephemeral",
+                    "text": f"Undone: your last {len(undone)} interactions, with "
+                            f"{names}."}
+        else:
+            data = {"response_type": "ephemeral",
+                    "text": "There's nothing to undo."}
+
+    elif command == "clear":
+        clear_logs(rater_user_id=rater_uid)
+        data = {"response_type": "ephemeral",
+                "text": "You're all clear. Thanks!"}
+
+    elif command == "help":
+        data = HELP_MESSAGE
+
+    else:
+        data = None
+
+    if keys:
+        store_receipt(keys[0], data)
+    return data
+
+
+def handle_batch(payloads: List[Mapping[str, str]]) -> List[dict]:
+    """run many slash command payloads in one go and return a result per payload, in
+    order: `{"ok": true, "response": {...}}` or `{"ok": false, "error": "..."}`.
+    expects to be run in a transaction.
+
+    consecutive creates are grouped and applied together with
+    `create_interactions_batch`; any other command first flushes the creates before
+    it, so every command sees the effects of those earlier in the batch"""
+    results = [None] * len(payloads)  # type: List[dict]
+    pending = []  # (index, payload) of creates not yet applied
+
+    def flush():
+        keys = [command_keys(payload) for _, payload in pending]
+        receipts = find_receipts([key for candidates in keys for key in candidates])
+        outcomes = {}
+        for candidates in keys:
+            found = [receipts[key] for key in candidates if key in receipts]
+            if found:
+                outcomes[candidates[0]] = {"ok": True, "response": found[0]}
+        # the first payload for each new key; later ones are retries of it
+        first = {}
+        for (_, payload), (key, *_) in zip(pending, keys):
+            if key not in outcomes and key not in first:
+                first[key] = payload
+
+        created = create_interactions_batch(
+            [(rater_user_id(payload), text_to_interaction_tuples(payload["text"]))
+             for payload in first.values()]
+        )
+        fresh = {}
+        for key, result in zip(first, created):
+            if isinstance(result, Exception):
+                outcomes[key] = {"ok": False, "error": str(result)}
+            else:
+                fresh[key] = created_message(len(result))
+                outcomes[key] = {"ok": True, "response": fresh[key]}
+        store_receipts(fresh)
+
+        for (index, _), (key, *_) in zip(pending, keys):
+            results[index] = outcomes[key]
+        pending.clear()
+
+    for index, payload in enumerate(payloads):
+        try:
+            command = parse_webhook_text(payload.get("text") or "")
+        except UnrecognizedCommandException:
+            results[index] = {"ok": True, "response": UNRECOGNIZED_MESSAGE}
+            continue
+
+        if command == "create":
+            pending.append((index, payload))
+            continue
+
+        if pending:
+            flush()
+        try:
+            with transaction.atomic(using=current_alias()):
+                response = handle_command(payload, command)
+            results[index] = {"ok": True, "response": response}
+        except Exception as e:
+            if is_lock_error(e):
+                # the whole batch is retried, see `write_transaction`
+                raise
+            logger.exception("Batch item Exception!")
+            results[index] = {"ok": False, "error": str(e)}
+
+    if pending:
+        flush()
+    return results
@@ -13,6 +13,19 @@ HELP_MESSAGE = {
         {"text": "See this month, categorized by week: `/interactions 31 time`"},
         {"text": "See only positives: `/interactions +`"},
         {"text": "See only in the past 45 days: `/interactions 45 -`"},
+        {"text": "See the 10 people you've had the most positives with this "
+                 "quarter: `/interactions top 10 90 +`"},
+        {"text": "See your 3 most negative this month: `/interactions top 3 30 -`"},
+        {"text": "See who's trending up and down lately: `/interactions trend`"},
+        {"text": "Find someone you've rated by part of their name: "
+                 "`/interactions find rand`"},
+        {"text": "See who was in your conversations this week: "
+                 "`/interactions conversations 7`"},
+        {"text": "Undo the interactions you logged last: `/interactions undo`"},
+        {"text": "See how many of the people you rate positively do the same for "
+                 "you (never who): `/interactions mutual`"},
+        {"text": "Get a token for the read API, for dashboards: "
+                 "`/interactions token`"},
         {"text": "Clear your logs: `/interactions clear` :warning: No confirmation!"},
         {"text": "See this message: `/interactions help`"},
     ]
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import time
+from datetime import timedelta
+from typing import Dict, List, Mapping, Optional, Sequence
+
+from django.conf import settings
+from django.utils import timezone
+
+from puppy_interactions.interactions.bulk import LOOKUP_BATCH_SIZE
+from puppy_interactions.interactions.models import CommandReceipt
+
+# commands that write, and so must not be applied twice
+WRITE_COMMANDS = ("create", "clear", "undo")
+# commands that write, but give the same answer when applied again, so need no
+# receipt ("mutual" stores its answer for the period, see `graph`)
+IDEMPOTENT_WRITE_COMMANDS = ("mutual",)
+# commands that are meant to act again when repeated, so that only a retry with
+# the same `trigger_id` is taken for one
+TRIGGER_ONLY_COMMANDS = ("undo",)
+# set by Slack on its retries of a request it timed out on
+RETRY_HEADER = "HTTP_X_SLACK_RETRY_NUM"
+
+
+def command_key(payload: Mapping[str, str], windows_ago: int = 0) -> str:
+    """identify a slash command invocation across Slack's retries
+
+    retries carry the original `trigger_id`. without one, fall back to the user and
+    text within a `INTERACTIONS_IDEMPOTENCY_WINDOW` second window (or the one
+    `windows_ago` before it)"""
+    user_id = payload.get("user_id", "")
+    trigger_id = payload.get("trigger_id")
+    if trigger_id:
+        basis = f"trigger\n{user_id}\n{trigger_id}"
+    else:
+        window = int(time.time() // settings.INTERACTIONS_IDEMPOTENCY_WINDOW)
+        window -= windows_ago
+        basis = f"text\n{user_id}\n{payload.get('text', '').strip()}\n{window}"
+    return hashlib.sha256(basis.encode()).hexdigest()
+
+
+def command_keys(payload: Mapping[str, str]) -> List[str]:
+    """the `command_key` to store a receipt under, then the other keys a retry's
+    receipt may have been stored under: without a `trigger_id`, the previous
+    window's, for retries that arrive just after a window boundary"""
+    if payload.get("trigger_id"):
+        return [command_key(payload)]
+    return [command_key(payload), command_key(payload, windows_ago=1)]
+
+
+def receipt_keys(payload: Mapping[str, str], command: str) -> List[str]:
+    """the `command_keys` of a write command, or none when its retries can't be
+    told from a repeat: a second `undo` within the window undoes the conversation
+    before, so undo without a `trigger_id` keeps no receipt"""
+    if command not in WRITE_COMMANDS:
+        return []
+    if command in TRIGGER_ONLY_COMMANDS and not payload.get("trigger_id"):
+        return []
+    return command_keys(payload)
+
+
+def _expiry():
+    return timezone.now() - timedelta(seconds=settings.INTERACTIONS_IDEMPOTENCY_TTL)
+
+
+def find_receipt(*keys: str) -> Optional[dict]:
+    """the response already sent for any of `keys`, or None if this is a new
+    command"""
+    # sliced rather than `first()`, which would sort by guid off the key index
+    responses = (CommandReceipt.objects.filter(key__in=keys, created__gte=_expiry())
+                 .values_list("response", flat=True)[:1])
+    for response in responses:
+        return json.loads(response)
+    return None
+
+
+def store_receipt(key: str, data: dict) -> None:
+    """remember the response for `key`, pruning receipts past their ttl"""
+    CommandReceipt.objects.filter(created__lt=_expiry()).delete()
+    CommandReceipt.objects.update_or_create(key=key,
+                                            defaults={"response": json.dumps(data)})
+
+
+def find_receipts(keys: Sequence[str]) -> Dict[str, dict]:
+    """the responses already sent for any of `keys`, like `find_receipt`"""
+    found = {}
+    for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+        rows = (CommandReceipt.objects
+                .filter(key__in=keys[start:start + LOOKUP_BATCH_SIZE],
+                        created__gte=_expiry())
+                .values_list("key", "response"))
+        found.update((key, json.loads(response)) for key, response in rows)
+    return found
+
+
+def store_receipts(receipts: Dict[str, dict]) -> None:
+    """remember many responses at once, like `store_receipt`"""
+    CommandReceipt.objects.filter(created__lt=_expiry()).delete()
+    CommandReceipt.objects.bulk_create(
+        [CommandReceipt(key=key, response=json.dumps(data))
+         for key, data in receipts.items()]
+    )
@@ -0,0 +1,169 @@
+"""
+one Person per person, however their name was typed.
+
+raw names become `Person.user_id`s as typed, so "Random Guy", "random guy" and
+"Random  Guy" used to be three Persons. Persons are now looked up by
+`normalized_id`, a case- and whitespace-insensitive key with a unique index, and
+then by `PersonAlias`, which maps other names (like a raw name standing for a
+Slack user) to a Person. `merge_people` folds duplicates into one Person.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from puppy_interactions.interactions.bulk import LOOKUP_BATCH_SIZE
+from puppy_interactions.interactions.models import (
+    Interaction, PairScore, Person, PersonAlias
+)
+from puppy_interactions.interactions.scores import decayed
+
+
+def normalize_user_id(user_id: str) -> str:
+    """the lookup key for a `user_id`: casefolded, with runs of whitespace as one
+    space"""
+    return " ".join(user_id.split()).casefold()
+
+
+def lookup_people(user_ids: Iterable[str]) -> Dict[str, Person]:
+    """the existing Persons for `user_ids`, by normalized id, then by exact
+    `user_id` (for Persons not yet keyed), then by alias. one query per
+    `LOOKUP_BATCH_SIZE` ids, and one more if any are left"""
+    keys = {user_id: normalize_user_id(user_id) for user_id in user_ids}
+    wanted = list(keys)
+    found = {}
+    for start in range(0, len(wanted), LOOKUP_BATCH_SIZE):
+        batch = wanted[start:start + LOOKUP_BATCH_SIZE]
+        by_key, by_id = {}, {}
+        for person in Person.objects.filter(
+                Q(normalized_id__in=[keys[user_id] for user_id in batch])
+                | Q(user_id__in=batch)):
+            by_key[person.normalized_id] = by_id[person.user_id] = person
+        for user_id in batch:
+            person = by_key.get(keys[user_id]) or by_id.get(user_id)
+            if person is not None:
+                found[user_id] = person
+
+    missing = defaultdict(list)  # key -> user_ids
+    for user_id in wanted:
+        if user_id not in found:
+            missing[keys[user_id]].append(user_id)
+    aliases = list(missing)
+    for start in range(0, len(aliases), LOOKUP_BATCH_SIZE):
+        for alias in (PersonAlias.objects.select_related("person")
+                      .filter(alias__in=aliases[start:start + LOOKUP_BATCH_SIZE])):
+            found.update((user_id, alias.person) for user_id in missing[alias.alias])
+    return found
+
+
+def find_person(user_id: str) -> Optional[Person]:
+    return lookup_people([user_id]).get(user_id)
+
+
+def get_or_create_person(user_id: str) -> Person:
+    person = find_person(user_id)
+    if person is None:
+        person = Person.objects.create(user_id=user_id,
+                                       normalized_id=normalize_user_id(user_id))
+    return person
+
+
+def _merge_scores(survivor: Person, duplicate_pks: List) -> None:
+    """combine the pair scores of the duplicates with the survivor's, decayed to
+    now, dropping any the survivor would have with itself"""
+    now = timezone.now()
+    pks = duplicate_pks + [survivor.pk]
+    rows = PairScore.objects.filter(Q(rater_id__in=pks) | Q(ratee_id__in=pks))
+    combined = defaultdict(float)  # type: Dict[Tuple[object, object], float]
+    for rater_id, ratee_id, score, as_of in rows.values_list(
+            "rater_id", "ratee_id", "score", "as_of"):
+        rater_id = survivor.pk if rater_id in duplicate_pks else rater_id
+        ratee_id = survivor.pk if ratee_id in duplicate_pks else ratee_id
+        if rater_id != ratee_id:
+            combined[rater_id, ratee_id] += decayed(score, as_of, now)
+    rows.delete()
+    PairScore.objects.bulk_create(
+        [PairScore(rater_id=rater_id, ratee_id=ratee_id, score=score, as_of=now)
+         for (rater_id, ratee_id), score in combined.items()]
+    )
+
+
+def merge_people(survivor: Person, duplicates: Iterable[Person]) -> int:
+    """move the duplicates' interactions, pair scores and aliases to `survivor`,
+    delete them and return how many there were. interactions between the survivor
+    and a duplicate, or between duplicates, would become self-ratings and are
+    deleted instead. expects to be run in a transaction"""
+    duplicate_pks = [person.pk for person in duplicates if person.pk != survivor.pk]
+    if not duplicate_pks:
+        return 0
+    # the raters whose logs name a duplicate, whose cached responses go stale
+    raters = set(Interaction.objects.filter(ratee_id__in=duplicate_pks)
+                 .values_list("rater_id", flat=True).distinct())
+    raters.add(survivor.pk)
+
+    pks = duplicate_pks + [survivor.pk]
+    Interaction.objects.filter(rater_id__in=pks, ratee_id__in=pks).delete()
+    Interaction.objects.filter(rater_id__in=duplicate_pks).update(rater=survivor)
+    Interaction.objects.filter(ratee_id__in=duplicate_pks).update(ratee=survivor)
+    _merge_scores(survivor, duplicate_pks)
+    PersonAlias.objects.filter(person_id__in=duplicate_pks).update(person=survivor)
+    Person.objects.filter(pk__in=duplicate_pks).delete()
+
+    raters = list(raters)
+    for start in range(0, len(raters), LOOKUP_BATCH_SIZE):
+        Person.objects.filter(pk__in=raters[start:start + LOOKUP_BATCH_SIZE]).update(
+            data_version=F("data_version") + 1
+        )
+    return len(duplicate_pks)
+
+
+def merge_into(survivor: Person, people: Iterable[Person]) -> int:
+    """merge `people`, who needn't share a normalized id, into `survivor` and keep
+    their normalized ids as aliases of it, so their names still find it. expects to
+    be run in a transaction"""
+    people = [person for person in people if person.pk != survivor.pk]
+    names = {person.normalized_id for person in people
+             if person.normalized_id and person.normalized_id != survivor.normalized_id}
+    merged = merge_people(survivor, people)
+    existing = PersonAlias.objects.filter(alias__in=names)
+    existing.update(person=survivor)
+    taken = set(existing.values_list("alias", flat=True))
+    PersonAlias.objects.bulk_create([PersonAlias(alias=name, person=survivor)
+                                     for name in names - taken])
+    return merged
+
+
+def merge_duplicates() -> Tuple[int, int]:
+    """key every Person without a `normalized_id`, merging those whose key is
+    already taken into the Person (or alias) holding it. returns `(keyed, merged)`"""
+    pending = defaultdict(list)  # type: Dict[str, List[Person]]
+    for person in Person.objects.filter(normalized_id__isnull=True).order_by("created"):
+        pending[normalize_user_id(person.user_id)].append(person)
+
+    holders = lookup_people(list(pending))
+    keyed = merged = 0
+    for key, people in pending.items():
+        survivor = holders.get(key)
+        if survivor is None or survivor.normalized_id is None:
+            survivor = people.pop(0)
+            survivor.normalized_id = key
+            survivor.save(update_fields=["normalized_id"])
+            keyed += 1
+        merged += merge_people(survivor, people)
+    return keyed, merged
+
+
+def apply_aliases(mapping: Mapping[str, str]) -> int:
+    """merge each raw name in `{raw name: Slack user id}` into that Slack user's
+    Person and keep the name as an alias for later lookups. returns how many
+    Persons were merged"""
+    merged = 0
+    for name, slack_id in mapping.items():
+        target = get_or_create_person(f"@{slack_id.lstrip('@')}")
+        alias = normalize_user_id(name)
+        person = Person.objects.filter(normalized_id=alias).first()
+        if person is not None:
+            merged += merge_people(target, [person])
+        PersonAlias.objects.update_or_create(alias=alias, defaults={"person": target})
+    return merged
@@ -0,0 +1,126 @@
+"""
+keeping a SQLite file small and its planner statistics current, for the
+`db_maintenance` command.
+
+deletes (`clear`, `undo`, purges, merges) leave free pages in the file, which are
+still downloaded on a cold start and, with replication, uploaded in every
+snapshot. `vacuum` gives them back: `PRAGMA incremental_vacuum` when the file has
+`auto_vacuum = INCREMENTAL`, which just moves free pages to the end and truncates,
+otherwise a full `VACUUM`, which rewrites the whole file under the write lock, so
+by default only once `VACUUM_FREE_RATIO` of the file is free. `ANALYZE` fills
+`sqlite_stat1`, which the planner reads to choose between indexes.
+
+sizes per table and index come from the `dbstat` virtual table, which not every
+SQLite is built with; without it only the totals are known.
+"""
+from typing import List, NamedTuple, Optional
+
+from django.db import OperationalError, connections
+
+# the share of free pages that makes a full VACUUM worth its write lock
+VACUUM_FREE_RATIO = 0.1
+AUTO_VACUUM_MODES = ("NONE", "FULL", "INCREMENTAL")
+
+
+class FileSize(NamedTuple):
+    page_size: int
+    pages: int
+    free_pages: int
+    auto_vacuum: str
+
+    @property
+    def bytes(self) -> int:
+        return self.page_size * self.pages
+
+    @property
+    def free_ratio(self) -> float:
+        return self.free_pages / self.pages if self.pages else 0.0
+
+
+class ObjectSize(NamedTuple):
+    """a table or index, with the table it belongs to"""
+    name: str
+    table: str
+    pages: int
+    bytes: int
+    # bytes of its pages holding nothing
+    unused: int
+
+
+def _pragma(cursor, name: str):
+    cursor.execute(f"PRAGMA {name}")
+    return cursor.fetchone()[0]
+
+
+def checkpoint(using: str) -> None:
+    """move WAL frames into the file itself, where sizes are read and snapshots
+    taken from"""
+    with connections[using].cursor() as cursor:
+        cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def file_size(using: str) -> FileSize:
+    with connections[using].cursor() as cursor:
+        return FileSize(page_size=_pragma(cursor, "page_size"),
+                        pages=_pragma(cursor, "page_count"),
+                        free_pages=_pragma(cursor, "freelist_count"),
+                        auto_vacuum=AUTO_VACUUM_MODES[_pragma(cursor, "auto_vacuum")])
+
+
+def object_sizes(using: str) -> Optional[List[ObjectSize]]:
+    """every table and index, largest first, or None without `dbstat`"""
+    try:
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                "SELECT s.name, COALESCE(m.tbl_name, s.name), COUNT(*), "
+                "SUM(s.pgsize), SUM(s.unused) "
+                "FROM dbstat s LEFT JOIN sqlite_master m ON m.name = s.name "
+                "GROUP BY s.name ORDER BY SUM(s.pgsize) DESC, s.name"
+            )
+            return [ObjectSize(*row) for row in cursor.fetchall()]
+    except OperationalError:
+        return None
+
+
+def analyze(using: str) -> None:
+    with connections[using].cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+def set_auto_vacuum(using: str, mode: str) -> bool:
+    """set `auto_vacuum`, returning whether a full VACUUM is needed for it to take
+    effect (as it is when switching from or to NONE)"""
+    mode = mode.upper()
+    if mode not in AUTO_VACUUM_MODES:
+        raise ValueError(f"Not an auto_vacuum mode: {mode!r}")
+    current = file_size(using).auto_vacuum
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"PRAGMA auto_vacuum = {mode}")
+    return current != mode and "NONE" in (current, mode)
+
+
+def vacuum(using: str, mode: str = "auto") -> str:
+    """reclaim free pages, see the module docstring. `mode` is "auto",
+    "incremental" or "full"; returns what was run: "incremental", "full" or
+    "none". can't run inside a transaction"""
+    size = file_size(using)
+    if mode == "auto":
+        if size.auto_vacuum == "INCREMENTAL":
+            mode = "incremental" if size.free_pages else "none"
+        else:
+            mode = "full" if size.free_ratio >= VACUUM_FREE_RATIO else "none"
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if mode == "incremental":
+            # the pragma frees one page per step, and a DB-API cursor may step it
+            # just once; `executescript` steps every statement to the end. without
+            # auto_vacuum = INCREMENTAL it frees nothing, and the loop stops
+            free = size.free_pages
+            while free:
+                connection.connection.executescript("PRAGMA incremental_vacuum;")
+                free, before = file_size(using).free_pages, free
+                if free >= before:
+                    break
+        elif mode == "full":
+            cursor.execute("VACUUM")
+    return mode
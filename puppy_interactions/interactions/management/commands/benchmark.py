@@ -0,0 +1,21 @@
+from importlib import import_module
+
+from django.core.management.base import BaseCommand
+
+from puppy_interactions.interactions.benchmarks import SCENARIOS
+
+
+class Command(BaseCommand):
+    help = "Run a benchmark scenario against a temporary database of synthetic data"
+
+    def add_arguments(self, parser):
+        parser.add_argument("scenario", choices=sorted(SCENARIOS))
+        parser.add_argument("--seconds", type=float, default=5,
+                            help="how long timed scenarios run for")
+        parser.add_argument("--size", type=int, default=20000,
+                            help="synthetic interactions to generate")
+        parser.add_argument("--workers", type=int, default=4,
+                            help="concurrent workers, for concurrent scenarios")
+
+    def handle(self, *args, scenario, **options):
+        import_module(SCENARIOS[scenario]).run(self.stdout, **options)
@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from puppy_interactions.interactions import maintenance, replication
+from puppy_interactions.interactions.sharding import (
+    each_database, use_database, use_team_shard
+)
+
+
+def mib(size: int) -> str:
+    return f"{size / 1024 / 1024:.2f} MiB"
+
+
+class Command(BaseCommand):
+    help = ("ANALYZE and VACUUM a SQLite database, report its size by table and "
+            "index, and upload the analyzed (and compacted) file when replicating. "
+            "Safe to schedule")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--vacuum", default="auto",
+                            choices=["auto", "incremental", "full", "none"],
+                            help="auto runs an incremental vacuum when the file has "
+                                 "auto_vacuum=INCREMENTAL, otherwise a full VACUUM "
+                                 "once enough of it is free (default auto)")
+        parser.add_argument("--auto-vacuum", choices=maintenance.AUTO_VACUUM_MODES,
+                            type=str.upper,
+                            help="switch the file's auto_vacuum mode first; from or "
+                                 "to NONE this takes a full VACUUM")
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+        parser.add_argument("--team", metavar="TEAM_ID",
+                            help="this team's shard, with INTERACTIONS_SHARD_BY_TEAM")
+        parser.add_argument("--enterprise-id", help="the enterprise of --team, if any")
+        parser.add_argument("--all", action="store_true", dest="every_database",
+                            help="the default database and then every team shard")
+
+    def report(self, label: str, size: maintenance.FileSize) -> None:
+        self.stdout.write(f"{label}: {mib(size.bytes)}, {size.free_pages} of "
+                          f"{size.pages} pages free ({size.free_ratio:.1%}), "
+                          f"auto_vacuum={size.auto_vacuum}")
+
+    def handle(self, *args, vacuum="auto", auto_vacuum=None, database=DEFAULT_DB_ALIAS,
+               team=None, enterprise_id=None, every_database=False, **options):
+        if every_database:
+            for alias in each_database():
+                self.maintain(alias, vacuum, auto_vacuum)
+            return
+        shard = (use_team_shard(team, enterprise_id) if team
+                 else use_database(database))
+        with shard as alias:
+            self.maintain(alias, vacuum, auto_vacuum)
+
+    def maintain(self, alias: str, vacuum: str, auto_vacuum=None) -> None:
+        # restores the file first if it's missing or behind, as on a cold start
+        replicator = replication.prepare(alias)
+        replication.refresh(alias)
+        maintenance.checkpoint(alias)
+        before = maintenance.file_size(alias)
+        self.report(f"{alias} before", before)
+
+        maintenance.analyze(alias)
+        if auto_vacuum and maintenance.set_auto_vacuum(alias, auto_vacuum):
+            vacuum = "full"
+        ran = maintenance.vacuum(alias, vacuum)
+        maintenance.checkpoint(alias)
+        after = maintenance.file_size(alias)
+        self.report(f"{alias} after ANALYZE and {ran} vacuum", after)
+
+        sizes = maintenance.object_sizes(alias)
+        if sizes is None:
+            self.stdout.write("Sizes by table need SQLite built with dbstat.")
+        for size in sizes or []:
+            name = (size.name if size.name == size.table
+                    else f"{size.name} (on {size.table})")
+            self.stdout.write(f"  {mib(size.bytes):>12}  {size.pages:>8} pages  "
+                              f"{size.unused / (size.bytes or 1):>6.1%} unused  "
+                              f"{name}")
+
+        if replicator is not None and ran != "none":
+            uploaded = replicator.snapshot()
+            self.stdout.write(f"Uploaded a {mib(uploaded)} snapshot.")
+        elif replicator is not None:
+            # ANALYZE writes sqlite_stat1 outside `write_transaction`, so nothing
+            # else uploads it, and a cold start would lose it
+            uploaded = replicator.sync()
+            self.stdout.write(f"Uploaded {mib(uploaded)} of changed pages.")
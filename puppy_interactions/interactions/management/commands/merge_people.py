@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from puppy_interactions.interactions.identity import apply_aliases, merge_duplicates
+from puppy_interactions.interactions.sharding import use_team_shard
+from puppy_interactions.interactions.sqlite import write_transaction
+
+
+def merge(mapping: dict) -> tuple:
+    keyed, merged = merge_duplicates()
+    return keyed, merged, apply_aliases(mapping)
+
+
+class Command(BaseCommand):
+    help = ("Merge Persons whose user_ids differ only in case or spacing, and "
+            "optionally raw names into the Slack users they stand for")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mapping", metavar="PATH",
+                            help='a JSON file like {"Random Guy": "U2147483697"}; '
+                                 'the names are kept as aliases of those users')
+        parser.add_argument("--team", metavar="TEAM_ID",
+                            help="merge in this team's shard, with "
+                                 "INTERACTIONS_SHARD_BY_TEAM")
+        parser.add_argument("--enterprise-id", help="the enterprise of --team, if any")
+
+    def handle(self, *args, mapping=None, team=None, enterprise_id=None, **options):
+        names = {}
+        if mapping:
+            with open(mapping) as f:
+                names = json.load(f)
+            if not isinstance(names, dict) or not all(
+                    isinstance(value, str) for value in names.values()):
+                raise CommandError(f"Expected a JSON object of names to Slack user "
+                                   f"ids in {mapping}")
+        with use_team_shard(team, enterprise_id) as alias:
+            keyed, merged, aliased = write_transaction(merge, names)
+        self.stdout.write(f"{alias}: keyed {keyed} people, merged {merged} "
+                          f"duplicates, and {aliased} people into the users their "
+                          f"names map to.")
@@ -0,0 +1,85 @@
+from collections import Counter, defaultdict
+from statistics import median
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from puppy_interactions.interactions.profiling import load_profiles, sign_header
+
+
+def databases(profile: dict) -> set:
+    """the databases a profile's statements ran on; profiles from before these
+    were recorded only ran on the default one"""
+    return {query.get("database", DEFAULT_DB_ALIAS) for query in profile["queries"]}
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = ("Summarize the stored request profiles by command: timings, SQL and "
+            "where the time went")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--command", help="only this command, like logs")
+        parser.add_argument("--database", metavar="ALIAS",
+                            help="only requests that queried this database, like "
+                                 "default or a team shard")
+        parser.add_argument("--top", type=int, default=10,
+                            help="functions or stacks to show per command")
+        parser.add_argument("--sign", action="store_true",
+                            help="print a signed X-Interactions-Profile header "
+                                 "value instead")
+
+    def handle(self, *args, command=None, database=None, top=10, sign=False,
+               **options):
+        if sign:
+            self.stdout.write(sign_header())
+            return
+
+        by_command = defaultdict(list)
+        for profile in load_profiles():
+            if command is not None and profile["command"] != command:
+                continue
+            if database is not None and database not in databases(profile):
+                continue
+            by_command[profile["command"]].append(profile)
+        if not by_command:
+            self.stdout.write("No profiles stored.")
+            return
+
+        for name, profiles in sorted(by_command.items()):
+            times = [profile["ms"] for profile in profiles]
+            queries = [len(profile["queries"]) for profile in profiles]
+            sql = [sum(query["ms"] for query in profile["queries"])
+                   for profile in profiles]
+            self.stdout.write(
+                f"{name}: {len(profiles)} profiles, median {median(times):.1f}ms, "
+                f"p95 {percentile(times, 0.95):.1f}ms, max {max(times):.1f}ms, "
+                f"{sum(queries) / len(queries):.1f} queries taking "
+                f"{sum(sql) / len(sql):.1f}ms on average, across "
+                f"{len(set().union(*map(databases, profiles)))} databases"
+            )
+
+            # self time summed across profiles, so one slow request doesn't hide
+            # what every request pays for
+            functions = Counter()  # type: Counter
+            stacks = Counter()  # type: Counter
+            for profile in profiles:
+                for row in profile.get("functions", []):
+                    functions[row["function"]] += row["tottime_ms"]
+                stacks.update(profile.get("stacks", {}))
+            for function, ms in functions.most_common(top):
+                self.stdout.write(f"  {ms:>10.1f}ms  {function}")
+            for stack, samples in stacks.most_common(top):
+                innermost = ";".join(stack.split(";")[-3:])
+                self.stdout.write(f"  {samples:>10} samples  ...{innermost}")
+
+            slowest = Counter()  # type: Counter
+            for profile in profiles:
+                for query in profile["queries"]:
+                    slowest[query["sql"]] += query["ms"]
+            for sql_text, ms in slowest.most_common(min(top, 3)):
+                self.stdout.write(f"  {ms:>10.1f}ms  {sql_text[:200]}")
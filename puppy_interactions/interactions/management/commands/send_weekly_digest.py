@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from puppy_interactions.interactions.digest import (
+    iter_all_digests, render_digest, send_digests
+)
+
+
+class Command(BaseCommand):
+    help = "Post every active user a summary of their interactions this week"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true",
+                            help="print the digests instead of sending them")
+
+    def handle(self, *args, dry_run=False, **options):
+        if dry_run:
+            for digest in iter_all_digests():
+                self.stdout.write(f"{digest.user_id}\n{render_digest(digest)}\n")
+            return
+        sent, failed = send_digests(iter_all_digests())
+        self.stdout.write(f"Sent {sent} weekly digests, {failed} failed.")
@@ -0,0 +1,157 @@
+import json
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+
+from puppy_interactions.interactions.bulk import LOOKUP_BATCH_SIZE, copy_rows
+from puppy_interactions.interactions.models import (
+    Interaction, PairScore, Person, PersonAlias
+)
+from puppy_interactions.interactions.search import index_people
+from puppy_interactions.interactions.sharding import ensure_shard, shard_alias
+from puppy_interactions.interactions.sqlite import write_transaction
+
+
+def _batches(pks: list):
+    for start in range(0, len(pks), LOOKUP_BATCH_SIZE):
+        yield pks[start:start + LOOKUP_BATCH_SIZE]
+
+
+def copy_to_shard(alias: str, rater_pks: list) -> dict:
+    """copy the raters' interactions and pair scores, and everyone they mention with
+    their aliases, from the default database into a shard. rows already there are
+    skipped; one clashing with a different row raises `IntegrityError`"""
+    source = DEFAULT_DB_ALIAS
+    counts = defaultdict(int)
+    with transaction.atomic(using=alias):
+        person_pks = set(rater_pks)
+        for batch in _batches(rater_pks):
+            person_pks.update(Interaction.objects.using(source)
+                              .filter(rater_id__in=batch, ratee__isnull=False)
+                              .values_list("ratee_id", flat=True).distinct())
+        for batch in _batches(list(person_pks)):
+            people = list(Person.objects.using(source).filter(pk__in=batch))
+            counts["people"] += copy_rows(Person, people, using=alias)
+            # rather than copied, since their ids are only unique per database
+            index_people(people, using=alias)
+            counts["aliases"] += copy_rows(
+                PersonAlias,
+                PersonAlias.objects.using(source).filter(person__in=people).iterator(),
+                using=alias
+            )
+
+        for batch in _batches(rater_pks):
+            counts["interactions"] += copy_rows(
+                Interaction,
+                Interaction.objects.using(source).filter(rater_id__in=batch).iterator(),
+                using=alias
+            )
+            counts["scores"] += copy_rows(
+                PairScore,
+                PairScore.objects.using(source).filter(rater_id__in=batch).iterator(),
+                using=alias
+            )
+    return counts
+
+
+def prune_source(rater_pks: list) -> dict:
+    """delete the raters' interactions and pair scores from the default database,
+    then the raters and everyone they mention, unless something left there still
+    mentions them"""
+    source = DEFAULT_DB_ALIAS
+    counts = defaultdict(int)
+    person_pks = set(rater_pks)
+    for batch in _batches(rater_pks):
+        person_pks.update(Interaction.objects.using(source)
+                          .filter(rater_id__in=batch, ratee__isnull=False)
+                          .values_list("ratee_id", flat=True).distinct())
+        counts["interactions"] += Interaction.objects.using(source).filter(
+            rater_id__in=batch).delete()[0]
+        counts["scores"] += PairScore.objects.using(source).filter(
+            rater_id__in=batch).delete()[0]
+
+    for batch in _batches(list(person_pks)):
+        mentioned = set()
+        for model, fields in ((Interaction, ("rater_id", "ratee_id")),
+                              (PairScore, ("rater_id", "ratee_id"))):
+            for field in fields:
+                mentioned.update(model.objects.using(source)
+                                 .filter(**{f"{field}__in": batch})
+                                 .values_list(field, flat=True).distinct())
+        unused = [pk for pk in batch if pk not in mentioned]
+        # with their aliases and search trigrams
+        Person.objects.using(source).filter(pk__in=unused).delete()
+        counts["people"] += len(unused)
+    return counts
+
+
+class Command(BaseCommand):
+    help = ("Move the default database's interactions into per-team shards, for "
+            "INTERACTIONS_SHARD_BY_TEAM. Raters left out of the mapping stay in "
+            "the default database")
+
+    def add_arguments(self, parser):
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument("--assign-all", metavar="TEAM_ID",
+                           help="move every rater to this team's shard")
+        group.add_argument("--mapping", metavar="PATH",
+                           help='a JSON file like {"U2147483697": "T0001"}, or '
+                                '{"U2147483697": ["T0001", "E0001"]} for Enterprise '
+                                'Grid; raters not in it are left out')
+        parser.add_argument("--enterprise-id",
+                            help="the enterprise of --assign-all's team, if any")
+        parser.add_argument("--keep-source", action="store_true",
+                            help="copy only, leaving the moved rows in the default "
+                                 "database too; they'd be read and sent twice")
+
+    def handle(self, *args, assign_all=None, mapping=None, enterprise_id=None,
+               keep_source=False, **options):
+        if not (assign_all or mapping):
+            raise CommandError("Give --assign-all or --mapping.")
+        if mapping:
+            with open(mapping) as f:
+                teams = json.load(f)
+        raters = (Person.objects.using(DEFAULT_DB_ALIAS)
+                  .filter(rater_interactions__isnull=False).distinct()
+                  .values_list("user_id", "pk"))
+
+        shards = defaultdict(list)  # alias -> rater pks
+        skipped = 0
+        for user_id, pk in raters:
+            if assign_all:
+                shards[shard_alias(assign_all, enterprise_id)].append(pk)
+                continue
+            team = teams.get(user_id.lstrip("@"))
+            if team is None:
+                skipped += 1
+                continue
+            if isinstance(team, str):
+                team = [team]
+            if not isinstance(team, list) or not 1 <= len(team) <= 2:
+                raise CommandError(f"Can't read the team of {user_id} in {mapping}")
+            shards[shard_alias(*team)].append(pk)
+
+        moved = []  # type: list
+        for alias, rater_pks in shards.items():
+            try:
+                counts = copy_to_shard(ensure_shard(alias), rater_pks)
+            except IntegrityError as e:
+                raise CommandError(
+                    f"{alias} already has a different row for someone being copied "
+                    f"({e}), such as the same user_id under another guid. Nothing "
+                    f"was copied to {alias} or removed from the default database."
+                )
+            moved.extend(rater_pks)
+            self.stdout.write(f"{alias}: {len(rater_pks)} raters, {counts['people']} "
+                              f"people, {counts['aliases']} aliases, "
+                              f"{counts['interactions']} interactions, "
+                              f"{counts['scores']} scores copied")
+        if moved and not keep_source:
+            counts = write_transaction(prune_source, moved, using=DEFAULT_DB_ALIAS)
+            self.stdout.write(f"Removed {counts['interactions']} interactions, "
+                              f"{counts['scores']} scores and {counts['people']} "
+                              f"people from the default database.")
+        if skipped:
+            self.stdout.write(f"{skipped} raters weren't in the mapping and were "
+                              f"left out.")
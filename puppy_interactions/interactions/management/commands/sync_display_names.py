@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from puppy_interactions.interactions.slack import sync_display_names
+
+
+class Command(BaseCommand):
+    help = "Page through Slack's users.list and store display names on Persons"
+
+    def handle(self, *args, **options):
+        updated = sync_display_names()
+        self.stdout.write(f"Updated {updated} display names.")
@@ -0,0 +1,24 @@
+import threading
+from collections import Counter
+from typing import Dict
+
+_counters = Counter()  # type: Counter
+_lock = threading.Lock()
+
+
+def incr(name: str, value: int = 1) -> None:
+    """add to an in-process counter, like `response_cache.hit`"""
+    with _lock:
+        _counters[name] += value
+
+
+def snapshot(prefix: str = "") -> Dict[str, int]:
+    """the current value of every counter starting with `prefix`"""
+    with _lock:
+        return {name: value for name, value in _counters.items()
+                if name.startswith(prefix)}
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
@@ -0,0 +1,27 @@
+# Generated by Django 2.1.15 on 2026-10-19 03:46
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interactions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommandReceipt',
+            fields=[
+                ('guid', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('response', models.TextField()),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.1.15 on 2026-10-19 03:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interactions', '0002_commandreceipt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='data_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
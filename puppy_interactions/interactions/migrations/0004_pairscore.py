@@ -0,0 +1,31 @@
+# Generated by Django 2.1.15 on 2026-10-19 04:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interactions', '0003_person_data_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PairScore',
+            fields=[
+                ('guid', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('score', models.FloatField(default=0)),
+                ('as_of', models.DateTimeField()),
+                ('ratee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='interactions.Person')),
+                ('rater', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pair_scores', to='interactions.Person')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='pairscore',
+            unique_together={('rater', 'ratee')},
+        ),
+    ]
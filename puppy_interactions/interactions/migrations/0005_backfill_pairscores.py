@@ -0,0 +1,41 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+POINTS = {"+": 1.0, "-": -1.0}
+BATCH_SIZE = 500
+
+
+def backfill(apps, schema_editor):
+    """score every pair from its whole history, as of now"""
+    Interaction = apps.get_model("interactions", "Interaction")
+    PairScore = apps.get_model("interactions", "PairScore")
+    alias = schema_editor.connection.alias
+    now = timezone.now()
+    half_life = settings.INTERACTIONS_SCORE_HALF_LIFE_DAYS * 24 * 60 * 60
+
+    scores = defaultdict(float)
+    rows = (Interaction.objects.using(alias).filter(ratee__isnull=False)
+            .values_list("rater_id", "ratee_id", "rating", "created").iterator())
+    for rater_id, ratee_id, rating, created in rows:
+        elapsed = max((now - created).total_seconds(), 0)
+        scores[rater_id, ratee_id] += POINTS.get(rating, 0) * 0.5 ** (elapsed / half_life)
+
+    PairScore.objects.using(alias).bulk_create(
+        [PairScore(rater_id=rater_id, ratee_id=ratee_id, score=score, as_of=now)
+         for (rater_id, ratee_id), score in scores.items()],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interactions', '0004_pairscore'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.1.15 on 2026-10-19 04:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interactions', '0005_backfill_pairscores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonTrigram',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='interactions.Person')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='persontrigram',
+            index=models.Index(fields=['trigram', 'person'], name='interaction_trigram_276361_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='persontrigram',
+            unique_together={('person', 'trigram')},
+        ),
+    ]
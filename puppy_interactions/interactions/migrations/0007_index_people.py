@@ -0,0 +1,42 @@
+import re
+
+from django.db import migrations
+
+BATCH_SIZE = 2000
+WORDS = re.compile(r"[^\W_]+")
+
+
+def trigrams(text):
+    """as `search.trigrams` when this migration was written"""
+    grams = set()
+    for word in WORDS.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[start:start + 3] for start in range(len(padded) - 2))
+    return grams
+
+
+def index_people(apps, schema_editor):
+    Person = apps.get_model("interactions", "Person")
+    PersonTrigram = apps.get_model("interactions", "PersonTrigram")
+    alias = schema_editor.connection.alias
+    rows = []
+    for pk, user_id, display_name in (Person.objects.using(alias)
+                                      .values_list("pk", "user_id", "display_name")
+                                      .iterator()):
+        rows.extend(PersonTrigram(person_id=pk, trigram=gram)
+                    for gram in trigrams(f"{user_id} {display_name}"))
+        if len(rows) >= BATCH_SIZE:
+            PersonTrigram.objects.using(alias).bulk_create(rows)
+            rows = []
+    PersonTrigram.objects.using(alias).bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interactions', '0006_persontrigram'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_people, migrations.RunPython.noop),
+    ]
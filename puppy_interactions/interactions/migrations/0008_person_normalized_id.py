@@ -0,0 +1,37 @@
+# Generated by Django 2.1.15 on 2026-10-19 04:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interactions', '0007_index_people'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonAlias',
+            fields=[
+                ('guid', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('alias', models.CharField(max_length=255, unique=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='person',
+            name='normalized_id',
+            field=models.CharField(editable=False, max_length=255, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='personalias',
+            name='person',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='interactions.Person'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+BATCH_SIZE = 400
+
+
+def normalize_user_id(user_id):
+    """as `identity.normalize_user_id` when this migration was written"""
+    return " ".join(user_id.split()).casefold()
+
+
+def normalize(apps, schema_editor):
+    """key everyone, the earliest Person per key first. later Persons with a taken
+    key are left without one for `merge_people` to merge"""
+    Person = apps.get_model("interactions", "Person")
+    alias = schema_editor.connection.alias
+    taken = set()
+    keys = {}
+    for pk, user_id in (Person.objects.using(alias).order_by("created", "pk")
+                        .values_list("pk", "user_id")):
+        key = normalize_user_id(user_id)
+        if key not in taken:
+            taken.add(key)
+            keys[pk] = key
+    pks = list(keys)
+    for start in range(0, len(pks), BATCH_SIZE):
+        for person in Person.objects.using(alias).filter(
+                pk__in=pks[start:start + BATCH_SIZE]):
+            person.normalized_id = keys[person.pk]
+            person.save(using=alias, update_fields=["normalized_id"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interactions', '0008_person_normalized_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.1.15 on 2026-10-19 04:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interactions', '0009_normalize_people'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='interaction',
+            name='rater',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='rater_interactions', to='interactions.Person'),
+        ),
+        migrations.AddIndex(
+            model_name='interaction',
+            index=models.Index(fields=['rater', 'created'], name='interaction_rater_i_179c84_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='interaction',
+            index=models.Index(fields=['rater', 'ratee', 'created', 'rating'], name='interaction_rater_i_22ec60_idx'),
+        ),
+    ]
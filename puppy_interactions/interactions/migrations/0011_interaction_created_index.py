@@ -0,0 +1,17 @@
+# Generated by Django 2.1.15 on 2026-10-19 04:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interactions', '0010_interaction_rater_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='interaction',
+            index=models.Index(fields=['created'], name='interaction_created_db8e1e_idx'),
+        ),
+    ]
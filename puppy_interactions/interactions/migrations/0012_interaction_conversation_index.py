@@ -0,0 +1,17 @@
+# Generated by Django 2.1.15 on 2026-10-19 04:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interactions', '0011_interaction_created_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='interaction',
+            index=models.Index(fields=['rater', 'conversation'], name='interaction_rater_i_08e7bb_idx'),
+        ),
+    ]
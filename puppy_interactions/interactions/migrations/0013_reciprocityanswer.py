@@ -0,0 +1,30 @@
+# Generated by Django 2.1.15 on 2026-10-19 04:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interactions', '0012_interaction_conversation_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReciprocityAnswer',
+            fields=[
+                ('guid', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('period', models.DateField()),
+                ('answer', models.TextField()),
+                ('person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='interactions.Person')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='reciprocityanswer',
+            unique_together={('person', 'period')},
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 2.1.15 on 2026-10-19 04:59
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interactions', '0013_reciprocityanswer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Shard',
+            fields=[
+                ('guid', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('alias', models.CharField(max_length=64, unique=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -16,8 +16,16 @@ class InteractionBaseModel(models.Model):
 class Person(InteractionBaseModel):
     # Slack `user-id` or string representation (for interactions without @notation)
     user_id = models.CharField(max_length=255, unique=True)
+    # `identity.normalize_user_id(user_id)`, what lookups go by. empty for people
+    # from before it was added whose key another Person holds, until they are
+    # merged into that Person with `merge_people`
+    normalized_id = models.CharField(max_length=255, unique=True, null=True,
+                                     editable=False)
     display_name = models.CharField(max_length=255, blank=True)
 
+    # bumped whenever this Person's own interactions change; keys cached responses
+    data_version = models.PositiveIntegerField(default=0, editable=False)
+
     def __str__(self):
         if self.display_name != "":
             return self.display_name
@@ -43,11 +51,13 @@ class Interaction(InteractionBaseModel):
     based heuristics.
     """
 
-    # ensure this is set the same for all interactions in the conversation
+    # ensure this is set the same for all interactions in the conversation, which is
+    # every interaction logged by one command (see `create_interactions_batch`)
     conversation = models.UUIDField(default=uuid.uuid4)
 
+    # indexed as the first column of the indexes below
     rater = models.ForeignKey('interactions.Person', on_delete=models.PROTECT,
-                              related_name='rater_interactions')
+                              related_name='rater_interactions', db_index=False)
 
     ratee = models.ForeignKey('interactions.Person', on_delete=models.PROTECT,
                               related_name='ratee_interactions', null=True)
@@ -60,13 +70,143 @@ class Interaction(InteractionBaseModel):
     )
     rating = models.CharField(max_length=1, choices=RATING_CHOICES)
 
+    ICONS = {POSITIVE: ":slightly_smiling_face:",
+             NEGATIVE: ":white_frowning_face:"}
+    UNKNOWN_ICON = ":grey_question:"
+
+    class Meta:
+        indexes = [
+            # logs: newest first, without sorting
+            models.Index(fields=["rater", "created"]),
+            # top people: grouped by ratee and counted, all from the index
+            models.Index(fields=["rater", "ratee", "created", "rating"]),
+            # the admin's date hierarchy and newest first changelist
+            models.Index(fields=["created"]),
+            # undo and the conversations list: a rater's interactions per conversation
+            models.Index(fields=["rater", "conversation"]),
+        ]
+
     @staticmethod
     def map_to_icon(rating: str) -> str:
         """return a Slack emoji from a rating"""
-        m = {Interaction.POSITIVE: ":slightly_smiling_face:",
-             Interaction.NEGATIVE: ":white_frowning_face:"}
-        return m.get(rating, ":grey_question:")
+        return Interaction.ICONS.get(rating, Interaction.UNKNOWN_ICON)
 
     def __str__(self):
         icon = self.map_to_icon(self.rating)
         return f"*{self.ratee}*\t{self.created.strftime('%d %b %Y')}\t*{icon}*"
+
+
+class CommandReceipt(InteractionBaseModel):
+    """
+    the response we sent for a write command. when we are slow, Slack retries the
+    slash command; the retry finds this receipt and gets the same answer back
+    without writing anything again. receipts are pruned after
+    `INTERACTIONS_IDEMPOTENCY_TTL` seconds.
+    """
+
+    # sha256 hex digest, see `idempotency.command_key`
+    key = models.CharField(max_length=64, unique=True)
+
+    # the JSON response body
+    response = models.TextField()
+
+    def __str__(self):
+        return self.key
+
+
+class PairScore(InteractionBaseModel):
+    """
+    a rater's running score for a ratee: every `+` adds one and every `-` takes one
+    away, and the total halves every `INTERACTIONS_SCORE_HALF_LIFE_DAYS`, so recent
+    interactions count for more than old ones.
+
+    `score` is as of `as_of`. it is only stored when the pair interacts again; to
+    read it at any other time, decay it from `as_of` (see `scores.decayed`).
+    """
+
+    rater = models.ForeignKey('interactions.Person', on_delete=models.CASCADE,
+                              related_name='pair_scores')
+
+    ratee = models.ForeignKey('interactions.Person', on_delete=models.CASCADE,
+                              related_name='+')
+
+    score = models.FloatField(default=0)
+
+    as_of = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("rater", "ratee")
+
+    def __str__(self):
+        return f"{self.rater} -> {self.ratee}: {self.score:.2f}"
+
+
+class PersonAlias(InteractionBaseModel):
+    """
+    another name a Person goes by, like a raw name (normalized, see `identity`)
+    mapped to the Slack user it stands for. lookups that match no Person's
+    `normalized_id` find the Person here.
+    """
+
+    alias = models.CharField(max_length=255, unique=True)
+
+    person = models.ForeignKey('interactions.Person', on_delete=models.CASCADE,
+                               related_name='aliases')
+
+    def __str__(self):
+        return f"{self.alias} -> {self.person}"
+
+
+class PersonTrigram(models.Model):
+    """
+    one trigram of a Person's `user_id` or `display_name`, for fuzzy search (see
+    `search`). a plain index table, so it skips the `guid` and timestamps.
+    """
+
+    person = models.ForeignKey('interactions.Person', on_delete=models.CASCADE,
+                               related_name='trigrams')
+
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        unique_together = ("person", "trigram")
+        indexes = [models.Index(fields=["trigram", "person"])]
+
+    def __str__(self):
+        return f"{self.person}: {self.trigram!r}"
+
+
+class ReciprocityAnswer(InteractionBaseModel):
+    """
+    the `/interactions mutual` answer a Person got for a period (see `graph`). it's
+    given again for the rest of the period, whatever changes, so rating, undoing
+    and re-rating can't single out one person's rating. older periods are pruned.
+    """
+
+    person = models.ForeignKey('interactions.Person', on_delete=models.CASCADE,
+                               related_name='+')
+
+    # the first day of the period
+    period = models.DateField()
+
+    # the JSON `graph.Reciprocity`
+    answer = models.TextField()
+
+    class Meta:
+        unique_together = ("person", "period")
+
+    def __str__(self):
+        return f"{self.person} ({self.period})"
+
+
+class Shard(InteractionBaseModel):
+    """
+    a team's database (see `sharding`), recorded in the default database the first
+    time it's used, so scheduled jobs and the admin can go through every shard.
+    only the alias is kept, a hash that doesn't reveal the team.
+    """
+
+    alias = models.CharField(max_length=64, unique=True)
+
+    def __str__(self):
+        return self.alias
@@ -0,0 +1,199 @@
+"""
+opt-in profiles of single slash command requests, for finding out why one was slow.
+
+`profiled` wraps a view method. a request is profiled when it's sampled, at
+`SAMPLE_RATE`, or when it carries an `X-Interactions-Profile` header signed with
+`SECRET` (see `sign_header`). the profile is a cProfile of the request (`MODE`
+"cprofile") or a count of its stacks, sampled every `SAMPLE_INTERVAL` seconds
+(`MODE` "sample", cheaper), together with the SQL statements it ran, their times
+and the database (or team shard) each ran on. statements are stored without their
+parameters, which hold user ids.
+
+profiles are stored as JSON under `profiles/` in the storage configured by
+`INTERACTIONS_PROFILING` (see `replication.storage_from`): a directory in tests and
+development, a bucket in production. `python manage.py profile_summary` sums them
+up by command.
+"""
+import cProfile
+import hashlib
+import hmac
+import json
+import logging
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from functools import wraps
+from typing import List, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from puppy_interactions.interactions import metrics
+from puppy_interactions.interactions.replication import storage_from
+
+logger = logging.getLogger('puppy_interactions')
+
+HEADER = "HTTP_X_INTERACTIONS_PROFILE"
+# signed headers are accepted for this many seconds
+HEADER_MAX_AGE = 5 * 60
+PREFIX = "profiles"
+TOP_FUNCTIONS = 40
+TOP_STACKS = 40
+SAMPLE_INTERVAL = 0.005
+
+_active = threading.local()
+
+
+def sign_header(now: Optional[float] = None, secret: Optional[str] = None) -> str:
+    """a value for the `X-Interactions-Profile` header, good for `HEADER_MAX_AGE`"""
+    stamp = str(int(now if now is not None else time.time()))
+    secret = secret or settings.INTERACTIONS_PROFILING["SECRET"]
+    signature = hmac.new(secret.encode(), stamp.encode(), hashlib.sha256).hexdigest()
+    return f"{stamp}.{signature}"
+
+
+def _header_valid(value: str) -> bool:
+    secret = settings.INTERACTIONS_PROFILING["SECRET"]
+    stamp, _, _ = value.partition(".")
+    if not secret or not stamp.isdigit():
+        return False
+    if abs(time.time() - int(stamp)) > HEADER_MAX_AGE:
+        return False
+    return hmac.compare_digest(value, sign_header(int(stamp), secret))
+
+
+def should_profile(request) -> bool:
+    config = settings.INTERACTIONS_PROFILING
+    if not config["STORAGE"]:
+        return False
+    header = request.META.get(HEADER)
+    if header:
+        return _header_valid(header)
+    return random.random() < config["SAMPLE_RATE"]
+
+
+def record_queries(execute, sql, params, many, context):
+    """an `execute_wrapper` for every connection (see `apps`) that times
+    statements while a profile is running in this thread"""
+    queries = getattr(_active, "queries", None)
+    if queries is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        queries.append({"sql": sql, "many": many,
+                        "database": context["connection"].alias,
+                        "ms": round((time.perf_counter() - start) * 1000, 3)})
+
+
+def install_recorder(sender, connection, **kwargs) -> None:
+    """`connection_created` receiver adding `record_queries` to the connection"""
+    if record_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_queries)
+
+
+class StackSampler:
+    """counts the stacks of one thread, read every `interval` seconds from
+    another, in the collapsed format flame graph tools read"""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()  # type: Counter
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_filename}:{code.co_name}")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def _top_functions(profile: cProfile.Profile) -> List[dict]:
+    stats = pstats.Stats(profile).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)
+    return [{"function": f"{filename}:{line}({name})", "calls": calls,
+             "tottime_ms": round(tottime * 1000, 3),
+             "cumtime_ms": round(cumtime * 1000, 3)}
+            for (filename, line, name), (_, calls, tottime, cumtime, _)
+            in rows[:TOP_FUNCTIONS]]
+
+
+def _store(report: dict) -> None:
+    storage = storage_from(settings.INTERACTIONS_PROFILING)
+    key = (f"{PREFIX}/{report['command']}-{report['started']:%Y%m%dT%H%M%S}-"
+           f"{uuid.uuid4().hex[:8]}.json")
+    storage.put(key, json.dumps(report, default=str).encode())
+    metrics.incr("profiling.stored")
+
+
+def profiled(command_of):
+    """profile the wrapped view method when `should_profile` says so. `command_of`
+    names a request's command for the report, see `InteractionView`"""
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if not should_profile(request):
+                return method(view, request, *args, **kwargs)
+
+            mode = settings.INTERACTIONS_PROFILING["MODE"]
+            started = timezone.now()
+            _active.queries = queries = []
+            if mode == "sample":
+                profiler = StackSampler(threading.get_ident())
+                profiler.start()
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+            start = time.perf_counter()
+            try:
+                return method(view, request, *args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                if mode == "sample":
+                    profiler.stop()
+                else:
+                    profiler.disable()
+                _active.queries = None
+                try:
+                    report = {"command": command_of(request), "mode": mode,
+                              "started": started, "ms": round(elapsed * 1000, 3),
+                              "queries": queries}
+                    if mode == "sample":
+                        report["stacks"] = dict(
+                            profiler.stacks.most_common(TOP_STACKS))
+                    else:
+                        report["functions"] = _top_functions(profiler)
+                    _store(report)
+                except Exception:
+                    # the response is ready either way
+                    metrics.incr("profiling.failed")
+                    logger.exception("Profiling Exception!")
+        return wrapper
+    return decorator
+
+
+def load_profiles(storage=None) -> List[dict]:
+    """every stored profile, by command and then time"""
+    storage = storage or storage_from(settings.INTERACTIONS_PROFILING)
+    if storage is None:
+        return []
+    return [json.loads(storage.get(key).decode()) for key in storage.list(PREFIX)]
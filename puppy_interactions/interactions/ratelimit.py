@@ -0,0 +1,69 @@
+import math
+import time
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+# the budget each command draws from; commands not listed are never throttled
+COMMAND_BUDGETS = {
+    "create": "write",
+    "clear": "write",
+    "undo": "write",
+    "logs": "read",
+    "top": "read",
+    "trend": "read",
+    "find": "read",
+    "conversations": "read",
+    "mutual": "read",
+    "token": "read",
+}
+
+
+class TokenBucket:
+    """a token bucket per key, with its state kept in a Django cache
+
+    each key holds up to `capacity` tokens and regains `rate` tokens per second.
+    the cache is the shared store: point `INTERACTIONS_RATE_LIMIT_CACHE` at a
+    cache every instance can reach. read-modify-write is not atomic, so a burst
+    across instances can overspend by a token or two - fine for our purpose"""
+
+    def __init__(self, name: str, capacity: float, rate: float,
+                 cache_alias: Optional[str] = None,
+                 clock: Callable[[], float] = time.time):
+        self.name = name
+        self.capacity = capacity
+        self.rate = rate
+        self.cache = caches[cache_alias or settings.INTERACTIONS_RATE_LIMIT_CACHE]
+        self.clock = clock
+
+    def _key(self, key: str) -> str:
+        return f"ratelimit:{self.name}:{key}"
+
+    def consume(self, key: str, tokens: float = 1) -> float:
+        """take `tokens` for `key`. returns 0 on success, otherwise the seconds until
+        enough tokens will be available"""
+        now = self.clock()
+        available, updated = self.cache.get(self._key(key), (self.capacity, now))
+        available = min(self.capacity, available + (now - updated) * self.rate)
+        if available < tokens:
+            return (tokens - available) / self.rate
+        # an idle bucket refills completely; no need to keep it around after that
+        timeout = math.ceil(self.capacity / self.rate)
+        self.cache.set(self._key(key), (available - tokens, now), timeout)
+        return 0
+
+
+def get_buckets() -> dict:
+    """a TokenBucket per budget, from `INTERACTIONS_RATE_LIMITS`"""
+    return {name: TokenBucket(name, limits["capacity"], limits["per_minute"] / 60)
+            for name, limits in settings.INTERACTIONS_RATE_LIMITS.items()}
+
+
+def throttle(command: str, user_id: str) -> float:
+    """charge `command` to `user_id`'s budget. returns 0 if it may go ahead,
+    otherwise the seconds until it would be allowed"""
+    budget = COMMAND_BUDGETS.get(command)
+    if budget is None:
+        return 0
+    return get_buckets()[budget].consume(user_id)
@@ -25,5 +25,18 @@ days_pattern = re.compile(days)
 aggregate_pattern = re.compile(aggregate, re.I)
 filter_pattern = re.compile(filter, re.I)
 
+# top [N] [days] [+|-]
+top_pattern = re.compile(r'^top(\s+{}){{0,2}}(\s*({}))?$'.format(days, filter),
+                         re.IGNORECASE)
+
 clear_pattern = re.compile(r'^clear$', re.IGNORECASE)
 help_pattern = re.compile(r'^help$', re.IGNORECASE)
+trend_pattern = re.compile(r'^trend$', re.IGNORECASE)
+undo_pattern = re.compile(r'^undo$', re.IGNORECASE)
+mutual_pattern = re.compile(r'^mutual$', re.IGNORECASE)
+token_pattern = re.compile(r'^token$', re.IGNORECASE)
+# conversations [days]
+conversations_pattern = re.compile(r'^conversations(\s+{})?$'.format(days),
+                                   re.IGNORECASE)
+# find <text>
+find_pattern = re.compile(r'^find\s+(?P<text>\S.*)$', re.IGNORECASE)
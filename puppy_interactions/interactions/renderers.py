@@ -0,0 +1,61 @@
+from typing import Dict, Iterable, List, Tuple
+
+from puppy_interactions.interactions.models import Interaction
+from puppy_interactions.interactions.utils import Conversation, LogRecord
+
+DATE_FORMAT = "%d %b %Y"
+
+
+def render_log_attachments(records: Iterable[LogRecord]) -> List[dict]:
+    """format LogRecords as Slack attachments, like the `Interaction.__str__` text
+
+    logs are mostly a handful of rows per day, so each calendar day is formatted
+    once and reused"""
+    icons = Interaction.ICONS
+    unknown = Interaction.UNKNOWN_ICON
+    days = {}  # type: Dict[int, str]
+    attachments = []
+    for ratee, rating, created in records:
+        ordinal = created.toordinal()
+        day = days.get(ordinal)
+        if day is None:
+            day = days[ordinal] = created.strftime(DATE_FORMAT)
+        attachments.append(
+            {"text": f"*{ratee}*\t{day}\t*{icons.get(rating, unknown)}*"}
+        )
+    return attachments
+
+
+def render_score_attachments(scores: Iterable[Tuple[str, float]]) -> List[dict]:
+    """format `(ratee, score)` pairs (see `scores.retrieve_trend`) as Slack
+    attachments"""
+    return [{"text": f"*{ratee}*:: {score:+.1f}"} for ratee, score in scores]
+
+
+def render_match_attachments(matches: Iterable[Tuple[str, int]]) -> List[dict]:
+    """format `(ratee, interactions)` pairs (see `search.find_people`) as Slack
+    attachments"""
+    return [{"text": f"*{ratee}*:: {count} interactions"} for ratee, count in matches]
+
+
+def render_conversation_attachments(conversations: Iterable[Conversation]
+                                    ) -> List[dict]:
+    """format Conversations (see `retrieve_conversations`) as Slack attachments, a
+    line per conversation"""
+    icons = Interaction.ICONS
+    unknown = Interaction.UNKNOWN_ICON
+    return [
+        {"text": f"{started.strftime(DATE_FORMAT)}:: " + ", ".join(
+            f"*{ratee}* {icons.get(rating, unknown)}" for ratee, rating in participants
+        )}
+        for started, participants in conversations
+    ]
+
+
+def render_aggregate_attachments(aggregated: dict) -> List[dict]:
+    """format aggregated logs (see `retrieve_aggregated_logs`) as Slack attachments"""
+    return [
+        {"text": f"{key}:: *positive* {stats['positive']} / "
+                 f"*negative* {stats['negative']}"}
+        for key, stats in aggregated.items()
+    ]
@@ -0,0 +1,517 @@
+"""
+replicate SQLite database files to a bucket by the page, rather than uploading the
+whole file after every write like `s3sqlite` does.
+
+after each committed write, `Replicator.sync` hashes the file's pages, compares them
+with the hashes as of its last upload and uploads just the changed pages as the next
+numbered delta. every `SNAPSHOT_EVERY` deltas - or sooner, once the deltas add up to
+more than the file - it uploads a full snapshot instead, which bounds how much a
+restore replays, and prunes what the snapshot before it no longer needs. `restore`
+rebuilds the file from the latest snapshot and the deltas after it. snapshots are
+compressed on the way up and decompressed on the way down, see `snapshot`.
+
+keys look like `<file name>/snapshots/<seq>` and `<file name>/deltas/<seq>`, with
+one sequence across both. nothing stops several processes (say, concurrent Lambda
+containers) from writing one database, so:
+
+* every upload is conditional: it fails with `ReplicaConflict` if its key already
+  exists, so a process can't overwrite what another uploaded as the same sequence,
+* the sequence a file was last uploaded or restored as is kept next to it (as
+  `<file>.replica`), and a file that isn't at the bucket's latest sequence is
+  restored rather than snapshotted over newer data,
+* `refresh` lists the bucket before a request reads or writes, and restores the
+  file if another process has uploaded since.
+
+a write that races another process's is still committed locally, but its upload
+is refused and it's lost at the next restore (counted as `replication.conflicts`).
+only a single writing process, such as a Lambda function with reserved concurrency
+1, never loses one. configure with `INTERACTIONS_REPLICATION`; uploaded bytes are
+counted in `metrics` under `replication.`.
+"""
+import hashlib
+import io
+import logging
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import zlib
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
+
+from puppy_interactions.interactions import metrics, snapshot
+
+logger = logging.getLogger('puppy_interactions')
+
+SNAPSHOTS = "snapshots"
+DELTAS = "deltas"
+DELTA_MAGIC = b"PIDELTA1"
+# page size, page count, changed pages; then (page number, page) for each
+DELTA_HEADER = struct.Struct(">III")
+PAGE_NUMBER = struct.Struct(">I")
+DEFAULT_PAGE_SIZE = 4096
+MARKER_SUFFIX = ".replica"
+
+
+class ReplicaConflict(Exception):
+    """another process has uploaded to the bucket since this one last did"""
+
+
+class LocalDirectoryStorage:
+    """a directory standing in for a bucket, for tests and local development"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def put(self, key: str, data: bytes, exclusive: bool = False) -> None:
+        self.put_file(key, io.BytesIO(data), exclusive)
+
+    def put_file(self, key: str, f: BinaryIO, exclusive: bool = False) -> None:
+        """`exclusive` raises `ReplicaConflict` rather than replace an existing key"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, temporary = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+        with open(handle, "wb") as target:
+            shutil.copyfileobj(f, target)
+        if not exclusive:
+            os.replace(temporary, path)
+            return
+        try:
+            # unlike a rename, a link fails if the key exists
+            os.link(temporary, path)
+        except FileExistsError:
+            raise ReplicaConflict(key)
+        finally:
+            os.remove(temporary)
+
+    def get(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self._path(key), "rb")
+
+    def list(self, prefix: str) -> List[str]:
+        directory = self._path(prefix)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(f"{prefix}/{name}" for name in os.listdir(directory)
+                      if not name.endswith(".tmp"))
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class S3Storage:
+    """objects under `prefix` in an S3 bucket; needs `boto3`, as on Lambda"""
+
+    def __init__(self, bucket: str, prefix: str = ""):
+        try:
+            import boto3
+        except ImportError:
+            raise ImproperlyConfigured("S3 replication needs boto3 installed.")
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client("s3")
+
+    def put(self, key: str, data: bytes, exclusive: bool = False) -> None:
+        self._put_object(key, data, exclusive)
+
+    def put_file(self, key: str, f: BinaryIO, exclusive: bool = False) -> None:
+        if exclusive:
+            # a multipart upload can't be made conditional; one PUT streams the file
+            self._put_object(key, f, exclusive)
+        else:
+            # multipart for large files, without reading them into memory
+            self.client.upload_fileobj(f, self.bucket, self.prefix + key)
+
+    def _put_object(self, key: str, body, exclusive: bool) -> None:
+        """`exclusive` raises `ReplicaConflict` rather than replace an existing key,
+        with S3's conditional writes (`If-None-Match: *`)"""
+        condition = {"IfNoneMatch": "*"} if exclusive else {}
+        try:
+            self.client.put_object(Bucket=self.bucket, Key=self.prefix + key,
+                                   Body=body, **condition)
+        except self.client.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] in ("PreconditionFailed",
+                                               "ConditionalRequestConflict"):
+                raise ReplicaConflict(key) from e
+            raise
+
+    def get(self, key: str) -> bytes:
+        return self.open(key).read()
+
+    def open(self, key: str) -> BinaryIO:
+        return self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)["Body"]
+
+    def list(self, prefix: str) -> List[str]:
+        keys = []
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket,
+                                       Prefix=f"{self.prefix}{prefix}/"):
+            keys.extend(item["Key"][len(self.prefix):]
+                        for item in page.get("Contents", []))
+        return sorted(keys)
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+
+def storage_from(config: dict):
+    """the storage a `STORAGE`/`LOCATION`/`PREFIX` settings dict describes, or
+    None when `STORAGE` is empty"""
+    if config["STORAGE"] == "local":
+        return LocalDirectoryStorage(config["LOCATION"])
+    if config["STORAGE"] == "s3":
+        return S3Storage(config["LOCATION"], config.get("PREFIX", ""))
+    if config["STORAGE"]:
+        raise ImproperlyConfigured(f"Unknown storage {config['STORAGE']!r}")
+    return None
+
+
+def get_storage():
+    """the storage configured by `INTERACTIONS_REPLICATION`, or None when off"""
+    return storage_from(settings.INTERACTIONS_REPLICATION)
+
+
+def page_size(path: str) -> int:
+    """the page size from a SQLite file's header"""
+    with open(path, "rb") as f:
+        header = f.read(18)
+    if len(header) < 18:
+        return DEFAULT_PAGE_SIZE
+    size = int.from_bytes(header[16:18], "big")
+    return 65536 if size == 1 else size or DEFAULT_PAGE_SIZE
+
+
+def _sequence(key: str) -> int:
+    return int(key.rsplit("/", 1)[1])
+
+
+def _key(name: str, kind: str, seq: int) -> str:
+    return f"{name}/{kind}/{seq:012d}"
+
+
+def encode_delta(size: int, page_count: int, pages: List[Tuple[int, bytes]]) -> bytes:
+    body = [DELTA_HEADER.pack(size, page_count, len(pages))]
+    for number, page in pages:
+        body.append(PAGE_NUMBER.pack(number))
+        body.append(page)
+    return DELTA_MAGIC + zlib.compress(b"".join(body))
+
+
+def apply_delta(f, data: bytes) -> None:
+    """write a delta's pages into an open file and truncate it to the delta's size"""
+    if not data.startswith(DELTA_MAGIC):
+        raise ValueError("Not a replication delta.")
+    body = zlib.decompress(data[len(DELTA_MAGIC):])
+    size, page_count, count = DELTA_HEADER.unpack_from(body)
+    offset = DELTA_HEADER.size
+    for _ in range(count):
+        number, = PAGE_NUMBER.unpack_from(body, offset)
+        offset += PAGE_NUMBER.size
+        f.seek(number * size)
+        f.write(body[offset:offset + size])
+        offset += size
+    f.truncate(page_count * size)
+
+
+def restore(storage, name: str, path: str) -> bool:
+    """rebuild the database file at `path` from the latest snapshot of `name` and
+    the deltas after it, discarding its WAL. returns False when there is nothing to
+    restore. nothing may have the file open"""
+    snapshots = storage.list(f"{name}/{SNAPSHOTS}")
+    if not snapshots:
+        return False
+    latest = _sequence(snapshots[-1])
+    deltas = [key for key in storage.list(f"{name}/{DELTAS}")
+              if _sequence(key) > latest]
+    with open(f"{path}.restore", "wb") as f:
+        source = storage.open(snapshots[-1])
+        try:
+            snapshot.decompress_stream(source, f)
+        finally:
+            source.close()
+        for key in deltas:
+            apply_delta(f, storage.get(key))
+    os.replace(f"{path}.restore", path)
+    for suffix in ("-wal", "-shm"):
+        try:
+            os.remove(f"{path}{suffix}")
+        except FileNotFoundError:
+            pass
+    logger.info(f"Restored {name} from a snapshot and {len(deltas)} deltas.")
+    return True
+
+
+class Replicator:
+    """uploads one database file's changes, see the module docstring"""
+
+    def __init__(self, path: str, storage, name: Optional[str] = None,
+                 snapshot_every: Optional[int] = None, codec: Optional[str] = None):
+        self.path = path
+        self.storage = storage
+        self.name = name or os.path.basename(path)
+        self.snapshot_every = (snapshot_every or
+                               settings.INTERACTIONS_REPLICATION["SNAPSHOT_EVERY"])
+        self.codec = snapshot.default_codec(
+            codec or settings.INTERACTIONS_REPLICATION.get("SNAPSHOT_CODEC"))
+        self._hashes = None  # type: Optional[List[bytes]]
+        self._seq = 0
+        self._snapshot_seq = 0
+        self._deltas = 0  # since the last snapshot
+        self._delta_bytes = 0
+        # set once an upload was refused, until the file is restored
+        self._stale = False
+        self._lock = threading.Lock()
+
+    def _remote_sequence(self) -> Tuple[int, int, int]:
+        """the bucket's latest snapshot, latest sequence and deltas since that
+        snapshot"""
+        snapshots = self.storage.list(f"{self.name}/{SNAPSHOTS}")
+        deltas = self.storage.list(f"{self.name}/{DELTAS}")
+        snapshot_seq = _sequence(snapshots[-1]) if snapshots else 0
+        return (snapshot_seq,
+                max([snapshot_seq] + [_sequence(key) for key in deltas]),
+                sum(1 for key in deltas if _sequence(key) > snapshot_seq))
+
+    def _load_sequence(self) -> None:
+        self._snapshot_seq, self._seq, self._deltas = self._remote_sequence()
+
+    def _local_sequence(self) -> Optional[int]:
+        """the sequence the file was last uploaded or restored as, if known"""
+        try:
+            with open(self.path + MARKER_SUFFIX) as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _mark(self) -> None:
+        with open(f"{self.path}{MARKER_SUFFIX}.tmp", "w") as f:
+            f.write(str(self._seq))
+        os.replace(f"{self.path}{MARKER_SUFFIX}.tmp", self.path + MARKER_SUFFIX)
+
+    def _restore(self) -> bool:
+        restored = restore(self.storage, self.name, self.path)
+        self._hashes = [digest for digest, _ in self._pages()] if restored else None
+        self._delta_bytes = 0
+        self._stale = False
+        if restored:
+            self._mark()
+        return restored
+
+    def start(self) -> bool:
+        """take the file's state as uploaded, restoring it first if it's missing or
+        behind the bucket. a file at the bucket's latest sequence may hold changes
+        the bucket doesn't, so it gets a snapshot. returns whether the file was
+        restored"""
+        with self._lock:
+            self._load_sequence()
+            if os.path.exists(self.path):
+                if self._seq in (0, self._local_sequence()):
+                    try:
+                        self._snapshot()
+                        return False
+                    except ReplicaConflict:
+                        # another process uploaded since the bucket was listed
+                        metrics.incr("replication.conflicts")
+                        self._load_sequence()
+                logger.warning(f"{self.name} is behind its replica; restoring it.")
+                metrics.incr("replication.behind")
+            return self._restore()
+
+    def behind(self) -> bool:
+        """whether another process has uploaded since this one last did"""
+        with self._lock:
+            return self._stale or self._remote_sequence()[1] != self._seq
+
+    def catch_up(self) -> bool:
+        """restore the file from the bucket, discarding anything it holds that the
+        bucket doesn't. nothing may have the file open"""
+        with self._lock:
+            metrics.incr("replication.behind")
+            self._load_sequence()
+            return self._restore()
+
+    def _pages(self):
+        size = page_size(self.path)
+        with open(self.path, "rb") as f:
+            while True:
+                page = f.read(size)
+                if not page:
+                    return
+                yield hashlib.blake2b(page, digest_size=16).digest(), page
+
+    def _uploaded(self, kind: str, length: int) -> int:
+        self._seq += 1
+        self._mark()
+        metrics.incr("replication.bytes_uploaded", length)
+        metrics.incr(f"replication.{kind}")
+        return length
+
+    def _upload(self, kind: str, data: bytes) -> int:
+        self.storage.put(_key(self.name, kind, self._seq + 1), data, exclusive=True)
+        return self._uploaded(kind, len(data))
+
+    def _snapshot(self) -> int:
+        size = page_size(self.path)
+        hashes = []
+        pending = bytearray()
+
+        def hash_pages(chunk: bytes) -> None:
+            pending.extend(chunk)
+            whole = len(pending) - len(pending) % size
+            hashes.extend(hashlib.blake2b(pending[start:start + size],
+                                          digest_size=16).digest()
+                          for start in range(0, whole, size))
+            del pending[:whole]
+
+        # compressed into a temporary file, so the upload knows its length
+        with open(self.path, "rb") as source, tempfile.TemporaryFile() as compressed:
+            length = snapshot.compress_stream(source, compressed, self.codec,
+                                              on_chunk=hash_pages)
+            compressed.seek(0)
+            self.storage.put_file(_key(self.name, SNAPSHOTS, self._seq + 1), compressed,
+                                  exclusive=True)
+        if pending:
+            hashes.append(hashlib.blake2b(pending, digest_size=16).digest())
+        uploaded = self._uploaded(SNAPSHOTS, length)
+        previous, self._snapshot_seq = self._snapshot_seq, self._seq
+        self._hashes = hashes
+        self._deltas = self._delta_bytes = 0
+        self._prune(previous)
+        return uploaded
+
+    def _prune(self, keep_from: int) -> None:
+        """drop what a restore from the snapshot before last no longer needs"""
+        for kind in (SNAPSHOTS, DELTAS):
+            for key in self.storage.list(f"{self.name}/{kind}"):
+                if _sequence(key) < keep_from:
+                    self.storage.delete(key)
+
+    def _check(self) -> None:
+        if self._stale:
+            raise ReplicaConflict(f"{self.name} is behind its replica.")
+
+    def _refused(self) -> None:
+        """after an upload was refused: upload nothing more until restored"""
+        self._stale = True
+        metrics.incr("replication.conflicts")
+        logger.error(f"Another process uploaded {self.name} first; this process's "
+                     f"changes since are dropped at its next restore.")
+
+    def snapshot(self) -> int:
+        """upload a full snapshot now, as after a VACUUM rewrote every page. like
+        every snapshot it's under a new key, written whole before a restore can see
+        it; returns bytes uploaded"""
+        with self._lock:
+            self._check()
+            try:
+                return self._snapshot()
+            except ReplicaConflict:
+                self._refused()
+                raise
+
+    def sync(self) -> int:
+        """upload the pages changed since the last upload; returns bytes uploaded.
+        raises `ReplicaConflict` once another process has uploaded first"""
+        with self._lock:
+            self._check()
+            try:
+                return self._sync()
+            except ReplicaConflict:
+                self._refused()
+                raise
+
+    def _sync(self) -> int:
+        if self._hashes is None:
+            return self._snapshot()
+
+        size = page_size(self.path)
+        hashes = []
+        changed = []
+        for number, (digest, page) in enumerate(self._pages()):
+            hashes.append(digest)
+            if number >= len(self._hashes) or self._hashes[number] != digest:
+                changed.append((number, page))
+        if not changed and len(hashes) == len(self._hashes):
+            return 0
+
+        file_size = len(hashes) * size
+        metrics.incr("replication.writes")
+        metrics.incr("replication.file_bytes", file_size)
+        if (self._deltas + 1 >= self.snapshot_every
+                or self._delta_bytes + len(changed) * size > file_size):
+            return self._snapshot()
+        uploaded = self._upload(DELTAS, encode_delta(size, len(hashes), changed))
+        self._hashes = hashes
+        self._deltas += 1
+        self._delta_bytes += uploaded
+        return uploaded
+
+
+_replicators = {}  # type: Dict[str, Replicator]
+_registry_lock = threading.Lock()
+
+
+def prepare(using: str) -> Optional[Replicator]:
+    """start replicating the database under `using`, restoring its file first if
+    it's missing. call before the database is opened. None when replication is off"""
+    storage = get_storage()
+    if storage is None:
+        return None
+    with _registry_lock:
+        if using not in _replicators:
+            replicator = Replicator(connections.databases[using]["NAME"], storage)
+            replicator.start()
+            _replicators[using] = replicator
+        return _replicators[using]
+
+
+def refresh(using: str) -> bool:
+    """before a request reads or writes `using`: restore its file if another
+    process has uploaded since this one last did. returns whether it was restored"""
+    replicator = _replicators.get(using)
+    if replicator is None or not replicator.behind():
+        return False
+    connection = connections[using]
+    if connection.in_atomic_block:
+        # the file can't be swapped under an open transaction; its writes will be
+        # refused, and the next request restores it
+        logger.warning(f"{replicator.name} is behind its replica in a transaction.")
+        return False
+    connection.close()
+    return replicator.catch_up()
+
+
+def forget(using: str) -> None:
+    with _registry_lock:
+        _replicators.pop(using, None)
+
+
+def _sync(using: str) -> None:
+    try:
+        with connections[using].cursor() as cursor:
+            # move WAL frames into the file itself, where `sync` reads them
+            cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        prepare(using).sync()
+    except Exception:
+        # the write is committed either way; the next sync uploads its pages
+        metrics.incr("replication.failed")
+        logger.exception("Replication Exception!")
+
+
+def replicate_on_commit(using: str) -> None:
+    """upload the database's changes once the current transaction commits"""
+    if settings.INTERACTIONS_REPLICATION["STORAGE"]:
+        transaction.on_commit(lambda: _sync(using), using=using)
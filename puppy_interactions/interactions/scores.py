@@ -0,0 +1,116 @@
+import heapq
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from puppy_interactions.interactions.bulk import LOOKUP_BATCH_SIZE, update_field_by_key
+from puppy_interactions.interactions.caches import display_names
+from puppy_interactions.interactions.models import Interaction, PairScore, Person
+
+RATING_POINTS = {Interaction.POSITIVE: 1.0, Interaction.NEGATIVE: -1.0}
+# trends leave out scores that have decayed closer to zero than this
+SCORE_FLOOR = 0.05
+
+
+def decayed(score: float, as_of: datetime, now: datetime,
+            half_life_days: Optional[float] = None) -> float:
+    """a score as of `as_of`, carried forward to `now`"""
+    if half_life_days is None:
+        half_life_days = settings.INTERACTIONS_SCORE_HALF_LIFE_DAYS
+    elapsed_days = max((now - as_of).total_seconds(), 0) / (24 * 60 * 60)
+    return score * 0.5 ** (elapsed_days / half_life_days)
+
+
+def _add_points(points: Dict[Tuple[object, object], float], now: datetime,
+                create: bool = True) -> None:
+    """add `{(rater_id, ratee_id): points}` to the pairs' scores, decayed to `now`.
+    pairs are read with a query per `LOOKUP_BATCH_SIZE` // 2 and written with an
+    insert and two updates per `LOOKUP_BATCH_SIZE`. missing pairs are created, with
+    `create`"""
+    if not points:
+        return
+
+    # per chunk of pairs, sorted so a rater's pairs share chunks, fetch by its
+    # raters and ratees, then keep only the pairs we want. both lists are at most
+    # half a chunk, so a query binds at most `LOOKUP_BATCH_SIZE` values
+    pairs = sorted(points, key=lambda pair: (str(pair[0]), str(pair[1])))
+    size = max(LOOKUP_BATCH_SIZE // 2, 1)
+    existing = {}
+    for start in range(0, len(pairs), size):
+        batch = pairs[start:start + size]
+        rows = PairScore.objects.filter(
+            rater_id__in={rater_id for rater_id, _ in batch},
+            ratee_id__in={ratee_id for _, ratee_id in batch},
+        ).values_list("rater_id", "ratee_id", "guid", "score", "as_of")
+        existing.update(((rater_id, ratee_id), (guid, score, as_of))
+                        for rater_id, ratee_id, guid, score, as_of in rows
+                        if (rater_id, ratee_id) in points)
+
+    scores = {guid: decayed(score, as_of, now) + points[pair]
+              for pair, (guid, score, as_of) in existing.items()}
+    guids = list(scores)
+    for start in range(0, len(guids), LOOKUP_BATCH_SIZE):
+        batch = guids[start:start + LOOKUP_BATCH_SIZE]
+        update_field_by_key(PairScore.objects.all(), "guid", "score",
+                            {guid: scores[guid] for guid in batch})
+        PairScore.objects.filter(guid__in=batch).update(as_of=now)
+    if create:
+        PairScore.objects.bulk_create(
+            [PairScore(rater_id=rater_id, ratee_id=ratee_id, score=score, as_of=now)
+             for (rater_id, ratee_id), score in points.items()
+             if (rater_id, ratee_id) not in existing]
+        )
+
+
+def record_ratings(interactions: Iterable[Interaction],
+                   now: Optional[datetime] = None) -> None:
+    """fold new Interactions into the scores of their pairs
+
+    each pair's stored score is decayed from its `as_of` to `now` and the new
+    ratings are added, so the cost doesn't depend on how much history the pair
+    has"""
+    points = defaultdict(float)  # type: Dict[Tuple[object, object], float]
+    for interaction in interactions:
+        if interaction.ratee_id is not None:
+            points[interaction.rater_id, interaction.ratee_id] += \
+                RATING_POINTS.get(interaction.rating, 0)
+    _add_points(points, now or timezone.now())
+
+
+def forget_ratings(interactions: Iterable[Interaction],
+                   now: Optional[datetime] = None) -> None:
+    """take deleted Interactions back out of the scores of their pairs: each
+    rating is subtracted as much as it has decayed since it was logged"""
+    now = now or timezone.now()
+    points = defaultdict(float)  # type: Dict[Tuple[object, object], float]
+    for interaction in interactions:
+        if interaction.ratee_id is not None:
+            points[interaction.rater_id, interaction.ratee_id] -= decayed(
+                RATING_POINTS.get(interaction.rating, 0), interaction.created, now)
+    _add_points(points, now, create=False)
+
+
+def retrieve_trend(rater: Person, count: int = 5,
+                   now: Optional[datetime] = None) -> Tuple[List[Tuple[str, float]],
+                                                            List[Tuple[str, float]]]:
+    """the rater's `count` highest and `count` lowest current scores, as
+    `(rising, falling)` lists of `(ratee, score)`, best and worst first
+
+    reads one stored score per ratee and decays it to `now`, never the history
+    behind it"""
+    now = now or timezone.now()
+    rows = (PairScore.objects.filter(rater=rater)
+            .values_list("ratee__user_id", "ratee__display_name", "score", "as_of"))
+    current = [(display_name or display_names.get(user_id, user_id),
+                decayed(score, as_of, now))
+               for user_id, display_name, score, as_of in rows.iterator()]
+    rising = heapq.nlargest(count, (item for item in current
+                                    if item[1] >= SCORE_FLOOR),
+                            key=lambda item: item[1])
+    falling = heapq.nsmallest(count, (item for item in current
+                                      if item[1] <= -SCORE_FLOOR),
+                              key=lambda item: item[1])
+    return rising, falling
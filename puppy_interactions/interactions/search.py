@@ -0,0 +1,86 @@
+"""
+fuzzy search over the people a rater has interacted with, for `/interactions find`.
+
+free-text ratees like "Random Guy" are stored as `Person.user_id`, so finding them
+again needs more than an exact match. every Person's `user_id` and `display_name`
+are split into trigrams, stored in `PersonTrigram` with an index on the trigram, and
+a search looks up the query's trigrams there, among the rater's ratees only. the
+work grows with how many people share the query's trigrams, not with the Person
+table.
+
+Persons are indexed when saved (see `apps`), when created in bulk by
+`resolve_persons` and when their display names are synced.
+"""
+import heapq
+import re
+from typing import Iterable, List, Optional, Set, Tuple
+
+from django.db.models import Count
+
+from puppy_interactions.interactions.bulk import LOOKUP_BATCH_SIZE
+from puppy_interactions.interactions.models import Interaction, Person, PersonTrigram
+
+FIND_LIMIT = 5
+# people with the most trigrams in common that are ranked, before their counts
+FIND_CANDIDATES = 50
+# the share of the query's trigrams a match must have
+FIND_THRESHOLD = 0.5
+
+_words = re.compile(r"[^\W_]+")
+
+
+def trigrams(text: str) -> Set[str]:
+    """the trigrams of each word of `text`, padded like `pg_trgm` so that word
+    starts weigh more: "Guy" is "  g", " gu", "guy" and "uy " """
+    grams = set()
+    for word in _words.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[start:start + 3] for start in range(len(padded) - 2))
+    return grams
+
+
+def person_trigrams(person: Person) -> Set[str]:
+    return trigrams(f"{person.user_id} {person.display_name}")
+
+
+def index_people(persons: Iterable[Person], using: Optional[str] = None) -> int:
+    """replace the trigrams of `persons`, returning how many were stored"""
+    persons = list(persons)
+    stored = 0
+    for start in range(0, len(persons), LOOKUP_BATCH_SIZE):
+        batch = persons[start:start + LOOKUP_BATCH_SIZE]
+        PersonTrigram.objects.using(using).filter(
+            person_id__in=[person.pk for person in batch]
+        ).delete()
+        rows = [PersonTrigram(person_id=person.pk, trigram=gram)
+                for person in batch for gram in person_trigrams(person)]
+        PersonTrigram.objects.using(using).bulk_create(rows)
+        stored += len(rows)
+    return stored
+
+
+def find_people(rater: Person, text: str,
+                limit: int = FIND_LIMIT) -> List[Tuple[str, int]]:
+    """the rater's ratees best matching `text`, as `(name, interactions)`: most of
+    the query's trigrams first, then most interactions. two queries"""
+    grams = trigrams(text)
+    if not grams:
+        return []
+    rows = (PersonTrigram.objects
+            .filter(trigram__in=grams, person_id__in=Interaction.objects
+                    .filter(rater=rater).values("ratee_id"))
+            .values_list("person_id").annotate(hits=Count("trigram")).order_by())
+    # picked here rather than with ORDER BY, which would sort in a temporary B-tree
+    candidates = heapq.nlargest(FIND_CANDIDATES, rows.iterator(),
+                                key=lambda row: row[1])
+    hits = {person_id: count for person_id, count in candidates
+            if count / len(grams) >= FIND_THRESHOLD}
+    if not hits:
+        return []
+
+    rows = (Interaction.objects.filter(rater=rater, ratee_id__in=list(hits))
+            .values_list("ratee_id", "ratee__user_id", "ratee__display_name")
+            .annotate(count=Count("guid")).order_by())
+    ranked = sorted(rows, key=lambda row: (-hits[row[0]], -row[3], row[1]))
+    return [(display_name or user_id, count)
+            for _, user_id, display_name, count in ranked[:limit]]
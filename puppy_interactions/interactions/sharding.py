@@ -0,0 +1,201 @@
+"""
+one database per Slack team, so each request only syncs and locks its own team's data.
+
+with `INTERACTIONS_SHARD_BY_TEAM` on, a request runs inside `use_team_shard` and
+`TeamRouter` sends every query for this app to that team's shard. shards are named
+by a hash of the team (or, on Enterprise Grid, the enterprise) id, so no workspace
+identifiers are stored, and live next to each other as `INTERACTIONS_SHARD_NAME`:
+files for `sqlite3`, objects in the same bucket for `s3sqlite`. a shard is
+registered, and migrated if needed, the first time a process uses it.
+
+since the names can't be turned back into teams, every shard is also recorded as a
+`Shard` row in the default database the first time it's used. scheduled jobs and
+the admin go through `all_databases` (or `each_database`): the default database,
+which keeps anyone not split off, then every recorded shard. `TeamRouter` keeps
+other apps' tables, and `Shard`, out of the shards.
+"""
+import hashlib
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Iterator, List, Optional
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.recorder import MigrationRecorder
+
+from puppy_interactions.interactions import replication
+from puppy_interactions.interactions.models import Shard
+
+APP_LABEL = "interactions"
+SHARD_PREFIX = "team_"
+
+_state = threading.local()
+_ready = set()
+_lock = threading.Lock()
+
+
+def shard_alias(team_id: str, enterprise_id: Optional[str] = None) -> str:
+    """the database alias for a team; teams of an enterprise share one shard"""
+    digest = hashlib.sha256((enterprise_id or team_id).encode()).hexdigest()
+    return f"{SHARD_PREFIX}{digest[:16]}"
+
+
+def shard_settings(alias: str) -> dict:
+    """a shard's `DATABASES` entry: the default one, under its own name"""
+    return dict(settings.DATABASES[DEFAULT_DB_ALIAS],
+                NAME=settings.INTERACTIONS_SHARD_NAME.format(shard=alias),
+                # requests open their own transactions, see `InteractionView`
+                ATOMIC_REQUESTS=False, TEST={})
+
+
+@lru_cache(maxsize=None)
+def _latest_migration() -> str:
+    loader = MigrationLoader(None, ignore_no_migrations=True)
+    return loader.graph.leaf_nodes(APP_LABEL)[0][1]
+
+
+def is_migrated(alias: str) -> bool:
+    """whether the database has this app's latest migration applied"""
+    recorder = MigrationRecorder(connections[alias])
+    return recorder.has_table() and recorder.migration_qs.filter(
+        app=APP_LABEL, name=_latest_migration()
+    ).exists()
+
+
+def ensure_shard(alias: str) -> str:
+    """register the shard under `alias`, migrating it if it's new or behind. this
+    is checked once per shard per process"""
+    if alias in _ready:
+        return alias
+    with _lock:
+        if alias not in connections.databases:
+            connections.databases[alias] = shard_settings(alias)
+        replication.prepare(alias)
+        if not is_migrated(alias):
+            call_command("migrate", database=alias, verbosity=0)
+        register(alias)
+        _ready.add(alias)
+    return alias
+
+
+def register(alias: str) -> None:
+    """record the shard in the default database, if it isn't yet"""
+    shards = Shard.objects.using(DEFAULT_DB_ALIAS)
+    if shards.filter(alias=alias).exists():
+        return
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        shards.get_or_create(alias=alias)
+        replication.replicate_on_commit(DEFAULT_DB_ALIAS)
+
+
+def all_databases() -> List[str]:
+    """the default database, then every shard recorded in it"""
+    return [DEFAULT_DB_ALIAS] + list(
+        Shard.objects.using(DEFAULT_DB_ALIAS).order_by("alias")
+        .values_list("alias", flat=True))
+
+
+def database_for(alias: Optional[str]) -> str:
+    """`alias` when it's the default database or a recorded shard, registered and
+    ready to use, otherwise the default database"""
+    if not alias or alias == DEFAULT_DB_ALIAS:
+        return DEFAULT_DB_ALIAS
+    if alias in _ready or Shard.objects.using(DEFAULT_DB_ALIAS).filter(
+            alias=alias).exists():
+        return ensure_shard(alias)
+    return DEFAULT_DB_ALIAS
+
+
+def close_shards() -> None:
+    """close and forget every registered shard"""
+    with _lock:
+        for alias in _ready:
+            connections[alias].close()
+            replication.forget(alias)
+            del connections.databases[alias]
+            if hasattr(connections._connections, alias):
+                delattr(connections._connections, alias)
+        _ready.clear()
+
+
+def current_alias() -> str:
+    """the database this app's queries go to in the current thread"""
+    return getattr(_state, "alias", None) or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def use_database(alias: str) -> Iterator[str]:
+    """route this app's queries in the current thread to `alias`"""
+    previous = getattr(_state, "alias", None)
+    _state.alias = alias
+    try:
+        yield alias
+    finally:
+        _state.alias = previous
+
+
+@contextmanager
+def use_shard(alias: str) -> Iterator[str]:
+    """route this app's queries to a shard (or the default database), registering
+    it if it's new, with its file brought up to date with its replica first"""
+    if alias != DEFAULT_DB_ALIAS:
+        ensure_shard(alias)
+    else:
+        replication.prepare(alias)
+    replication.refresh(alias)
+    with use_database(alias):
+        yield alias
+
+
+@contextmanager
+def use_team_shard(team_id: Optional[str],
+                   enterprise_id: Optional[str] = None) -> Iterator[str]:
+    """route this app's queries to the team's shard while sharding is on and the
+    team is known, otherwise to the default database. with replication on, its
+    file is first brought up to date with the bucket"""
+    if not settings.INTERACTIONS_SHARD_BY_TEAM or not (team_id or enterprise_id):
+        alias = DEFAULT_DB_ALIAS
+    else:
+        alias = shard_alias(team_id, enterprise_id)
+    with use_shard(alias):
+        yield alias
+
+
+def each_database() -> Iterator[str]:
+    """route this app's queries to each of `all_databases` in turn, for as long as
+    the caller works on it"""
+    # the registry is read from the default database, so restore it first
+    replication.prepare(DEFAULT_DB_ALIAS)
+    for alias in all_databases():
+        with use_shard(alias):
+            yield alias
+
+
+class TeamRouter:
+    """sends this app's models to the shard chosen by `use_team_shard`. shards only
+    get this app's tables, and the registry of shards stays in the default
+    database"""
+
+    def db_for_read(self, model, **hints):
+        if model is Shard:
+            return DEFAULT_DB_ALIAS
+        if model._meta.app_label == APP_LABEL:
+            return current_alias()
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if obj1._state.db and obj2._state.db:
+            return obj1._state.db == obj2._state.db
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if model_name == Shard._meta.model_name and app_label == APP_LABEL:
+            return db == DEFAULT_DB_ALIAS
+        if db.startswith(SHARD_PREFIX):
+            return app_label == APP_LABEL
+        return None
@@ -0,0 +1,121 @@
+import json
+import logging
+import time
+from typing import Dict, Iterator, Optional
+from urllib.error import HTTPError
+from urllib.parse import urlencode, urljoin
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+
+from puppy_interactions.interactions.bulk import LOOKUP_BATCH_SIZE, update_field_by_key
+from puppy_interactions.interactions.caches import display_names
+from puppy_interactions.interactions.exceptions import SlackAPIError
+from puppy_interactions.interactions.models import Person
+from puppy_interactions.interactions.search import index_people
+from puppy_interactions.interactions.sharding import each_database
+from puppy_interactions.interactions.sqlite import write_transaction
+
+logger = logging.getLogger('puppy_interactions')
+
+USERS_PAGE_SIZE = 200
+MAX_RATE_LIMIT_RETRIES = 3
+
+
+class SlackClient:
+    """a minimal Slack Web API client - just enough for the calls we make"""
+
+    def __init__(self, token: Optional[str] = None, base_url: Optional[str] = None,
+                 timeout: float = 10):
+        self.token = token if token is not None else settings.SLACK_API_TOKEN
+        self.base_url = base_url or settings.SLACK_API_URL
+        self.timeout = timeout
+
+    def call(self, method: str, **params) -> dict:
+        """POST to a Web API method and return the decoded body
+
+        Slack answers rate limited calls with a 429 and a `Retry-After` header; we
+        wait it out a few times before giving up"""
+        request = Request(urljoin(self.base_url, method),
+                          data=urlencode(params).encode(),
+                          headers={"Authorization": f"Bearer {self.token}"})
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            try:
+                with urlopen(request, timeout=self.timeout) as response:
+                    body = json.loads(response.read().decode())
+                break
+            except HTTPError as e:
+                if e.code != 429 or attempt == MAX_RATE_LIMIT_RETRIES:
+                    raise SlackAPIError(f"{method}: HTTP {e.code}") from e
+                time.sleep(int(e.headers.get("Retry-After", 1)))
+
+        if not body.get("ok"):
+            raise SlackAPIError(f"{method}: {body.get('error', 'unknown_error')}")
+        return body
+
+    def iter_users(self, page_size: int = USERS_PAGE_SIZE) -> Iterator[dict]:
+        """yield every member of the workspace, following `users.list` cursors"""
+        cursor = ""
+        while True:
+            params = {"limit": page_size}
+            if cursor:
+                params["cursor"] = cursor
+            body = self.call("users.list", **params)
+            yield from body.get("members", [])
+            cursor = body.get("response_metadata", {}).get("next_cursor", "")
+            if not cursor:
+                return
+
+
+def member_display_name(member: dict) -> str:
+    """the name Slack shows for a member: display name, then real name, then handle"""
+    profile = member.get("profile", {})
+    return (profile.get("display_name") or profile.get("real_name")
+            or member.get("real_name") or member.get("name", ""))
+
+
+def store_display_names(names: Dict[str, str]) -> int:
+    """write `{user_id: display name}` to Persons and reindex them for search"""
+    updated = update_field_by_key(Person.objects.all(), "user_id", "display_name",
+                                  names)
+    user_ids = list(names)
+    for start in range(0, len(user_ids), LOOKUP_BATCH_SIZE):
+        index_people(Person.objects.filter(
+            user_id__in=user_ids[start:start + LOOKUP_BATCH_SIZE]
+        ))
+    return updated
+
+
+def sync_display_names(client: Optional[SlackClient] = None) -> int:
+    """page through the workspace's users and store their names on matching Persons,
+    in the default database and every shard
+
+    all changed names are written with one batched UPDATE per database and the
+    in-process cache is primed, so log rendering picks them up without calling
+    Slack. returns the number of Persons updated"""
+    client = client or SlackClient()
+    names = {}  # type: Dict[str, str]
+    for member in client.iter_users():
+        name = member_display_name(member)
+        if name:
+            names[f"@{member['id']}"] = name
+    display_names.update(names)
+
+    user_ids = list(names)
+    updated = 0
+    for _ in each_database():
+        changed = {}
+        for start in range(0, len(user_ids), LOOKUP_BATCH_SIZE):
+            batch = user_ids[start:start + LOOKUP_BATCH_SIZE]
+            rows = (Person.objects.filter(user_id__in=batch)
+                    .values_list("user_id", "display_name"))
+            changed.update((user_id, names[user_id]) for user_id, display_name in rows
+                           if display_name != names[user_id])
+        updated += write_transaction(store_display_names, changed)
+    logger.info(f"Synced {len(names)} Slack display names, {updated} changed.")
+    return updated
+
+
+def scheduled_sync(event=None, context=None) -> int:
+    """entry point for a Zappa scheduled event, see `zappa_settings.json` `events`"""
+    return sync_display_names()
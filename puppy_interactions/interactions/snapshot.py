@@ -0,0 +1,111 @@
+"""
+the format of replication snapshots: a SQLite file, optionally compressed.
+
+a snapshot is compressed with gzip or, if `zstandard` is installed, zstd, as it's
+uploaded, and decompressed straight into the database file as it's downloaded,
+a chunk at a time, so neither end holds the whole file in memory. the codec is
+told apart by the first bytes of the object, the gzip and zstd frame magic or the
+SQLite file header, so snapshots uploaded uncompressed still restore.
+"""
+import zlib
+from typing import BinaryIO, Optional
+
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SQLITE_MAGIC = b"SQLite format 3\x00"
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+CHUNK_SIZE = 1024 * 1024
+# snapshots are taken on the write path, where higher levels cost more than they save
+GZIP_LEVEL = 1
+ZSTD_LEVEL = 3
+
+
+class _Passthrough:
+    def compress(self, data: bytes) -> bytes:
+        return data
+
+    decompress = compress
+
+    def flush(self) -> bytes:
+        return b""
+
+
+def compressor(codec: str):
+    """an object with `compress(chunk)` and `flush()` for `codec`"""
+    if codec == "gzip":
+        return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    if codec == "zstd":
+        if zstandard is None:
+            raise ImproperlyConfigured("zstd snapshots need zstandard installed.")
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    if codec == "none":
+        return _Passthrough()
+    raise ImproperlyConfigured(f"Unknown snapshot codec {codec!r}")
+
+
+def detect(head: bytes) -> str:
+    """the codec of a snapshot starting with `head`"""
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    if head.startswith(ZSTD_MAGIC):
+        return "zstd"
+    if head.startswith(SQLITE_MAGIC) or not head:
+        return "none"
+    raise ValueError("Not a database snapshot.")
+
+
+def _decompressor(codec: str):
+    if codec == "gzip":
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if codec == "zstd":
+        if zstandard is None:
+            raise ImproperlyConfigured("zstd snapshots need zstandard installed.")
+        return zstandard.ZstdDecompressor().decompressobj()
+    return _Passthrough()
+
+
+def compress_stream(source: BinaryIO, target: BinaryIO, codec: str,
+                    on_chunk=None) -> int:
+    """write `source` to `target` compressed with `codec`, returning bytes written.
+    `on_chunk` is called with each uncompressed chunk read"""
+    encoder = compressor(codec)
+    written = 0
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        if on_chunk is not None:
+            on_chunk(chunk)
+        data = encoder.compress(chunk)
+        target.write(data)
+        written += len(data)
+    data = encoder.flush()
+    target.write(data)
+    return written + len(data)
+
+
+def decompress_stream(source: BinaryIO, target: BinaryIO) -> str:
+    """write the snapshot read from `source` to `target` uncompressed, returning
+    the codec it was stored with"""
+    head = source.read(CHUNK_SIZE)
+    codec = detect(head)
+    decoder = _decompressor(codec)
+    chunk = head
+    while chunk:
+        target.write(decoder.decompress(chunk))
+        chunk = source.read(CHUNK_SIZE)
+    target.write(decoder.flush())
+    return codec
+
+
+def default_codec(configured: Optional[str] = None) -> str:
+    """`configured`, or zstd when it's installed and gzip otherwise"""
+    if configured:
+        return configured
+    return "zstd" if zstandard is not None else "gzip"
@@ -0,0 +1,99 @@
+import logging
+import random
+import time
+from typing import Callable, Dict, Optional, TypeVar, Union
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+
+from puppy_interactions.interactions import metrics
+from puppy_interactions.interactions.replication import replicate_on_commit
+from puppy_interactions.interactions.sharding import current_alias
+
+logger = logging.getLogger('puppy_interactions')
+
+T = TypeVar("T")
+
+# seconds; the first retry waits up to RETRY_BASE_DELAY, doubling up to the max
+RETRY_BASE_DELAY = 0.01
+RETRY_MAX_DELAY = 0.5
+
+# applied in this order; `journal_mode` first since it can't change mid-transaction
+PRAGMA_ORDER = ("journal_mode", "synchronous", "busy_timeout", "cache_size",
+                "mmap_size")
+
+
+def apply_pragmas(cursor, pragmas: Dict[str, Union[str, int]]) -> None:
+    """run `PRAGMA name = value` for each of `pragmas` on a DB-API cursor"""
+    names = sorted(pragmas, key=lambda name: (PRAGMA_ORDER.index(name)
+                                              if name in PRAGMA_ORDER
+                                              else len(PRAGMA_ORDER)))
+    for name in names:
+        if not name.isidentifier():
+            raise ValueError(f"Not a pragma: {name!r}")
+        cursor.execute(f"PRAGMA {name} = {pragmas[name]}")
+
+
+def configure_connection(sender, connection, **kwargs) -> None:
+    """`connection_created` receiver that tunes SQLite connections with the
+    `PRAGMAS` dict of their `DATABASES` entry, see `config.settings.server`"""
+    pragmas = connection.settings_dict.get("PRAGMAS")
+    if connection.vendor != "sqlite" or not pragmas:
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, pragmas)
+
+
+def is_lock_error(error: Exception) -> bool:
+    """SQLite's "database is locked" (SQLITE_BUSY), as raised through Django"""
+    return isinstance(error, OperationalError) and "locked" in str(error)
+
+
+def write_transaction(func: Callable[..., T], *args, using: Optional[str] = None,
+                      deadline: Optional[float] = None, **kwargs) -> T:
+    """run `func` in a transaction, retrying it from the start while SQLite reports
+    the database locked - by default for up to `INTERACTIONS_WRITE_DEADLINE` seconds,
+    which leaves time to answer Slack.
+
+    waits between attempts back off exponentially, with full jitter so concurrent
+    writers spread out. a transaction that lost the race for the write lock can't
+    recover by waiting, since it may already hold a read lock or a stale snapshot,
+    so the whole transaction is rolled back and rerun. for the same reason, inside
+    an existing transaction `func` just runs in a savepoint: retrying is up to
+    whoever owns the outermost transaction.
+
+    lock waits, retries, give-ups and time spent waiting are counted in `metrics`
+    under `sqlite.`. `using` defaults to the database chosen by `sharding`"""
+    using = using or current_alias()
+    if transaction.get_connection(using).in_atomic_block:
+        with transaction.atomic(using=using):
+            replicate_on_commit(using)
+            return func(*args, **kwargs)
+
+    if deadline is None:
+        deadline = settings.INTERACTIONS_WRITE_DEADLINE
+    give_up_at = time.monotonic() + deadline
+    attempt = 0
+    while True:
+        try:
+            with transaction.atomic(using=using):
+                result = func(*args, **kwargs)
+                replicate_on_commit(using)
+            if attempt:
+                metrics.incr("sqlite.lock_recovered")
+            return result
+        except OperationalError as e:
+            if not is_lock_error(e):
+                raise
+            metrics.incr("sqlite.lock_wait")
+            backoff = random.uniform(0, min(RETRY_MAX_DELAY,
+                                            RETRY_BASE_DELAY * 2 ** attempt))
+            if time.monotonic() + backoff > give_up_at:
+                metrics.incr("sqlite.lock_gave_up")
+                logger.warning(f"Gave up on a locked database after {attempt + 1} "
+                               f"attempts.")
+                raise
+            time.sleep(backoff)
+            attempt += 1
+            metrics.incr("sqlite.retry")
+            metrics.incr("sqlite.lock_wait_ms", int(backoff * 1000))
@@ -0,0 +1,76 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterable, List, Optional
+from urllib.parse import parse_qs
+
+
+class SlackStubServer:
+    """a local stand-in for the Slack Web API, for use as a context manager
+
+    `users.list` pages through `members` using numeric cursors; `chat.postMessage`
+    records each message, except to `unreachable` channels. every call is recorded in
+    `calls` as `(method, params)`"""
+
+    def __init__(self, members: Optional[List[dict]] = None,
+                 unreachable: Iterable[str] = ()):
+        self.members = members or []
+        self.unreachable = set(unreachable)
+        self.calls = []
+        self.messages = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/"
+
+    def __enter__(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                params = {k: v[0] for k, v in
+                          parse_qs(self.rfile.read(length).decode()).items()}
+                body = stub.handle(self.path.strip("/"), params)
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def handle(self, method: str, params: dict) -> dict:
+        with self._lock:
+            self.calls.append((method, params))
+        if method == "users.list":
+            limit = int(params.get("limit", 100))
+            start = int(params.get("cursor") or 0)
+            end = start + limit
+            return {"ok": True, "members": self.members[start:end],
+                    "response_metadata": {
+                        "next_cursor": str(end) if end < len(self.members) else ""
+                    }}
+        if method == "chat.postMessage":
+            if params.get("channel") in self.unreachable:
+                return {"ok": False, "error": "channel_not_found"}
+            with self._lock:
+                self.messages.append(params)
+            return {"ok": True, "channel": params.get("channel")}
+        return {"ok": False, "error": "unknown_method"}
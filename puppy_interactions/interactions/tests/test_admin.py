@@ -0,0 +1,130 @@
+import os
+import re
+import shutil
+import tempfile
+from urllib.parse import urlencode
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from puppy_interactions.interactions.admin import (
+    COUNT_LIMIT, EstimatedCountPaginator
+)
+from puppy_interactions.interactions.benchmarks.synthetic import populate
+from puppy_interactions.interactions.identity import find_person
+from puppy_interactions.interactions.models import Interaction, PairScore, Person
+from puppy_interactions.interactions.sharding import (
+    close_shards, ensure_shard, shard_alias, use_database
+)
+from puppy_interactions.interactions.utils import create_interactions, purge_person
+
+FULL_COUNT = re.compile(r'COUNT\(\*\).*FROM "interactions_interaction"(?!.*LIMIT)')
+
+
+class AdminTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_superuser("admin", "a@b.c", "pw")
+        self.client.force_login(user)
+
+    def changelist(self, model: str, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse(f"admin:interactions_{model}_changelist"), params)
+        self.assertEqual(response.status_code, 200)
+        return [query["sql"] for query in queries]
+
+    def test_changelist_queries(self):
+        """test that a page of interactions joins its people rather than loading
+        them per row, and that the table is never counted"""
+        populate(interactions=1000, raters=5, ratees=20)
+        queries = self.changelist("interaction")
+        self.assertLess(len(queries), 10)
+        for sql in queries + self.changelist("interaction", rating="+"):
+            self.assertNotRegex(sql, FULL_COUNT)
+        self.assertLess(len(self.changelist("person", q="random")), 10)
+
+    def test_estimated_count(self):
+        populate(interactions=50, raters=2, ratees=5)
+        paginator = EstimatedCountPaginator(Interaction.objects.order_by("-created"),
+                                            10)
+        self.assertGreaterEqual(paginator.count, 50)
+        filtered = Interaction.objects.filter(rating="+").order_by("-created")
+        self.assertEqual(EstimatedCountPaginator(filtered, 10).count, filtered.count())
+        self.assertLessEqual(filtered.count(), COUNT_LIMIT)
+
+    def test_merge_action(self):
+        """test that a raw name is merged into the Slack user and still finds them"""
+        create_interactions("@R1", ("Random Guy", "+"), ("@U1", "+"))
+        selected = Person.objects.filter(user_id__in=["Random Guy", "@U1"])
+        response = self.client.post(
+            reverse("admin:interactions_person_changelist"),
+            {"action": "merge_selected",
+             "_selected_action": [str(pk) for pk in selected.values_list("pk",
+                                                                          flat=True)]})
+        self.assertEqual(response.status_code, 302)
+        survivor = selected.get()
+        self.assertEqual(survivor.user_id, "@U1")
+        self.assertEqual(survivor.ratee_interactions.count(), 2)
+        self.assertEqual(find_person("random guy"), survivor)
+
+    def test_purge_action(self):
+        create_interactions("@R1", ("Random Guy", "+"), ("@U1", "-"))
+        create_interactions("@U1", ("Random Guy", "+"))
+        rater = Person.objects.get(user_id="@R1")
+        target = Person.objects.get(user_id="@U1")
+        response = self.client.post(
+            reverse("admin:interactions_person_changelist"),
+            {"action": "purge_selected", "_selected_action": [str(target.pk)]})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Person.objects.filter(pk=target.pk).exists())
+        self.assertEqual(Interaction.objects.count(), 1)
+        self.assertFalse(PairScore.objects.filter(ratee=target).exists())
+        self.assertGreater(Person.objects.get(pk=rater.pk).data_version,
+                           rater.data_version)
+
+    def test_purge_in_chunks(self):
+        create_interactions("@R1", *[("Random Guy", "+")] * 5)
+        self.assertEqual(purge_person(Person.objects.get(user_id="@R1"),
+                                      chunk_size=2), 5)
+        self.assertEqual(Interaction.objects.count(), 0)
+
+
+class ShardAdminTests(TransactionTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        settings = override_settings(
+            INTERACTIONS_SHARD_NAME=os.path.join(self.directory, "{shard}.db"))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        user = get_user_model().objects.create_superuser("admin", "a@b.c", "pw")
+        self.client.force_login(user)
+        self.alias = ensure_shard(shard_alias("T1"))
+        with use_database(self.alias):
+            create_interactions("@U1", ("@U2", "+"))
+            self.person = Person.objects.get(user_id="@U2")
+
+    def tearDown(self):
+        close_shards()
+        shutil.rmtree(self.directory)
+
+    def test_shard_changelist(self):
+        """test that the database filter shows a shard's rows, and their pages"""
+        url = reverse("admin:interactions_person_changelist")
+        self.assertNotContains(self.client.get(url), "@U2")
+        response = self.client.get(url, {"database": self.alias})
+        self.assertContains(response, "@U2")
+        self.assertContains(response, self.alias)
+
+        change = reverse("admin:interactions_person_change", args=[self.person.pk])
+        filters = urlencode({"_changelist_filters": f"database={self.alias}"})
+        self.assertEqual(self.client.get(f"{change}?{filters}").status_code, 200)
+
+    def test_unknown_database(self):
+        """test that only recorded shards can be picked"""
+        response = self.client.get(reverse("admin:interactions_person_changelist"),
+                                   {"database": "team_0000"})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "@U2")
@@ -0,0 +1,96 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core import signing
+from django.test import TestCase, override_settings
+from django.urls import reverse_lazy
+from django.utils import timezone
+
+from puppy_interactions.interactions.api import SALT, make_token, read_token
+from puppy_interactions.interactions.models import Person
+from puppy_interactions.interactions.utils import create_interactions
+from puppy_interactions.interactions.views import ReadAPIView
+
+
+class ReadAPITests(TestCase):
+    def setUp(self):
+        create_interactions("@U1", ("@U2", "+"), ("@U3", "-"), ("@U2", "+"))
+        self.rater = Person.objects.get(user_id="@U1")
+        self.auth = f"Bearer {make_token(self.rater)}"
+
+    def get(self, name="logs", auth=None, **params):
+        return self.client.get(reverse_lazy(f"interactions-api-{name}"), params,
+                               HTTP_AUTHORIZATION=auth or self.auth)
+
+    def test_logs(self):
+        response = self.get(rating="positive")
+        self.assertEqual(response.status_code, 200)
+        logs = response.json()["logs"]
+        self.assertEqual([log["name"] for log in logs], ["@U2", "@U2"])
+        self.assertEqual(len(self.get().json()["logs"]), 3)
+        self.assertEqual(len(self.get(limit=1, offset=2).json()["logs"]), 1)
+
+    def test_aggregates(self):
+        totals = self.get(aggregate="person").json()["totals"]
+        self.assertIn({"name": "@U2", "positive": 2, "negative": 0}, totals)
+        top = self.get("top", rating="negative").json()["top"]
+        self.assertEqual(top, [{"name": "@U3", "positive": 0, "negative": 1}])
+
+    def test_not_modified(self):
+        """test that a matching If-None-Match gets a 304 from one query, until a
+        write changes the rater's data version"""
+        response = self.get()
+        tag = response["ETag"]
+        self.assertIn("max-age=60", response["Cache-Control"])
+        self.assertIn("Authorization", response["Vary"])
+        with self.assertNumQueries(1):
+            cached = self.client.get(reverse_lazy("interactions-api-logs"),
+                                     HTTP_AUTHORIZATION=self.auth,
+                                     HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached["ETag"], tag)
+        self.assertNotEqual(self.get(days=7)["ETag"], tag)
+
+        create_interactions("@U1", ("@U4", "+"))
+        fresh = self.client.get(reverse_lazy("interactions-api-logs"),
+                                HTTP_AUTHORIZATION=self.auth, HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(fresh.status_code, 200)
+        self.assertEqual(len(fresh.json()["logs"]), 4)
+
+    def test_abstract(self):
+        """test that an endpoint must say how to read its query and answer it"""
+        class Incomplete(ReadAPIView):
+            command = "logs"
+
+            def parse(self, query) -> dict:
+                return {}
+
+        self.assertRaises(TypeError, Incomplete)
+
+    def test_unauthorized(self):
+        for auth in ["Bearer nope", f"Token {make_token(self.rater)}",
+                     "Bearer " + signing.dumps(["x"], salt=SALT)]:
+            with self.subTest(auth=auth):
+                self.assertEqual(self.get(auth=auth).status_code, 401)
+        self.assertEqual(self.client.get(reverse_lazy("interactions-api-logs"))
+                         .status_code, 401)
+
+    @override_settings(INTERACTIONS_API_TOKEN_MAX_AGE=60)
+    def test_expired(self):
+        later = timezone.now() + timedelta(minutes=2)
+        with mock.patch("time.time", return_value=later.timestamp()):
+            self.assertIsNone(read_token(self.auth))
+
+    def test_bad_params(self):
+        for params in [{"days": "lots"}, {"days": 0}, {"aggregate": "week"},
+                       {"rating": "+"}, {"limit": 10 ** 6}]:
+            with self.subTest(params=params):
+                self.assertEqual(self.get(**params).status_code, 400)
+
+    def test_token_command(self):
+        response = self.client.post(reverse_lazy("interactions"),
+                                    data={"user_id": "U1", "text": "token",
+                                          "team_id": "T1"})
+        token = response.json()["text"].rsplit("`", 2)[1]
+        self.assertEqual(read_token(f"Bearer {token}").person, self.rater.guid)
+        self.assertEqual(read_token(f"Bearer {token}").team_id, "T1")
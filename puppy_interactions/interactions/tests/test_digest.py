@@ -0,0 +1,73 @@
+import uuid
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from puppy_interactions.interactions.digest import (
+    Digest, iter_digests, render_digest, send_digests
+)
+from puppy_interactions.interactions.models import Interaction, Person
+from puppy_interactions.interactions.slack import SlackClient
+from puppy_interactions.interactions.tests.slack_stub import SlackStubServer
+
+
+class DigestTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.persons = {}
+
+    def person(self, user_id, display_name=""):
+        if user_id not in self.persons:
+            self.persons[user_id] = Person.objects.create(user_id=user_id,
+                                                          display_name=display_name)
+        return self.persons[user_id]
+
+    def interact(self, rater, ratee, rating, days_ago):
+        with mock.patch("django.utils.timezone.now") as mock_now:
+            mock_now.return_value = self.now - timedelta(days=days_ago)
+            Interaction.objects.create(conversation=uuid.uuid4(),
+                                       rater=self.person(rater),
+                                       ratee=self.person(ratee), rating=rating)
+
+    def test_summaries(self):
+        """test counts, ratio, top people and change against the week before"""
+        self.person("@U3", display_name="Sam")
+        for days_ago, ratee, rating in [(1, "@U2", "+"), (2, "@U2", "+"), (3, "@U3", "-"),
+                                        (6, "@U4", "+"), (9, "@U2", "-"),
+                                        (30, "@U2", "+")]:
+            self.interact("@U1", ratee, rating, days_ago)
+        self.interact("@U2", "@U1", "+", days_ago=10)  # nothing this week
+
+        self.assertEqual(list(iter_digests(now=self.now, top=2)), [
+            Digest(user_id="@U1", total=4, positive=3, previous_total=1,
+                   previous_positive=0, top=[("@U2", 2), ("@U4", 1)]),
+        ])
+
+    def test_one_query(self):
+        """test that every rater's digest comes from a single query"""
+        for num in range(20):
+            self.interact(f"@R{num}", f"@U{num % 3}", "+", days_ago=num % 10)
+        with self.assertNumQueries(1):
+            digests = list(iter_digests(now=self.now))
+        self.assertEqual(len(digests), 14)
+
+    def test_render(self):
+        digest = Digest("@U1", total=4, positive=3, previous_total=6,
+                        previous_positive=2, top=[("Sam", 2), ("@U4", 1)])
+        self.assertEqual(render_digest(digest),
+                         "This week you logged *4* interactions, down 2 from the week "
+                         "before. *75%* were positive.\n"
+                         "Most often with: Sam (2), @U4 (1)")
+
+    def test_send(self):
+        """test a direct message per digest, with failures counted rather than
+        stopping the rest"""
+        digests = [Digest(f"@U{num}", 1, 1, 0, 0, []) for num in range(30)]
+        with SlackStubServer(unreachable=["U7"]) as stub:
+            client = SlackClient(token="xoxb-test", base_url=stub.url)
+            self.assertEqual(send_digests(iter(digests), client=client, workers=4),
+                             (29, 1))
+        self.assertEqual(sorted(message["channel"] for message in stub.messages),
+                         sorted(f"U{num}" for num in range(30) if num != 7))
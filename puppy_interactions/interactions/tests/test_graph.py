@@ -0,0 +1,143 @@
+from array import array
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse_lazy
+
+from puppy_interactions.interactions import graph as graph_module
+from puppy_interactions.interactions.graph import (
+    MIN_MUTUAL_PEOPLE, MIN_PEOPLE, NOISE, PERIOD_DAYS, RatingGraph, band,
+    current_period, forget_graphs, get_graph, reciprocity
+)
+from puppy_interactions.interactions.models import Person, ReciprocityAnswer
+from puppy_interactions.interactions.utils import create_interactions
+
+
+class RatingGraphTests(TestCase):
+    def test_csr(self):
+        """test that rows and their transpose hold each edge once, columns sorted"""
+        # 0 -> 2, 0 -> 1, 2 -> 0, 1 -> 2
+        graph = RatingGraph({"a": 0, "b": 1, "c": 2}, array("l", [0, 0, 2, 1]),
+                            array("l", [2, 1, 0, 2]), array("d", [1, -1, 2, 3]))
+        self.assertEqual(list(graph.indptr), [0, 2, 3, 4])
+        self.assertEqual(list(graph.indices), [1, 2, 2, 0])
+        self.assertEqual(list(graph.scores), [-1, 1, 3, 2])
+        self.assertEqual(list(graph.t_indptr), [0, 1, 2, 4])
+        self.assertEqual(list(graph.t_indices), [2, 0, 0, 1])
+        self.assertEqual(list(graph.t_scores), [2, -1, 1, 3])
+        self.assertEqual(list(graph.out_positive), [1, 1, 1])
+        self.assertEqual(list(graph.in_positive), [1, 0, 2])
+        # a <-> c both positive; a -> b isn't returned
+        self.assertEqual(list(graph.mutual_positive), [1, 0, 1])
+        self.assertEqual(graph.mutual_pairs, 1)
+        self.assertEqual(graph.reciprocity, 0.5)
+
+    def test_empty(self):
+        graph = RatingGraph({}, array("l"), array("l"), array("d"))
+        self.assertEqual(graph.reciprocity, 0.0)
+        self.assertEqual(graph.mutual_pairs, 0)
+
+    def test_band(self):
+        self.assertEqual(band(0), "fewer than 5")
+        self.assertEqual(band(4), "fewer than 5")
+        self.assertEqual(band(5), "5-9")
+        self.assertEqual(band(12), "10-14")
+
+
+class ReciprocityTests(TestCase):
+    def setUp(self):
+        forget_graphs()
+        # counts are given exactly, to test the bands
+        patcher = mock.patch.object(graph_module.random, "randint", return_value=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.friends = [f"@U{number}" for number in range(MIN_PEOPLE)]
+        create_interactions("@R1", *[(friend, "+") for friend in self.friends])
+        for friend in self.friends[:3]:
+            create_interactions(friend, ("@R1", "+"))
+        create_interactions(self.friends[3], ("@R1", "-"))
+
+    def rate_many(self, rater: str, returned: int):
+        """`rater` rates `MIN_MUTUAL_PEOPLE` people positively, the first `returned`
+        of whom rate them back"""
+        people = [f"@M{number}" for number in range(MIN_MUTUAL_PEOPLE)]
+        create_interactions(rater, *[(person, "+") for person in people])
+        for person in people[:returned]:
+            create_interactions(person, (rater, "+"))
+        return people
+
+    def test_reciprocity(self):
+        summary = reciprocity(Person.objects.get(user_id="@R1"))
+        self.assertEqual(summary.rated_positive, "5-9")
+        # too few people rated to say how many rate back
+        self.assertIsNone(summary.mutual_positive)
+        self.assertEqual(summary.rated_by_positive, "fewer than 5")
+        # 4 of @R1's 5 ratings are returned, as are the 4 back
+        self.assertEqual(summary.overall, round(8 / 9 * 100))
+        self.assertEqual(get_graph().mutual_pairs, 3)
+
+    def test_mutual(self):
+        self.rate_many("@R2", returned=12)
+        summary = reciprocity(Person.objects.get(user_id="@R2"))
+        self.assertEqual(summary.rated_positive, "20-24")
+        self.assertEqual(summary.mutual_positive, "10-14")
+
+    def test_noise(self):
+        self.rate_many("@R2", returned=10)
+        with mock.patch.object(graph_module.random, "randint", return_value=-NOISE):
+            summary = reciprocity(Person.objects.get(user_id="@R2"))
+        self.assertEqual(summary.mutual_positive, "5-9")
+
+    def test_threshold(self):
+        """test that nothing is said about someone rating too few people"""
+        self.assertIsNone(reciprocity(Person.objects.get(user_id=self.friends[0])))
+        self.assertIsNone(reciprocity(Person.objects.create(user_id="@U99")))
+        self.assertFalse(ReciprocityAnswer.objects.exists())
+
+    def test_differencing(self):
+        """test that a rater who asks, changes their ratings and asks again within
+        a period gets the same answer, so can't tell how one person rates them"""
+        people = self.rate_many("@R2", returned=10)
+        rater = Person.objects.get(user_id="@R2")
+        first = reciprocity(rater)
+        self.assertEqual(first.mutual_positive, "10-14")
+
+        # drop someone who rates back, and someone who doesn't, then re-rate them
+        create_interactions("@R2", (people[0], "-"), (people[-1], "-"))
+        forget_graphs()
+        self.assertEqual(reciprocity(rater), first)
+        create_interactions("@R2", (people[0], "+"), (people[-1], "+"))
+        create_interactions(people[11], ("@R2", "+"))
+        forget_graphs()
+        self.assertEqual(reciprocity(rater), first)
+        self.assertEqual(ReciprocityAnswer.objects.filter(person=rater).count(), 1)
+
+    def test_next_period(self):
+        rater = Person.objects.get(user_id="@R1")
+        reciprocity(rater)
+        next_period = current_period() + timedelta(days=PERIOD_DAYS)
+        with mock.patch.object(graph_module, "current_period", return_value=next_period):
+            self.assertIsNotNone(reciprocity(rater))
+        # the older answer is pruned
+        self.assertEqual(list(ReciprocityAnswer.objects.values_list("period", flat=True)),
+                         [next_period])
+
+    def test_graph_per_period(self):
+        """test that the graph is built once per period, not checked per call"""
+        graph = get_graph()
+        with self.assertNumQueries(0):
+            self.assertIs(get_graph(), graph)
+        create_interactions(self.friends[4], ("@R1", "+"))
+        self.assertIs(get_graph(), graph)
+        next_period = current_period() + timedelta(days=PERIOD_DAYS)
+        with mock.patch.object(graph_module, "current_period", return_value=next_period):
+            self.assertEqual(get_graph().mutual_pairs, 4)
+
+    def test_view(self):
+        response = self.client.post(path=reverse_lazy("interactions"), data={
+            "token": "gIkuvaNzQIHg97ATvDxqgjtO", "user_id": "R1",
+            "text": "mutual", "trigger_id": "mutual",
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("You rate 5-9 people positively", response.json()["text"])
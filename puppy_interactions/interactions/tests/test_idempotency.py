@@ -0,0 +1,153 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse_lazy
+from django.utils import timezone
+
+from puppy_interactions.interactions.handlers import handle_batch
+from puppy_interactions.interactions.idempotency import (
+    command_key, command_keys, find_receipt, store_receipt
+)
+from puppy_interactions.interactions.models import Interaction, CommandReceipt
+
+
+def make_payload(text, user_id="U2147483697",
+                 trigger_id="13345224609.738474920.8088930838d88f008e0"):
+    return {"token": "gIkuvaNzQIHg97ATvDxqgjtO",
+            "team_id": "T0001",
+            "user_id": user_id,
+            "command": "/interactions",
+            "text": text,
+            "response_url": "https://hooks.slack.com/commands/1234/5678",
+            "trigger_id": trigger_id}
+
+
+class CommandKeyTests(TestCase):
+    def test_same_trigger_same_key(self):
+        self.assertEqual(command_key(make_payload("Trisha +")),
+                         command_key(make_payload("Trisha +")))
+
+    def test_different_trigger_different_key(self):
+        self.assertNotEqual(command_key(make_payload("Trisha +", trigger_id="1.2.a")),
+                            command_key(make_payload("Trisha +", trigger_id="1.2.b")))
+
+    def test_without_trigger_uses_text_window(self):
+        """test that payloads without a trigger_id match by user and text within the
+        window"""
+        first = make_payload("Trisha +", trigger_id="")
+        with mock.patch("time.time", return_value=1000.0):
+            key = command_key(first)
+            self.assertNotEqual(key, command_key(make_payload("Trisha -",
+                                                              trigger_id="")))
+        with mock.patch("time.time", return_value=1001.0):
+            self.assertEqual(key, command_key(first))
+        with mock.patch("time.time", return_value=5000.0):
+            self.assertNotEqual(key, command_key(first))
+
+    def test_previous_window_key(self):
+        """test that the previous window's key is offered for lookups, but only
+        without a trigger_id"""
+        payload = make_payload("Trisha +", trigger_id="")
+        with mock.patch("time.time", return_value=1019.9):
+            key = command_key(payload)
+        with mock.patch("time.time", return_value=1020.1):
+            self.assertEqual(command_keys(payload)[1:], [key])
+        self.assertEqual(len(command_keys(make_payload("Trisha +"))), 1)
+
+
+class ReceiptTests(TestCase):
+    def test_round_trip(self):
+        store_receipt("abc", {"text": "ok"})
+        self.assertEqual(find_receipt("abc"), {"text": "ok"})
+        self.assertIsNone(find_receipt("def"))
+
+    def test_expired_receipts_ignored_and_pruned(self):
+        """test that receipts past their ttl don't answer and get cleaned up"""
+        with mock.patch("django.utils.timezone.now",
+                        return_value=timezone.now() - timedelta(hours=1)):
+            store_receipt("old", {"text": "ok"})
+        self.assertIsNone(find_receipt("old"))
+        store_receipt("new", {"text": "ok"})
+        self.assertFalse(CommandReceipt.objects.filter(key="old").exists())
+
+
+class RetryStormTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.path = reverse_lazy("interactions")
+
+    def test_retry_storm_creates_once(self):
+        """test that many retries of one create write once and get one answer"""
+        payload = make_payload("Joseph Curtin + <@U23787> - <@U298333> + Trisha -")
+        count = Interaction.objects.count()
+        responses = [self.client.post(self.path, data=payload).json()
+                     for num in range(20)]
+        self.assertEqual(Interaction.objects.count(), count + 4)
+        self.assertEqual(len({r["text"] for r in responses}), 1)
+
+    def test_retry_skips_writes(self):
+        """test that a retry is answered without any DB write"""
+        payload = make_payload("Trisha +")
+        first = self.client.post(self.path, data=payload).json()
+        with CaptureQueriesContext(connection) as ctx:
+            retry = self.client.post(self.path, data=payload).json()
+        self.assertEqual(first, retry)
+        writes = [q["sql"] for q in ctx.captured_queries
+                  if q["sql"].split()[0] in ("INSERT", "UPDATE", "DELETE")]
+        self.assertEqual(writes, [])
+
+    def test_interleaved_storms(self):
+        """test retries of several distinct commands, interleaved, each apply once"""
+        payloads = [make_payload(f"<@U{num}> +", trigger_id=f"1.2.{num}")
+                    for num in range(5)]
+        count = Interaction.objects.count()
+        for num in range(4):
+            for payload in payloads:
+                self.client.post(self.path, data=payload)
+        self.assertEqual(Interaction.objects.count(), count + 5)
+
+    def test_retry_across_window_boundary(self):
+        """test that a retry without a `trigger_id` that lands just past a window
+        boundary still finds the first attempt's receipt"""
+        payload = make_payload("Trisha +", trigger_id="")
+        count = Interaction.objects.count()
+        with mock.patch("time.time", return_value=1019.9):
+            first = self.client.post(self.path, data=payload).json()
+        with mock.patch("time.time", return_value=1020.1):
+            self.assertEqual(self.client.post(self.path, data=payload).json(), first)
+            self.assertEqual(handle_batch([payload]),
+                             [{"ok": True, "response": first}])
+        self.assertEqual(Interaction.objects.count(), count + 1)
+
+    @override_settings(INTERACTIONS_IDEMPOTENCY_TTL=0)
+    def test_reapplied_after_ttl(self):
+        """test that the same command is applied again once its receipt expires"""
+        payload = make_payload("Trisha +")
+        count = Interaction.objects.count()
+        self.client.post(self.path, data=payload)
+        self.client.post(self.path, data=payload)
+        self.assertEqual(Interaction.objects.count(), count + 2)
+
+    def test_undo_twice_without_trigger(self):
+        """test that two undos in a row without a `trigger_id` undo two
+        conversations, rather than the second getting the first's answer"""
+        self.client.post(self.path, data=make_payload("<@U1> +", trigger_id="1"))
+        self.client.post(self.path, data=make_payload("<@U2> + <@U3> -",
+                                                      trigger_id="2"))
+        first = self.client.post(self.path, data=make_payload("undo", trigger_id=""))
+        second = self.client.post(self.path, data=make_payload("undo", trigger_id=""))
+        self.assertNotEqual(first.json(), second.json())
+        self.assertFalse(Interaction.objects.filter(
+            rater__user_id="@U2147483697").exists())
+
+    def test_undo_retried_once(self):
+        """test that a retry of an undo, with its `trigger_id`, undoes just once"""
+        self.client.post(self.path, data=make_payload("<@U1> +", trigger_id="1"))
+        self.client.post(self.path, data=make_payload("<@U2> +", trigger_id="2"))
+        for num in range(2):
+            self.client.post(self.path, data=make_payload("undo", trigger_id="3"))
+        self.assertEqual(Interaction.objects.filter(
+            rater__user_id="@U2147483697").count(), 1)
@@ -0,0 +1,86 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from puppy_interactions.interactions.identity import (
+    apply_aliases, merge_duplicates, normalize_user_id
+)
+from puppy_interactions.interactions.models import Interaction, PairScore, Person
+from puppy_interactions.interactions.utils import create_interactions, retrieve_logs
+
+
+class NormalizedIdTests(TestCase):
+    def test_normalize(self):
+        self.assertEqual(normalize_user_id(" Random \t Guy "), "random guy")
+        self.assertEqual(normalize_user_id("@U2147483697"), "@u2147483697")
+
+    def test_spellings_share_a_person(self):
+        create_interactions("@R1", ("Random Guy", "+"), ("random guy", "+"))
+        create_interactions("@R1", ("Random  Guy", "-"))
+        self.assertEqual(Person.objects.filter(normalized_id="random guy").count(), 1)
+        self.assertEqual(Person.objects.count(), 2)
+        self.assertAlmostEqual(PairScore.objects.get().score, 1)
+
+
+class MergeTests(TestCase):
+    def setUp(self):
+        # people from before `normalized_id`, as the migration leaves them
+        create_interactions("@R1", ("Random Guy", "+"))
+        self.duplicate = Person.objects.create(user_id="random  guy")
+        rater = Person.objects.get(user_id="@R1")
+        Interaction.objects.create(rater=rater, ratee=self.duplicate, rating="+")
+        PairScore.objects.create(rater=rater, ratee=self.duplicate, score=1,
+                                 as_of=rater.created)
+
+    def test_merge_duplicates(self):
+        rater = Person.objects.get(user_id="@R1")
+        self.assertEqual(merge_duplicates(), (0, 1))
+        self.assertFalse(Person.objects.filter(pk=self.duplicate.pk).exists())
+        survivor = Person.objects.get(normalized_id="random guy")
+        self.assertEqual(survivor.ratee_interactions.count(), 2)
+        self.assertAlmostEqual(PairScore.objects.get(rater=rater).score, 2, places=3)
+        self.assertGreater(Person.objects.get(pk=rater.pk).data_version,
+                           rater.data_version)
+
+    def test_merge_people_who_rated_each_other(self):
+        """test that ratings between the merged people are dropped, not turned into
+        self-ratings"""
+        create_interactions("@U1", ("Random Guy", "+"))
+        create_interactions("Random Guy", ("@U1", "-"))
+        self.assertEqual(apply_aliases({"Random Guy": "U1"}), 1)
+        survivor = Person.objects.get(user_id="@U1")
+        self.assertFalse(Interaction.objects.filter(rater=survivor,
+                                                    ratee=survivor).exists())
+        self.assertFalse(PairScore.objects.filter(rater=survivor,
+                                                  ratee=survivor).exists())
+        self.assertEqual(survivor.ratee_interactions.count(), 1)
+        self.assertEqual(PairScore.objects.get(ratee=survivor).rater.user_id, "@R1")
+
+    def test_keys_people_without_one(self):
+        Person.objects.create(user_id="Someone Else")
+        self.assertEqual(merge_duplicates(), (1, 1))
+        self.assertTrue(Person.objects.filter(normalized_id="someone else").exists())
+
+    def test_aliases(self):
+        """test that a mapped raw name is merged into the Slack user and resolves
+        to them from then on"""
+        merge_duplicates()
+        self.assertEqual(apply_aliases({"Random Guy": "U1"}), 1)
+        create_interactions("@R1", ("RANDOM GUY", "-"))
+        rater = Person.objects.get(user_id="@R1")
+        self.assertEqual({record.ratee for record in retrieve_logs(rater)}, {"@U1"})
+        self.assertEqual(len(retrieve_logs(rater)), 3)
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            json.dump({"Random Guy": "U1"}, f)
+        self.addCleanup(os.remove, f.name)
+        out = StringIO()
+        call_command("merge_people", mapping=f.name, stdout=out)
+        self.assertIn("merged 1 duplicates, and 1 people into the users", out.getvalue())
+        self.assertEqual(Person.objects.get(user_id="@U1").ratee_interactions.count(),
+                         2)
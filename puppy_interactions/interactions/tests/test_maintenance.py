@@ -0,0 +1,127 @@
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from django.core.management import call_command
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+
+from puppy_interactions.interactions import maintenance, replication
+from puppy_interactions.interactions.benchmarks import (
+    BENCHMARK_ALIAS, temporary_database
+)
+from puppy_interactions.interactions.models import Interaction
+from puppy_interactions.interactions.replication import LocalDirectoryStorage
+from puppy_interactions.interactions.sharding import (
+    close_shards, ensure_shard, shard_alias, use_database
+)
+from puppy_interactions.interactions.utils import create_interactions
+
+
+class MaintenanceTests(TransactionTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        database = temporary_database(directory=self.directory)
+        self.path = database.__enter__()
+        self.addCleanup(database.__exit__, None, None, None)
+        with use_database(BENCHMARK_ALIAS):
+            create_interactions("@R1", *[(f"Person {number}", "+")
+                                         for number in range(500)])
+            Interaction.objects.all().delete()
+
+    def tearDown(self):
+        replication.forget(BENCHMARK_ALIAS)
+        shutil.rmtree(self.directory)
+
+    def maintain(self, **options) -> str:
+        out = io.StringIO()
+        call_command("db_maintenance", database=BENCHMARK_ALIAS, stdout=out,
+                     **options)
+        return out.getvalue()
+
+    def test_sizes(self):
+        size = maintenance.file_size(BENCHMARK_ALIAS)
+        self.assertEqual(size.bytes, os.path.getsize(self.path))
+        self.assertGreater(size.free_pages, 0)
+        sizes = {row.name: row for row in maintenance.object_sizes(BENCHMARK_ALIAS)}
+        self.assertEqual(sizes["interactions_person"].table, "interactions_person")
+        index = next(row for row in sizes.values()
+                     if row.table == "interactions_interaction"
+                     and row.name != row.table)
+        self.assertGreater(index.bytes, 0)
+
+    def test_full_vacuum(self):
+        """test that a file with free pages is compacted and analyzed"""
+        before = os.path.getsize(self.path)
+        out = self.maintain()
+        self.assertIn("after ANALYZE and full vacuum", out)
+        self.assertIn("interactions_interaction", out)
+        self.assertLess(os.path.getsize(self.path), before)
+        self.assertEqual(maintenance.file_size(BENCHMARK_ALIAS).free_pages, 0)
+        with connections[BENCHMARK_ALIAS].cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM sqlite_stat1")
+            self.assertGreater(cursor.fetchone()[0], 0)
+        self.assertIn("and none vacuum", self.maintain())
+
+    def test_incremental(self):
+        """test that switching to incremental auto_vacuum takes, and is then used"""
+        self.maintain(auto_vacuum="incremental")
+        self.assertEqual(maintenance.file_size(BENCHMARK_ALIAS).auto_vacuum,
+                         "INCREMENTAL")
+        with use_database(BENCHMARK_ALIAS):
+            create_interactions("@R1", *[(f"Person {number}", "-")
+                                         for number in range(500)])
+            Interaction.objects.all().delete()
+        self.assertIn("and incremental vacuum", self.maintain())
+        self.assertEqual(maintenance.file_size(BENCHMARK_ALIAS).free_pages, 0)
+
+    def test_incremental_without_auto_vacuum(self):
+        """test that a forced incremental vacuum of a file that can't take one
+        returns rather than looping"""
+        free = maintenance.file_size(BENCHMARK_ALIAS).free_pages
+        self.assertEqual(maintenance.vacuum(BENCHMARK_ALIAS, "incremental"),
+                         "incremental")
+        self.assertEqual(maintenance.file_size(BENCHMARK_ALIAS).free_pages, free)
+
+    def test_uploads_snapshot(self):
+        """test that the compacted file is uploaded as a snapshot, and restores"""
+        bucket = os.path.join(self.directory, "bucket")
+        with override_settings(INTERACTIONS_REPLICATION={
+                "STORAGE": "local", "LOCATION": bucket, "SNAPSHOT_EVERY": 100,
+                "SNAPSHOT_CODEC": "gzip"}):
+            self.assertIn("Uploaded a", self.maintain(vacuum="full"))
+        storage = LocalDirectoryStorage(bucket)
+        copy = os.path.join(self.directory, "copy.db")
+        self.assertTrue(replication.restore(storage, f"{BENCHMARK_ALIAS}.db", copy))
+        with open(self.path, "rb") as a, open(copy, "rb") as b:
+            self.assertEqual(a.read(), b.read())
+
+    def test_uploads_statistics(self):
+        """test that ANALYZE's statistics are uploaded even when nothing is
+        vacuumed, so a restore has them"""
+        bucket = os.path.join(self.directory, "bucket")
+        with override_settings(INTERACTIONS_REPLICATION={
+                "STORAGE": "local", "LOCATION": bucket, "SNAPSHOT_EVERY": 100,
+                "SNAPSHOT_CODEC": "gzip"}):
+            self.assertIn("of changed pages", self.maintain(vacuum="none"))
+        copy = os.path.join(self.directory, "copy.db")
+        replication.restore(LocalDirectoryStorage(bucket), f"{BENCHMARK_ALIAS}.db",
+                            copy)
+        db = sqlite3.connect(copy)
+        self.addCleanup(db.close)
+        stats = db.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0]
+        self.assertGreater(stats, 0)
+
+    def test_every_database(self):
+        """test that --all maintains the default database and every shard"""
+        with override_settings(
+                INTERACTIONS_SHARD_NAME=os.path.join(self.directory, "{shard}.db")):
+            alias = ensure_shard(shard_alias("T1"))
+            self.addCleanup(close_shards)
+            out = io.StringIO()
+            call_command("db_maintenance", every_database=True, vacuum="none",
+                         stdout=out)
+        self.assertIn("default before", out.getvalue())
+        self.assertIn(f"{alias} after ANALYZE and none vacuum", out.getvalue())
@@ -0,0 +1,75 @@
+import json
+import linecache
+import os
+import platform
+import sqlite3
+import sys
+
+import django
+from django.test import TestCase
+
+from puppy_interactions.interactions import utils
+from puppy_interactions.interactions.benchmarks.memory import (
+    COMMANDS, WARM_RATER, python_peak, recommend_mb, run_command, utils_sites
+)
+from puppy_interactions.interactions.benchmarks.synthetic import populate
+from puppy_interactions.interactions.models import Person
+
+# peak Python allocations per command, in bytes, and the build they were measured
+# on. rewrite it after a deliberate change, or to check another build, with
+# `UPDATE_MEMORY_BASELINE=1 python manage.py test`
+BASELINE = os.path.join(os.path.dirname(__file__), "memory_baseline.json")
+TOLERANCE = 1.25
+SLACK = 64 * 1024
+
+
+def build() -> dict:
+    """what allocation sizes depend on besides this code"""
+    return {"python": "{} {}.{}".format(platform.python_implementation(),
+                                        *sys.version_info[:2]),
+            "django": ".".join(str(part) for part in django.VERSION[:2]),
+            "sqlite": sqlite3.sqlite_version}
+
+
+class MemoryBudgetTests(TestCase):
+    """each slash command, run against synthetic data, may allocate at most a
+    quarter more than the baseline at its peak. peaks differ between interpreters
+    and libraries, so a baseline from another build is skipped"""
+
+    @classmethod
+    def setUpTestData(cls):
+        populate(interactions=3000, raters=10, ratees=100)
+
+    def test_budgets(self):
+        for text in COMMANDS.values():
+            run_command(text, WARM_RATER)
+        peaks = {name: python_peak(lambda: run_command(text))
+                 for name, text in COMMANDS.items()}
+        if os.environ.get("UPDATE_MEMORY_BASELINE"):
+            with open(BASELINE, "w") as f:
+                json.dump({"build": build(), "peaks": peaks}, f, indent=2)
+                f.write("\n")
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+        if baseline["build"] != build():
+            self.skipTest(f"baseline measured on {baseline['build']}, not {build()}; "
+                          f"rewrite it with UPDATE_MEMORY_BASELINE=1")
+        for name, peak in peaks.items():
+            with self.subTest(command=name):
+                self.assertLessEqual(peak, baseline["peaks"][name] * TOLERANCE + SLACK)
+
+    def test_sites(self):
+        """test that rows loaded for a person aggregate are counted against the
+        line loading them. every row of the window is loaded here (the slash
+        command stops at 5), so it's among the largest sites whatever else the
+        lookups allocate"""
+        rater = Person.objects.get(user_id=f"@{WARM_RATER}")
+        sites = utils_sites(lambda: utils.retrieve_aggregated_logs(
+            rater, days=365, aggregate="person"))
+        lines = [linecache.getline(utils.__file__, line)
+                 for line, _ in sites.most_common(3)]
+        self.assertTrue(any("interactions = list(" in line for line in lines), lines)
+
+    def test_recommend(self):
+        self.assertEqual(recommend_mb(40 * 1024 * 1024), 128)
+        self.assertEqual(recommend_mb(100 * 1024 * 1024), 192)
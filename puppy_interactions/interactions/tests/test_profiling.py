@@ -0,0 +1,81 @@
+import json
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse_lazy
+
+from puppy_interactions.interactions.profiling import (
+    HEADER_MAX_AGE, load_profiles, sign_header
+)
+from puppy_interactions.interactions.utils import create_interactions
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.config = {"SAMPLE_RATE": 0, "SECRET": "s3cret", "MODE": "cprofile",
+                       "STORAGE": "local", "LOCATION": self.directory}
+        create_interactions("@U2147483697", ("Random Guy", "+"))
+
+    def post(self, **headers):
+        return self.client.post(reverse_lazy("interactions"),
+                                data={"user_id": "U2147483697", "text": "365 time"},
+                                **headers)
+
+    def profiles(self):
+        with override_settings(INTERACTIONS_PROFILING=self.config):
+            return load_profiles()
+
+    def test_signed_header(self):
+        with override_settings(INTERACTIONS_PROFILING=self.config):
+            response = self.post(HTTP_X_INTERACTIONS_PROFILE=sign_header())
+        self.assertEqual(response.status_code, 200)
+        profile, = self.profiles()
+        self.assertEqual(profile["command"], "logs")
+        self.assertTrue(profile["functions"])
+        self.assertTrue(any("interactions_interaction" in query["sql"]
+                            for query in profile["queries"]))
+        # statements are stored without their parameters
+        self.assertNotIn("U2147483697", json.dumps(profile))
+
+    def test_bad_headers_ignored(self):
+        with override_settings(INTERACTIONS_PROFILING=self.config):
+            self.post(HTTP_X_INTERACTIONS_PROFILE=sign_header(secret="wrong"))
+            self.post(HTTP_X_INTERACTIONS_PROFILE=sign_header(
+                time.time() - HEADER_MAX_AGE - 1))
+            self.post()
+        self.assertEqual(self.profiles(), [])
+
+    def test_sampled(self):
+        self.config.update(SAMPLE_RATE=1, MODE="sample")
+        with override_settings(INTERACTIONS_PROFILING=self.config):
+            self.post()
+        profile, = self.profiles()
+        self.assertIn("stacks", profile)
+
+    def test_summary(self):
+        self.config.update(SAMPLE_RATE=1)
+        out = StringIO()
+        with override_settings(INTERACTIONS_PROFILING=self.config):
+            self.post()
+            self.post()
+            call_command("profile_summary", stdout=out)
+        self.assertIn("logs: 2 profiles", out.getvalue())
+
+    def test_summary_by_database(self):
+        self.config.update(SAMPLE_RATE=1)
+        with override_settings(INTERACTIONS_PROFILING=self.config):
+            self.post()
+            profile, = load_profiles()
+            out = StringIO()
+            call_command("profile_summary", database="default", stdout=out)
+            call_command("profile_summary", database="team_0000", stdout=out)
+        self.assertEqual({query["database"] for query in profile["queries"]},
+                         {"default"})
+        self.assertIn("logs: 1 profiles", out.getvalue())
+        self.assertIn("No profiles stored.", out.getvalue())
@@ -0,0 +1,97 @@
+import re
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple
+
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse_lazy
+
+from puppy_interactions.interactions.benchmarks.synthetic import populate
+
+# statements each command may run, receipts and savepoints included
+QUERY_BUDGETS = {
+    "<@U000001> + Random Guy3 -": 9,
+    "": 2,
+    "7": 2,
+    "+": 2,
+    "90 -": 2,
+    "365 person": 2,
+    "30 time +": 2,
+    "top": 2,
+    "top 10 90 -": 2,
+    "trend": 2,
+    "find random": 2,
+    "help": 0,
+    "conversations 7": 2,
+    # the graph is built once per period, and the answer stored once
+    "mutual": 5,
+    "token": 2,
+    "undo": 12,
+    "clear": 9,
+}
+BAD_PLANS = [re.compile(r"\bSCAN (TABLE )?interactions_interaction\b"),
+             re.compile(r"USE TEMP B-TREE")]
+# plan lines a command is expected to have anyway
+ALLOWED_PLANS = {
+    # one rater's `days` of rows, grouped by conversation, then the groups sorted
+    "conversations 7": re.compile(r"USE TEMP B-TREE FOR (GROUP|ORDER) BY"),
+}
+
+
+@contextmanager
+def capture_statements() -> Iterator[List[Tuple[str, tuple]]]:
+    """every statement run on the default connection, with its parameters"""
+    statements = []
+
+    def record(execute, sql, params, many, context):
+        if not many:
+            statements.append((sql, tuple(params or ())))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(record):
+        yield statements
+
+
+def explain(sql: str, params: tuple) -> List[str]:
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+class QueryPlanTests(TestCase):
+    """every statement behind each slash command, run against synthetic data, must
+    use an index on `interactions_interaction` and need no temporary B-tree"""
+
+    @classmethod
+    def setUpTestData(cls):
+        populate(interactions=3000, raters=10, ratees=100)
+
+    def setUp(self):
+        # cached responses and rate limits would hide statements
+        for cache in caches.all():
+            cache.clear()
+
+    def run_command(self, text: str) -> List[Tuple[str, tuple]]:
+        with capture_statements() as statements:
+            response = self.client.post(reverse_lazy("interactions"),
+                                        data={"user_id": "R000000", "text": text})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Sorry", response.json()["text"])
+        return [(sql, params) for sql, params in statements
+                if re.match(r"\s*(SELECT|INSERT|UPDATE|DELETE)", sql, re.I)]
+
+    def test_plans(self):
+        for text in QUERY_BUDGETS:
+            allowed = ALLOWED_PLANS.get(text)
+            for sql, params in self.run_command(text):
+                plan = "\n".join(line for line in explain(sql, params)
+                                 if not (allowed and allowed.search(line)))
+                for bad in BAD_PLANS:
+                    with self.subTest(command=text, sql=sql):
+                        self.assertNotRegex(plan, bad)
+
+    def test_budgets(self):
+        for text, budget in QUERY_BUDGETS.items():
+            with self.subTest(command=text):
+                self.assertLessEqual(len(self.run_command(text)), budget)
@@ -0,0 +1,98 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse_lazy
+
+from puppy_interactions.interactions.models import Interaction
+from puppy_interactions.interactions.ratelimit import TokenBucket
+
+LIMITS = {"read": {"capacity": 3, "per_minute": 60},
+          "write": {"capacity": 2, "per_minute": 60}}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TokenBucketTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.clock = FakeClock()
+        self.bucket = TokenBucket("test", capacity=3, rate=1, clock=self.clock)
+
+    def test_burst_then_throttle(self):
+        """test that a full bucket allows `capacity` calls, then reports the wait"""
+        for num in range(3):
+            self.assertEqual(self.bucket.consume("@U1"), 0)
+        self.assertAlmostEqual(self.bucket.consume("@U1"), 1)
+
+    def test_refills(self):
+        for num in range(3):
+            self.bucket.consume("@U1")
+        self.clock.now += 1.5
+        self.assertEqual(self.bucket.consume("@U1"), 0)
+        self.assertAlmostEqual(self.bucket.consume("@U1"), 0.5)
+
+    def test_keys_independent(self):
+        for num in range(3):
+            self.bucket.consume("@U1")
+        self.assertEqual(self.bucket.consume("@U2"), 0)
+
+
+@override_settings(INTERACTIONS_RATE_LIMITS=LIMITS)
+class ThrottledViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.path = reverse_lazy("interactions")
+
+    def post(self, text, user_id="U2147483697", trigger_id=""):
+        return self.client.post(self.path, data={
+            "user_id": user_id, "text": text, "trigger_id": trigger_id
+        }).json()
+
+    def test_writes_throttled_without_db(self):
+        """test that writes past the budget get an ephemeral reply and no queries"""
+        self.post("<@U1> +", trigger_id="1")
+        self.post("<@U2> +", trigger_id="2")
+        count = Interaction.objects.count()
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.post("<@U3> +", trigger_id="3")
+        self.assertEqual(data["response_type"], "ephemeral")
+        self.assertIn("slow down", data["text"])
+        self.assertEqual(ctx.captured_queries, [])
+        self.assertEqual(Interaction.objects.count(), count)
+
+    def test_retries_not_throttled(self):
+        """test that Slack's retry of an applied write gets its answer, not a
+        "slow down", when the budget is spent"""
+        first = self.post("<@U1> +", trigger_id="1")
+        self.post("<@U2> +", trigger_id="2")
+        retry = self.client.post(self.path, data={
+            "user_id": "U2147483697", "text": "<@U1> +", "trigger_id": "1"
+        }, HTTP_X_SLACK_RETRY_NUM="1").json()
+        self.assertEqual(retry, first)
+        self.assertIn("slow down", self.client.post(self.path, data={
+            "user_id": "U2147483697", "text": "<@U3> +", "trigger_id": "3"
+        }, HTTP_X_SLACK_RETRY_NUM="1").json()["text"])
+
+    def test_reads_and_writes_separate(self):
+        """test that spending the write budget leaves reads alone"""
+        self.post("<@U1> +", trigger_id="1")
+        self.post("<@U2> +", trigger_id="2")
+        self.assertIn("attachments", self.post(""))
+
+    def test_users_separate(self):
+        """test that one user's loop doesn't throttle another"""
+        for num in range(3):
+            self.post(f"<@U{num}> +", trigger_id=str(num))
+        self.assertNotIn("slow down", self.post("<@U9> +", user_id="U2"))
+
+    def test_help_never_throttled(self):
+        for num in range(5):
+            self.assertNotIn("slow down", self.post("help")["text"])
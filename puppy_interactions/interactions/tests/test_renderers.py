@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from puppy_interactions.interactions.models import Interaction
+from puppy_interactions.interactions.renderers import (
+    render_log_attachments, render_aggregate_attachments
+)
+from puppy_interactions.interactions.utils import LogRecord
+
+
+class RenderLogAttachmentsTests(SimpleTestCase):
+    def test_matches_interaction_str(self):
+        """test that records render the same text as `Interaction.__str__`"""
+        created = datetime(2019, 1, 27, 15, 30, tzinfo=timezone.utc)
+        records = [LogRecord("@U2398577", Interaction.POSITIVE, created),
+                   LogRecord("Trisha", Interaction.NEGATIVE, created),
+                   LogRecord("Trisha", "?", created)]
+        self.assertEqual(render_log_attachments(records), [
+            {"text": "*@U2398577*\t27 Jan 2019\t*:slightly_smiling_face:*"},
+            {"text": "*Trisha*\t27 Jan 2019\t*:white_frowning_face:*"},
+            {"text": "*Trisha*\t27 Jan 2019\t*:grey_question:*"},
+        ])
+
+    def test_empty(self):
+        self.assertEqual(render_log_attachments([]), [])
+
+
+class RenderAggregateAttachmentsTests(SimpleTestCase):
+    def test_renders_each_key(self):
+        """test one attachment per aggregation key"""
+        aggregated = {"27 Jan 2019": {"positive": 2, "negative": 1}}
+        self.assertEqual(render_aggregate_attachments(aggregated), [
+            {"text": "27 Jan 2019:: *positive* 2 / *negative* 1"}
+        ])
@@ -0,0 +1,258 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import mock, skipUnless
+
+from django.core.signals import request_started
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from puppy_interactions.interactions import metrics, replication, snapshot
+from puppy_interactions.interactions.benchmarks import (
+    BENCHMARK_ALIAS, temporary_database
+)
+from puppy_interactions.interactions.replication import (
+    LocalDirectoryStorage, ReplicaConflict, Replicator, restore
+)
+from puppy_interactions.interactions.models import Person
+from puppy_interactions.interactions.sharding import use_database
+from puppy_interactions.interactions.utils import create_interactions
+
+
+class ReplicatorTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "source.db")
+        self.storage = LocalDirectoryStorage(os.path.join(self.directory, "bucket"))
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, body TEXT)")
+        self.write("INSERT INTO t (body) VALUES (?)", [("x" * 100,)] * 2000)
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.directory)
+
+    def write(self, sql, rows=((),)):
+        self.db.executemany(sql, rows)
+        self.db.commit()
+
+    def replicator(self, **kwargs):
+        return Replicator(self.path, self.storage, name="source.db",
+                          snapshot_every=kwargs.pop("snapshot_every", 100), **kwargs)
+
+    def assertRestores(self):
+        copy = os.path.join(self.directory, "copy.db")
+        self.assertTrue(restore(self.storage, "source.db", copy))
+        with open(self.path, "rb") as a, open(copy, "rb") as b:
+            self.assertEqual(a.read(), b.read())
+
+    def keys(self, kind):
+        return self.storage.list(f"source.db/{kind}")
+
+    def test_start_snapshots_existing_file(self):
+        self.assertFalse(self.replicator().start())
+        self.assertEqual(len(self.keys("snapshots")), 1)
+        self.assertRestores()
+
+    def test_uploads_changed_pages(self):
+        """test that a small write uploads a small delta, not the file"""
+        replicator = self.replicator()
+        replicator.start()
+        self.write("INSERT INTO t (body) VALUES ('new')")
+        uploaded = replicator.sync()
+        self.assertGreater(uploaded, 0)
+        self.assertLess(uploaded, os.path.getsize(self.path) / 20)
+        self.assertEqual(len(self.keys("deltas")), 1)
+        self.assertEqual(replicator.sync(), 0)
+        self.assertRestores()
+
+    def test_round_trip(self):
+        """test that restoring replays updates, deletes and a shrinking file"""
+        replicator = self.replicator()
+        replicator.start()
+        for sql in ["UPDATE t SET body = 'y' WHERE id % 7 = 0",
+                    "DELETE FROM t WHERE id > 1500", "VACUUM",
+                    "INSERT INTO t (body) VALUES ('z')"]:
+            self.write(sql)
+            replicator.sync()
+        self.assertRestores()
+
+    def test_snapshots_bound_replay(self):
+        replicator = self.replicator(snapshot_every=3)
+        replicator.start()
+        for num in range(8):
+            self.write("UPDATE t SET body = ? WHERE id = ?", [(str(num), num * 200)])
+            replicator.sync()
+        self.assertLessEqual(len(self.keys("snapshots")), 2)
+        latest = int(self.keys("snapshots")[-1].rsplit("/", 1)[1])
+        self.assertLess(len([key for key in self.keys("deltas")
+                             if int(key.rsplit("/", 1)[1]) > latest]), 3)
+        self.assertRestores()
+
+    def test_failed_upload_retried(self):
+        """test that pages from a failed upload go out with the next one"""
+        replicator = self.replicator()
+        replicator.start()
+        self.write("UPDATE t SET body = 'a' WHERE id = 1")
+        with mock.patch.object(self.storage, "put", side_effect=OSError("down")):
+            self.assertRaises(OSError, replicator.sync)
+        self.write("UPDATE t SET body = 'b' WHERE id = 2000")
+        replicator.sync()
+        self.assertRestores()
+
+    def test_snapshot_compressed(self):
+        """test that snapshots are uploaded gzipped and restore"""
+        self.replicator(codec="gzip").start()
+        data = self.storage.get(self.keys("snapshots")[-1])
+        self.assertEqual(snapshot.detect(data), "gzip")
+        self.assertLess(len(data), os.path.getsize(self.path) / 4)
+        self.assertRestores()
+
+    def test_restores_uncompressed_snapshot(self):
+        """test that snapshots from before compression still restore"""
+        with open(self.path, "rb") as f:
+            self.storage.put("source.db/snapshots/000000000001", f.read())
+        replicator = self.replicator(codec="gzip")
+        # restored, since the bucket has data and the file doesn't say it holds it
+        self.db.close()
+        self.assertTrue(replicator.start())
+        self.db = sqlite3.connect(self.path)
+        self.write("UPDATE t SET body = 'a' WHERE id = 1")
+        replicator.sync()
+        self.assertRestores()
+
+    @skipUnless(snapshot.zstandard, "zstandard isn't installed")
+    def test_zstd_round_trip(self):
+        self.replicator(codec="zstd").start()
+        with self.storage.open(self.keys("snapshots")[-1]) as f:
+            self.assertEqual(snapshot.detect(f.read(4)), "zstd")
+        self.assertRestores()
+
+    def test_start_restores_missing_file(self):
+        replicator = self.replicator()
+        replicator.start()
+        self.write("INSERT INTO t (body) VALUES ('new')")
+        replicator.sync()
+
+        copy = os.path.join(self.directory, "restored.db")
+        self.assertTrue(Replicator(copy, self.storage, name="source.db").start())
+        with open(self.path, "rb") as a, open(copy, "rb") as b:
+            self.assertEqual(a.read(), b.read())
+
+    def other_process(self):
+        """a second copy of the database, as another container would have"""
+        path = os.path.join(self.directory, "other.db")
+        replicator = Replicator(path, self.storage, name="source.db",
+                                snapshot_every=100)
+        self.assertTrue(replicator.start())
+        db = sqlite3.connect(path)
+        self.addCleanup(db.close)
+        return replicator, db, path
+
+    def assertSameFile(self, path):
+        with open(self.path, "rb") as a, open(path, "rb") as b:
+            self.assertEqual(a.read(), b.read())
+
+    def test_exclusive_put(self):
+        self.storage.put("source.db/deltas/000000000001", b"a", exclusive=True)
+        with self.assertRaises(ReplicaConflict):
+            self.storage.put("source.db/deltas/000000000001", b"b", exclusive=True)
+        self.assertEqual(self.storage.get("source.db/deltas/000000000001"), b"a")
+        self.assertEqual(self.keys("deltas"), ["source.db/deltas/000000000001"])
+
+    def test_start_restores_stale_file(self):
+        """test that a file behind the bucket is restored, not snapshotted over it"""
+        self.replicator().start()
+        other, db, path = self.other_process()
+        db.execute("INSERT INTO t (body) VALUES ('newer')")
+        db.commit()
+        other.sync()
+
+        self.db.close()
+        self.assertTrue(self.replicator().start())
+        self.db = sqlite3.connect(self.path)
+        self.assertSameFile(path)
+        self.assertEqual(len(self.keys("snapshots")), 1)
+
+    def test_concurrent_upload_refused(self):
+        """test that a process can't upload over another's delta, uploads nothing
+        more until restored, and then carries on from the other's data"""
+        replicator = self.replicator()
+        replicator.start()
+        other, db, path = self.other_process()
+        db.execute("INSERT INTO t (body) VALUES ('theirs')")
+        db.commit()
+        other.sync()
+        self.assertFalse(other.behind())
+
+        self.write("INSERT INTO t (body) VALUES ('ours')")
+        self.assertTrue(replicator.behind())
+        self.assertRaises(ReplicaConflict, replicator.sync)
+        self.assertRaises(ReplicaConflict, replicator.snapshot)
+        self.assertEqual(len(self.keys("deltas")), 1)
+
+        self.db.close()
+        self.assertTrue(replicator.catch_up())
+        self.db = sqlite3.connect(self.path)
+        self.assertFalse(replicator.behind())
+        self.assertSameFile(path)
+        self.write("INSERT INTO t (body) VALUES ('ours again')")
+        replicator.sync()
+        self.assertTrue(other.behind())
+        self.assertRestores()
+
+
+class ReplicateOnCommitTests(TransactionTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        metrics.reset()
+
+    def tearDown(self):
+        replication.forget(BENCHMARK_ALIAS)
+        shutil.rmtree(self.directory)
+
+    def test_writes_replicated(self):
+        """test that a committed create uploads a delta"""
+        with override_settings(INTERACTIONS_REPLICATION={
+                "STORAGE": "local", "LOCATION": self.directory, "SNAPSHOT_EVERY": 100}):
+            with temporary_database() as path, use_database(BENCHMARK_ALIAS):
+                replication.prepare(BENCHMARK_ALIAS)
+                snapshot = metrics.snapshot()["replication.bytes_uploaded"]
+                create_interactions("@R1", ("@U1", "+"))
+                file_size = os.path.getsize(path)
+        storage = LocalDirectoryStorage(self.directory)
+        self.assertEqual(len(storage.list(f"{BENCHMARK_ALIAS}.db/deltas")), 1)
+        stats = metrics.snapshot("replication.")
+        self.assertEqual(stats["replication.writes"], 1)
+        self.assertLess(stats["replication.bytes_uploaded"] - snapshot, file_size / 5)
+
+    def test_refresh(self):
+        """test that a request's reads see what another process uploaded"""
+        with override_settings(INTERACTIONS_REPLICATION={
+                "STORAGE": "local", "LOCATION": self.directory, "SNAPSHOT_EVERY": 100}):
+            with temporary_database(), use_database(BENCHMARK_ALIAS):
+                replication.prepare(BENCHMARK_ALIAS)
+                create_interactions("@R1", ("@U1", "+"))
+                self.assertFalse(replication.refresh(BENCHMARK_ALIAS))
+
+                storage = LocalDirectoryStorage(self.directory)
+                other = Replicator(os.path.join(self.directory, "other.db"), storage,
+                                   name=f"{BENCHMARK_ALIAS}.db")
+                other.start()
+                db = sqlite3.connect(other.path)
+                db.execute("UPDATE interactions_person SET data_version = 99")
+                db.commit()
+                db.close()
+                other.sync()
+
+                self.assertTrue(replication.refresh(BENCHMARK_ALIAS))
+                self.assertEqual(Person.objects.get(user_id="@R1").data_version, 99)
+
+
+class PrepareTests(SimpleTestCase):
+    def test_prepared_when_request_starts(self):
+        """test that the default database is restored from its replica before a
+        request can open it"""
+        with mock.patch.object(replication, "prepare") as prepare:
+            request_started.send(sender=self.__class__)
+        prepare.assert_called_once_with("default")
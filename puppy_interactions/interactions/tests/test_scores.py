@@ -0,0 +1,106 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from puppy_interactions.interactions.models import PairScore, Person
+from puppy_interactions.interactions.scores import decayed, retrieve_trend
+from puppy_interactions.interactions.utils import (
+    clear_logs, create_interactions, create_interactions_batch, parse_webhook_text,
+    undo_last_conversation
+)
+
+
+@override_settings(INTERACTIONS_SCORE_HALF_LIFE_DAYS=30)
+class PairScoreTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+
+    def create_at(self, days_later, *tuples, rater="@R1"):
+        with mock.patch("django.utils.timezone.now") as mock_now:
+            mock_now.return_value = self.now + timedelta(days=days_later)
+            create_interactions(rater, *tuples)
+
+    def score(self, rater="@R1", ratee="@U1"):
+        return PairScore.objects.get(rater__user_id=rater, ratee__user_id=ratee)
+
+    def test_decayed(self):
+        self.assertAlmostEqual(decayed(4, self.now, self.now + timedelta(days=60)), 1)
+        self.assertEqual(decayed(4, self.now, self.now - timedelta(days=1)), 4)
+
+    def test_updated_on_create(self):
+        """test that each new rating is added to the score decayed since the last"""
+        self.create_at(0, ("@U1", "+"), ("@U1", "+"), ("@U2", "-"))
+        self.assertEqual(self.score().score, 2)
+        self.assertEqual(self.score(ratee="@U2").score, -1)
+
+        self.create_at(30, ("@U1", "-"))
+        pair = self.score()
+        self.assertAlmostEqual(pair.score, 0)
+        self.assertEqual(pair.as_of, self.now + timedelta(days=30))
+
+    def test_updated_in_batches(self):
+        create_interactions_batch([("@R1", [("@U1", "+")]), ("@R2", [("@U1", "-")]),
+                                   ("@R1", [("@U1", "+")])])
+        self.assertEqual(self.score().score, 2)
+        self.assertEqual(self.score(rater="@R2").score, -1)
+
+    def test_bounded_lookups(self):
+        """test that the pairs are looked up in chunks of raters and ratees both,
+        so no query binds more than `LOOKUP_BATCH_SIZE` ids"""
+        items = [(f"@R{rater}", [(f"@U{ratee}", "+") for ratee in range(3)])
+                 for rater in range(5)]
+        create_interactions_batch(items)
+        with mock.patch("puppy_interactions.interactions.scores.LOOKUP_BATCH_SIZE", 4), \
+                CaptureQueriesContext(connection) as queries:
+            create_interactions_batch(items)
+        lookups = [query["sql"] for query in queries
+                   if query["sql"].startswith("SELECT")
+                   and "interactions_pairscore" in query["sql"]]
+        self.assertEqual(len(lookups), 15 // 2 + 1)
+        self.assertAlmostEqual(self.score(rater="@R4", ratee="@U2").score, 2)
+
+    def test_constant_queries(self):
+        """test that updating scores costs the same for one pair as for many"""
+        self.create_at(0, *[(f"@U{num}", "+") for num in range(30)])
+        with CaptureQueriesContext(connection) as one:
+            self.create_at(1, ("@U1", "+"))
+        with CaptureQueriesContext(connection) as many:
+            self.create_at(2, *[(f"@U{num}", "+") for num in range(30)])
+        self.assertEqual(len(one), len(many))
+
+    def test_trend(self):
+        """test the best and worst current scores, leaving out faded ones"""
+        self.create_at(-300, ("@U5", "+"))
+        self.create_at(-1, ("@U1", "+"), ("@U1", "+"), ("@U2", "+"), ("@U3", "-"))
+        Person.objects.filter(user_id="@U2").update(display_name="Ann")
+        self.create_at(-60, ("@U4", "-"), ("@U4", "-"), ("@U4", "-"))
+
+        rater = Person.objects.get(user_id="@R1")
+        with mock.patch("django.utils.timezone.now") as mock_now:
+            mock_now.return_value = self.now
+            with self.assertNumQueries(1):
+                rising, falling = retrieve_trend(rater, count=5)
+        self.assertEqual([name for name, _ in rising], ["@U1", "Ann"])
+        self.assertEqual([name for name, _ in falling], ["@U3", "@U4"])
+        self.assertAlmostEqual(falling[1][1], -0.75, places=2)
+
+    def test_undone(self):
+        """test that an undone rating is taken out as much as it has decayed"""
+        self.create_at(0, ("@U1", "+"), ("@U1", "+"))
+        self.create_at(30, ("@U1", "-"))
+        with mock.patch("django.utils.timezone.now") as mock_now:
+            mock_now.return_value = self.now + timedelta(days=60)
+            undo_last_conversation("@R1")
+        self.assertAlmostEqual(self.score().score, 0.5, places=3)
+
+    def test_cleared(self):
+        self.create_at(0, ("@U1", "+"))
+        clear_logs("@R1")
+        self.assertFalse(PairScore.objects.filter(rater__user_id="@R1").exists())
+
+    def test_parse_trend(self):
+        self.assertEqual(parse_webhook_text("trend"), "trend")
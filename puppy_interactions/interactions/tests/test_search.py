@@ -0,0 +1,60 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from puppy_interactions.interactions.models import Person, PersonTrigram
+from puppy_interactions.interactions.search import find_people, trigrams
+from puppy_interactions.interactions.slack import store_display_names
+from puppy_interactions.interactions.utils import create_interactions, parse_webhook_text
+
+
+class FindPeopleTests(TestCase):
+    def setUp(self):
+        create_interactions("@R1", ("Random Guy", "+"), ("Random Guy", "-"),
+                            ("Randall Flagg", "+"), ("Another Person", "+"),
+                            ("@U1", "+"))
+        create_interactions("@R2", ("Random Gal", "+"))
+        self.rater = Person.objects.get(user_id="@R1")
+
+    def test_trigrams(self):
+        self.assertEqual(trigrams("Guy"), {"  g", " gu", "guy", "uy "})
+        self.assertEqual(trigrams("<@U1>"), {"  u", " u1", "u1 "})
+        self.assertEqual(trigrams("-"), set())
+
+    def test_parse(self):
+        self.assertEqual(parse_webhook_text("find rand"), "find")
+        self.assertEqual(parse_webhook_text("Find Random Guy"), "find")
+        self.assertEqual(parse_webhook_text("find <@U1>"), "find")
+
+    def test_parse_rating_find(self):
+        """test that rating someone named "find ..." is a create, not a search"""
+        self.assertEqual(parse_webhook_text("find Random +"), "create")
+        self.assertEqual(parse_webhook_text("Find -"), "create")
+
+    def test_ranked(self):
+        """test that closer matches come first, then the most interactions"""
+        self.assertEqual(find_people(self.rater, "random guy"),
+                         [("Random Guy", 2)])
+        self.assertEqual(find_people(self.rater, "rand"),
+                         [("Random Guy", 2), ("Randall Flagg", 1)])
+        self.assertEqual(find_people(self.rater, "flag"), [("Randall Flagg", 1)])
+        self.assertEqual(find_people(self.rater, "xyz"), [])
+
+    def test_only_own_ratees(self):
+        self.assertNotIn("Random Gal", dict(find_people(self.rater, "random gal")))
+
+    def test_display_names(self):
+        """test that synced display names are searchable"""
+        store_display_names({"@U1": "Trisha"})
+        self.assertEqual(find_people(self.rater, "trish"), [("Trisha", 1)])
+        self.assertEqual(find_people(self.rater, "u1"), [("Trisha", 1)])
+
+    def test_indexed_on_save(self):
+        person = Person.objects.create(user_id="@U9", display_name="Zed")
+        self.assertIn("zed", set(PersonTrigram.objects.filter(person=person)
+                                 .values_list("trigram", flat=True)))
+
+    def test_constant_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            find_people(self.rater, "random")
+        self.assertEqual(len(queries), 2)
@@ -0,0 +1,198 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse_lazy
+
+from puppy_interactions.interactions.digest import iter_all_digests
+from puppy_interactions.interactions.models import (
+    Interaction, PairScore, Person, PersonAlias, Shard
+)
+from puppy_interactions.interactions.sharding import (
+    all_databases, close_shards, current_alias, database_for, each_database,
+    ensure_shard, shard_alias, use_database
+)
+from puppy_interactions.interactions.utils import create_interactions
+from puppy_interactions.interactions.warmup import scheduled_warmup
+
+
+class ShardAliasTests(TransactionTestCase):
+    def test_hashed(self):
+        """test that aliases are stable and don't reveal the team"""
+        self.assertEqual(shard_alias("T0001"), shard_alias("T0001"))
+        self.assertNotEqual(shard_alias("T0001"), shard_alias("T0002"))
+        self.assertNotIn("T0001", shard_alias("T0001"))
+        self.assertTrue(shard_alias("T0001").isidentifier())
+
+    def test_enterprise_shared(self):
+        self.assertEqual(shard_alias("T0001", "E0001"), shard_alias("T0002", "E0001"))
+
+
+class TeamShardTests(TransactionTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        settings = override_settings(
+            INTERACTIONS_SHARD_BY_TEAM=True, INTERACTIONS_BATCH_TOKEN="s3cret",
+            INTERACTIONS_SHARD_NAME=os.path.join(self.directory, "{shard}.db"),
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def tearDown(self):
+        close_shards()
+        shutil.rmtree(self.directory)
+
+    def post(self, text, team_id, user_id="U1"):
+        return self.client.post(reverse_lazy("interactions"),
+                                data={"user_id": user_id, "team_id": team_id,
+                                      "text": text})
+
+    def count(self, team_id, model=Interaction):
+        with use_database(ensure_shard(shard_alias(team_id))):
+            return model.objects.count()
+
+    def test_requests_use_team_shard(self):
+        """test that each team's commands only see that team's database"""
+        self.post("<@U2> + <@U3> -", team_id="T1")
+        self.post("<@U2> +", team_id="T2")
+        self.assertEqual(self.count("T1"), 2)
+        self.assertEqual(self.count("T2"), 1)
+        self.assertEqual(Interaction.objects.count(), 0)
+
+        attachments = self.post("", team_id="T2").json()["attachments"]
+        self.assertEqual(len(attachments), 2)  # one log and the hint
+        self.assertEqual(current_alias(), "default")
+
+    def test_disabled(self):
+        with override_settings(INTERACTIONS_SHARD_BY_TEAM=False):
+            self.post("<@U2> +", team_id="T1")
+        self.assertEqual(Interaction.objects.count(), 1)
+
+    def test_batch_split_by_team(self):
+        payloads = [{"user_id": "U1", "team_id": team_id, "text": "<@U2> +",
+                     "trigger_id": str(num)}
+                    for num, team_id in enumerate(["T1", "T2", "T1"])]
+        response = self.client.post(reverse_lazy("interactions-batch"),
+                                    data=json.dumps(payloads),
+                                    content_type="application/json",
+                                    HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual([result["ok"] for result in response.json()["results"]],
+                         [True] * 3)
+        self.assertEqual(self.count("T1"), 2)
+        self.assertEqual(self.count("T2"), 1)
+
+    def test_migrates_once_per_process(self):
+        alias = ensure_shard(shard_alias("T1"))
+        with mock.patch("puppy_interactions.interactions.sharding.call_command") as cmd:
+            ensure_shard(alias)
+        cmd.assert_not_called()
+
+    def split(self, **options):
+        call_command("split_by_team", stdout=open(os.devnull, "w"), **options)
+
+    def test_split_by_team(self):
+        """test that raters are moved to their team's shard with their history"""
+        create_interactions("@U1", ("@U2", "+"), ("Random Guy", "-"))
+        create_interactions("@U2", ("@U1", "+"))
+        create_interactions("@U3", ("@U1", "+"))
+        created = Interaction.objects.get(rater__user_id="@U2").created
+        PersonAlias.objects.create(alias="random guy",
+                                   person=Person.objects.get(user_id="Random Guy"))
+
+        mapping = os.path.join(self.directory, "mapping.json")
+        with open(mapping, "w") as f:
+            json.dump({"U1": "T1", "U2": ["T2", "E1"]}, f)
+        self.split(mapping=mapping)
+
+        self.assertEqual(self.count("T1"), 2)
+        self.assertEqual(self.count("T1", PairScore), 2)
+        self.assertEqual(self.count("T1", Person), 3)
+        self.assertEqual(self.count("T1", PersonAlias), 1)
+        with use_database(ensure_shard(shard_alias("T3", "E1"))):
+            self.assertEqual(Interaction.objects.get().created, created)
+
+        # moved rows are gone from the default database; @U3, left out, stays with
+        # the person they rate
+        self.assertEqual(list(Interaction.objects.values_list("rater__user_id",
+                                                              flat=True)), ["@U3"])
+        self.assertEqual(PairScore.objects.count(), 1)
+        self.assertEqual(sorted(Person.objects.values_list("user_id", flat=True)),
+                         ["@U1", "@U3"])
+        self.assertFalse(PersonAlias.objects.exists())
+
+        # rows already in a shard are skipped
+        self.split(assign_all="T1")
+        self.assertEqual(self.count("T1"), 3)
+        self.assertEqual(self.count("T1", Person), 4)
+        self.assertFalse(Interaction.objects.exists())
+
+    def test_split_keeps_source(self):
+        create_interactions("@U1", ("@U2", "+"))
+        self.split(assign_all="T1", keep_source=True)
+        self.assertEqual(self.count("T1"), 1)
+        self.assertEqual(Interaction.objects.count(), 1)
+
+    def test_split_conflict(self):
+        """test that someone already in the shard under another guid stops the split
+        rather than being skipped, which would orphan their interactions"""
+        create_interactions("@U1", ("@U2", "+"))
+        with use_database(ensure_shard(shard_alias("T1"))):
+            Person.objects.create(user_id="@U2")
+        with self.assertRaises(CommandError):
+            self.split(assign_all="T1")
+        self.assertEqual(self.count("T1"), 0)
+        self.assertEqual(Interaction.objects.count(), 1)
+
+    def test_registry(self):
+        """test that shards are recorded in the default database as they're first
+        used, and that jobs go through each of them"""
+        self.post("<@U2> +", team_id="T1")
+        self.post("<@U2> +", team_id="T2")
+        self.post("<@U3> +", team_id="T2")
+        create_interactions("@U1", ("@U4", "+"))
+        aliases = sorted([shard_alias("T1"), shard_alias("T2")])
+        self.assertEqual(all_databases(), ["default"] + aliases)
+        self.assertEqual(list(Shard.objects.values_list("alias", flat=True)), aliases)
+
+        counts = {alias: Interaction.objects.count() for alias in each_database()}
+        self.assertEqual(counts, {"default": 1, shard_alias("T1"): 1,
+                                  shard_alias("T2"): 2})
+        self.assertEqual(current_alias(), "default")
+        # jobs like the weekly digest
+        self.assertEqual(sorted(digest.total for digest in iter_all_digests()),
+                         [1, 1, 2])
+
+    def test_warm_up(self):
+        """test that the public warm-up request only warms the default database,
+        leaving every shard to the scheduled warm-up"""
+        self.post("<@U2> +", team_id="T1")
+        create_interactions("@U1", ("@U4", "+"))
+        response = self.client.get(reverse_lazy("interactions-warmup"))
+        steps = {step["name"]: step["warmed"] for step in response.json()["steps"]}
+        self.assertEqual(steps["connect"], 1)
+        steps = {step.name: step.warmed for step in scheduled_warmup()}
+        self.assertEqual(steps["connect"], 2)
+        self.assertEqual(steps["queries"], 8)
+
+    def test_database_for(self):
+        """test that an alias is checked without reading the whole registry"""
+        alias = ensure_shard(shard_alias("T1"))
+        with self.assertNumQueries(0):
+            self.assertEqual(database_for(alias), alias)
+        with self.assertNumQueries(1):
+            self.assertEqual(database_for("team_0000"), "default")
+        self.assertEqual(database_for(None), "default")
+
+    def test_shard_tables(self):
+        """test that shards only get this app's tables, without the registry"""
+        alias = ensure_shard(shard_alias("T1"))
+        tables = connections[alias].introspection.table_names()
+        self.assertIn(Interaction._meta.db_table, tables)
+        self.assertNotIn(Shard._meta.db_table, tables)
+        self.assertNotIn("auth_user", tables)
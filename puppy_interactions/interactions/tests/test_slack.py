@@ -0,0 +1,137 @@
+import os
+import shutil
+import tempfile
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from puppy_interactions.interactions.caches import DisplayNameCache, display_names
+from puppy_interactions.interactions.exceptions import SlackAPIError
+from puppy_interactions.interactions.models import Person
+from puppy_interactions.interactions.sharding import (
+    close_shards, ensure_shard, shard_alias, use_database
+)
+from puppy_interactions.interactions.slack import SlackClient, sync_display_names
+from puppy_interactions.interactions.tests.slack_stub import SlackStubServer
+from puppy_interactions.interactions.utils import create_interactions, retrieve_logs
+
+
+def make_member(num: int) -> dict:
+    return {"id": f"U{num:06d}", "name": f"handle{num}",
+            "profile": {"display_name": f"Name {num}", "real_name": f"Real {num}"}}
+
+
+class SyncDisplayNamesTests(TestCase):
+    def setUp(self):
+        display_names.clear()
+        self.members = [make_member(num) for num in range(25)]
+        Person.objects.bulk_create(
+            [Person(user_id=f"@{m['id']}") for m in self.members[:20]]
+        )
+
+    def tearDown(self):
+        display_names.clear()
+
+    def test_pages_through_users(self):
+        """test that every page of `users.list` is requested"""
+        with SlackStubServer(self.members) as stub:
+            client = SlackClient(token="xoxb-test", base_url=stub.url)
+            self.assertEqual(len(list(client.iter_users(page_size=10))), 25)
+        self.assertEqual([method for method, _ in stub.calls], ["users.list"] * 3)
+
+    def test_fills_display_names_in_one_update(self):
+        """test that existing Persons get names with a single UPDATE statement"""
+        with SlackStubServer(self.members) as stub:
+            client = SlackClient(token="xoxb-test", base_url=stub.url)
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(sync_display_names(client), 20)
+        updates = [q for q in ctx.captured_queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Person.objects.get(user_id="@U000003").display_name,
+                         "Name 3")
+        self.assertFalse(Person.objects.filter(user_id="@U000024").exists())
+
+    def test_many_names_stay_under_parameter_limit(self):
+        """test that no statement binds more parameters than SQLite allows"""
+        members = [make_member(num) for num in range(400)]
+        Person.objects.bulk_create(
+            [Person(user_id=f"@{m['id']}") for m in members[20:]]
+        )
+        params = []
+
+        def count_params(execute, sql, values, many, context):
+            params.append(len(values or ()))
+            return execute(sql, values, many, context)
+
+        with SlackStubServer(members) as stub:
+            client = SlackClient(token="xoxb-test", base_url=stub.url)
+            with connection.execute_wrapper(count_params):
+                self.assertEqual(sync_display_names(client), 400)
+        self.assertLessEqual(max(params), connection.features.max_query_params)
+        self.assertEqual(Person.objects.get(user_id="@U000399").display_name,
+                         "Name 399")
+
+    def test_unchanged_names_not_rewritten(self):
+        """test that a second sync has nothing to update"""
+        with SlackStubServer(self.members) as stub:
+            client = SlackClient(token="xoxb-test", base_url=stub.url)
+            sync_display_names(client)
+            self.assertEqual(sync_display_names(client), 0)
+
+    def test_primes_cache_for_rendering(self):
+        """test that logs render cached names for Persons the database hasn't caught
+        up on, without calling Slack"""
+        create_interactions("@R000001", ("@U000024", "+"))
+        with SlackStubServer(self.members) as stub:
+            sync_display_names(SlackClient(token="xoxb-test", base_url=stub.url))
+        calls = len(stub.calls)
+        rater = Person.objects.get(user_id="@R000001")
+        self.assertEqual(retrieve_logs(rater)[0].ratee, "Name 24")
+        self.assertEqual(len(stub.calls), calls)
+
+    def test_api_error(self):
+        """test that `ok: false` raises"""
+        with SlackStubServer() as stub:
+            client = SlackClient(token="xoxb-test", base_url=stub.url)
+            self.assertRaises(SlackAPIError, client.call, "nope.nope")
+
+
+class SyncShardsTests(TransactionTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        settings = override_settings(
+            INTERACTIONS_SHARD_NAME=os.path.join(self.directory, "{shard}.db"))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        display_names.clear()
+
+    def tearDown(self):
+        close_shards()
+        shutil.rmtree(self.directory)
+
+    def test_every_shard(self):
+        """test that names are stored in the default database and each shard"""
+        Person.objects.create(user_id="@U000001")
+        alias = ensure_shard(shard_alias("T1"))
+        with use_database(alias):
+            Person.objects.create(user_id="@U000002")
+        with SlackStubServer([make_member(1), make_member(2)]) as stub:
+            client = SlackClient(token="xoxb-test", base_url=stub.url)
+            self.assertEqual(sync_display_names(client), 2)
+        with use_database(alias):
+            self.assertEqual(Person.objects.get().display_name, "Name 2")
+
+
+class DisplayNameCacheTests(TestCase):
+    def test_entries_expire(self):
+        """test that names are not served past their ttl"""
+        cache = DisplayNameCache(ttl=-1)
+        cache.update({"@U1": "Don"})
+        self.assertEqual(cache.get("@U1", "@U1"), "@U1")
+
+    def test_get(self):
+        cache = DisplayNameCache(ttl=60)
+        cache.update({"@U1": "Don", "@U2": ""})
+        self.assertEqual(cache.get("@U1"), "Don")
+        self.assertIsNone(cache.get("@U2"))
@@ -0,0 +1,125 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection, connections, transaction, OperationalError
+from django.test import SimpleTestCase, TransactionTestCase
+
+from puppy_interactions.interactions import metrics
+from puppy_interactions.interactions.benchmarks import (
+    BENCHMARK_ALIAS, temporary_database, lock_stress
+)
+from puppy_interactions.interactions.sqlite import apply_pragmas, write_transaction
+
+PRAGMAS = {"busy_timeout": 1234, "synchronous": "NORMAL", "journal_mode": "WAL",
+           "cache_size": -2048, "mmap_size": 1024 * 1024}
+
+
+class SqlitePragmaTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "pragmas.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertPragmas(self, cursor):
+        values = {}
+        for name in PRAGMAS:
+            cursor.execute(f"PRAGMA {name}")
+            values[name] = cursor.fetchone()[0]
+        self.assertEqual(values, {"busy_timeout": 1234, "synchronous": 1,
+                                  "journal_mode": "wal", "cache_size": -2048,
+                                  "mmap_size": 1024 * 1024})
+
+    def test_apply_pragmas(self):
+        connection = sqlite3.connect(self.path)
+        apply_pragmas(connection.cursor(), PRAGMAS)
+        self.assertPragmas(connection.cursor())
+        connection.close()
+
+    def test_busy_timeout_within_deadline(self):
+        """test that one statement waiting on the lock leaves `write_transaction`
+        room to retry before its deadline"""
+        busy_timeout = settings.INTERACTIONS_SQLITE_PRAGMAS["busy_timeout"]
+        self.assertLess(busy_timeout, settings.INTERACTIONS_WRITE_DEADLINE * 1000 / 2)
+
+    def test_rejects_bad_names(self):
+        connection = sqlite3.connect(self.path)
+        self.assertRaises(ValueError, apply_pragmas, connection.cursor(),
+                          {"cache_size; DROP TABLE x": 1})
+        connection.close()
+
+    def test_applied_to_new_connections(self):
+        """test that Django connections get the `PRAGMAS` of their database"""
+        connections.databases["pragmas"] = {
+            "ENGINE": "django.db.backends.sqlite3", "NAME": self.path,
+            "PRAGMAS": PRAGMAS,
+        }
+        try:
+            with connections["pragmas"].cursor() as cursor:
+                self.assertPragmas(cursor)
+        finally:
+            connections["pragmas"].close()
+            del connections.databases["pragmas"]
+            delattr(connections._connections, "pragmas")
+
+
+class WriteTransactionTests(TransactionTestCase):
+    def setUp(self):
+        metrics.reset()
+        patcher = mock.patch("puppy_interactions.interactions.sqlite.time.sleep")
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def flaky(self, failures, error="database is locked"):
+        calls = []
+
+        def func(value):
+            calls.append(connection.in_atomic_block)
+            if len(calls) <= failures:
+                raise OperationalError(error)
+            return value
+        return func, calls
+
+    def test_retries_while_locked(self):
+        func, calls = self.flaky(3)
+        self.assertEqual(write_transaction(func, "done", deadline=10), "done")
+        self.assertEqual(calls, [True] * 4)
+        self.assertEqual(self.sleep.call_count, 3)
+        self.assertEqual(metrics.snapshot("sqlite.lock_"),
+                         {"sqlite.lock_wait": 3, "sqlite.lock_recovered": 1,
+                          "sqlite.lock_wait_ms": mock.ANY})
+
+    def test_other_errors_raised(self):
+        func, calls = self.flaky(1, error="no such table: nope")
+        self.assertRaises(OperationalError, write_transaction, func, "done")
+        self.assertEqual(len(calls), 1)
+        self.sleep.assert_not_called()
+
+    def test_gives_up_at_deadline(self):
+        func, calls = self.flaky(1000)
+        self.assertRaises(OperationalError, write_transaction, func, "done",
+                          deadline=0)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(metrics.snapshot("sqlite.lock_gave_up"),
+                         {"sqlite.lock_gave_up": 1})
+
+    def test_no_retry_inside_a_transaction(self):
+        """test that an enclosing transaction is left to retry the whole thing"""
+        func, calls = self.flaky(1)
+        with transaction.atomic():
+            self.assertRaises(OperationalError, write_transaction, func, "done")
+        self.assertEqual(len(calls), 1)
+
+    def test_no_dropped_writes_under_contention(self):
+        """test that writers in separate processes all get their writes applied"""
+        with temporary_database() as path:
+            result = lock_stress.stress(path, BENCHMARK_ALIAS, workers=4,
+                                        seconds=1, deadline=10)
+        self.assertGreater(result["applied"], 0)
+        self.assertEqual(result["dropped"], 0)
+        self.assertEqual(result["lost"], 0)
@@ -3,17 +3,24 @@ from datetime import timedelta
 from random import choice, randint
 from unittest import mock
 
+from django.core.cache import caches
 from django.test import TestCase
 from django.utils import timezone
 
+from puppy_interactions.interactions import metrics
 from puppy_interactions.interactions.exceptions import (
     UnrecognizedCommandException, CheaterException
 )
+from puppy_interactions.interactions.identity import apply_aliases
 from puppy_interactions.interactions.models import Interaction, Person
+from puppy_interactions.interactions.renderers import render_log_attachments
 from puppy_interactions.interactions.utils import (
-    DEFAULT_LOG_DAYS, parse_webhook_text, create_interactions,
+    DEFAULT_LOG_DAYS, LogRecord, parse_webhook_text, create_interactions,
     text_to_interaction_tuples, parse_log_request_text, retrieve_logs,
-    retrieve_aggregated_logs, clear_logs
+    retrieve_aggregated_logs, clear_logs, do_logs, DEFAULT_TOP_PEOPLE, MAX_TOP_PEOPLE,
+    parse_top_request_text, retrieve_top_people, parse_conversations_request_text,
+    retrieve_conversations, undo_last_conversation, do_create,
+    create_interactions_batch
 )
 
 
@@ -89,11 +96,21 @@ class CommandTextParseTests(TestCase):
         text = "help"
         self.assertEqual(parse_webhook_text(text), "help")
 
+    def test_parse_top(self):
+        """test parsing the top command"""
+        for text in ["top", "top 5", "top 5 90", "top 5 90 -", "TOP 5 +", "top 3-"]:
+            self.assertEqual(parse_webhook_text(text), "top")
+
+    def test_parse_rating_top(self):
+        """test that rating someone named "top" is a create, not the top command"""
+        for text in ["top +", "TOP -", "top+"]:
+            self.assertEqual(parse_webhook_text(text), "create")
+
     def test_various_nonconforming_strings(self):
         """test some strings that should not conform to any action"""
         texts = [
             ";sadlfkjs;ldfj", "+ @U23984", "Joseph Curtin person", "help clear",
-            "clear help"
+            "clear help", "top 1 2 3", "top person"
         ]
         for text in texts:
             self.assertRaises(UnrecognizedCommandException, parse_webhook_text, text)
@@ -169,6 +186,18 @@ class CreateInteractionsTests(TestCase):
         self.assertRaises(CheaterException, create_interactions, self.rater_user_id,
                           (self.rater_user_id, "+"))
 
+    def test_cant_rate_self_by_another_name(self):
+        """test that a ratee resolving to the rater's own Person is refused"""
+        create_interactions("@U1", ("@U2", "+"))
+        apply_aliases({"Myself": "@U1"})
+        for text in ["<@u1> +", "myself +", "<@U2> + Myself -"]:
+            self.assertRaises(CheaterException, do_create, "@U1", text)
+        results = create_interactions_batch([("@U1", [("Myself", "+")]),
+                                             ("@U2", [("Myself", "+")])])
+        self.assertIsInstance(results[0], CheaterException)
+        self.assertEqual(len(results[1]), 1)
+        self.assertEqual(Interaction.objects.filter(ratee__user_id="@U1").count(), 1)
+
 
 class ParseLogRequestTextTests(TestCase):
     def test_no_addl_text(self):
@@ -221,6 +250,19 @@ class ParseLogRequestTextTests(TestCase):
                              (text["days"], text["aggregate"], text["filter"]))
 
 
+class ParseTopRequestTextTests(TestCase):
+    def test_defaults(self):
+        self.assertEqual(parse_top_request_text("top"),
+                         (DEFAULT_TOP_PEOPLE, DEFAULT_LOG_DAYS, Interaction.POSITIVE))
+
+    def test_all_three(self):
+        self.assertEqual(parse_top_request_text("top 3 90 -"),
+                         (3, 90, Interaction.NEGATIVE))
+
+    def test_count_capped(self):
+        self.assertEqual(parse_top_request_text("top 5000")[0], MAX_TOP_PEOPLE)
+
+
 class RetrieveBaseTests(TestCase):
 
     @classmethod
@@ -254,10 +296,10 @@ class RetrieveBaseTests(TestCase):
 
 class RetrieveLogsTests(RetrieveBaseTests):
     def test_returns_list(self):
-        """test that the util returns a list of Interactions"""
+        """test that the util returns a list of LogRecords"""
         self.assertIsInstance(self.rater_logs, list)
         for item in self.rater_logs:
-            self.assertIsInstance(item, Interaction)
+            self.assertIsInstance(item, LogRecord)
 
     def test_offset(self):
         """test that offset does just that"""
@@ -273,8 +315,18 @@ class RetrieveLogsTests(RetrieveBaseTests):
 
     def test_rater_in_all_interactions(self):
         """test we are only returning Interactions created by rater"""
-        for item in self.rater_logs:
-            self.assertEqual(item.rater, self.rater)
+        expected = [LogRecord(str(i.ratee), i.rating, i.created)
+                    for i in Interaction.objects.filter(rater=self.rater)
+                    .select_related("ratee").order_by("-created")]
+        self.assertEqual(retrieve_logs(self.rater, days=365), expected)
+
+    def test_fixed_query_count(self):
+        """test that retrieving and rendering logs costs the same queries for any
+        page size"""
+        for limit in [1, 5, 50, None]:
+            with self.assertNumQueries(2):
+                logs = do_logs(self.rater.user_id, "90", limit=limit)
+                render_log_attachments(logs)
 
     def test_various_day_values(self):
         """test day values return proper amount of results"""
@@ -314,6 +366,12 @@ class RetrieveAggregatedLogsTests(RetrieveBaseTests):
             self.assertIsInstance(key, Person)
             self.assertIsInstance(value, dict)
 
+    def test_aggregate_by_person_fixed_query_count(self):
+        """test that the ratees are loaded with their Interactions"""
+        with self.assertNumQueries(1):
+            logs = retrieve_aggregated_logs(self.rater, aggregate="person")
+            [str(key) for key in logs]
+
     def test_aggregate_by_time(self):
         """test that time aggregation returns proper aggregations"""
         logs = retrieve_aggregated_logs(self.rater, aggregate="time")
@@ -323,6 +381,73 @@ class RetrieveAggregatedLogsTests(RetrieveBaseTests):
             self.assertIsInstance(value, dict)
 
 
+class RetrieveTopPeopleTests(TestCase):
+    def setUp(self):
+        self.rater = Person.objects.create(user_id="@R1")
+        ratings = {"@U1": "+++-", "@U2": "++", "@U3": "+----", "@U4": "++",
+                   "@U5": "-"}
+        for user_id, marks in ratings.items():
+            create_interactions(self.rater.user_id,
+                                *[(user_id, mark) for mark in marks])
+        create_interactions("@R2", ("@U5", "+"), ("@U5", "+"), ("@U5", "+"))
+        Person.objects.filter(user_id="@U4").update(display_name="Ann")
+
+    def test_most_positive(self):
+        """test the people with the most positives first, ties by name"""
+        self.assertEqual(retrieve_top_people(self.rater, count=3), {
+            "@U1": {"positive": 3, "negative": 1},
+            "@U2": {"positive": 2, "negative": 0},
+            "Ann": {"positive": 2, "negative": 0},
+        })
+
+    def test_most_negative(self):
+        """test that people without any of the rating are left out"""
+        top = retrieve_top_people(self.rater, count=10, rating=Interaction.NEGATIVE)
+        self.assertEqual(list(top), ["@U3", "@U1", "@U5"])
+
+    def test_one_query(self):
+        with self.assertNumQueries(1):
+            retrieve_top_people(self.rater, count=2)
+
+
+class ConversationTests(TestCase):
+    def setUp(self):
+        create_interactions("@R1", ("@U1", "+"), ("Random Guy", "-"))
+        create_interactions("@R1", ("@U2", "+"))
+        create_interactions("@R2", ("@U1", "-"))
+        Person.objects.filter(user_id="@U2").update(display_name="Ann")
+        self.rater = Person.objects.get(user_id="@R1")
+
+    def test_parse(self):
+        self.assertEqual(parse_webhook_text("conversations"), "conversations")
+        self.assertEqual(parse_webhook_text("Conversations 7"), "conversations")
+        self.assertEqual(parse_webhook_text("undo"), "undo")
+        self.assertEqual(parse_conversations_request_text("conversations"),
+                         DEFAULT_LOG_DAYS)
+        self.assertEqual(parse_conversations_request_text("conversations 7"), 7)
+
+    def test_grouped(self):
+        """test a conversation per command, newest first, with its participants"""
+        conversations = retrieve_conversations(self.rater)
+        self.assertEqual([c.participants for c in conversations],
+                         [[("Ann", "+")], [("@U1", "+"), ("Random Guy", "-")]])
+        self.assertGreater(conversations[0].started, conversations[1].started)
+
+    def test_one_query(self):
+        with self.assertNumQueries(1):
+            retrieve_conversations(self.rater)
+
+    def test_undo(self):
+        """test that only the rater's latest conversation is deleted"""
+        self.assertEqual(undo_last_conversation("@R1"), [("Ann", "+")])
+        self.assertEqual(Interaction.objects.filter(rater=self.rater).count(), 2)
+        self.assertEqual(Interaction.objects.count(), 3)
+        self.assertEqual(len(undo_last_conversation("@R1")), 2)
+        self.assertEqual(undo_last_conversation("@R1"), [])
+        self.assertEqual(undo_last_conversation("@R9"), [])
+        self.assertEqual(Interaction.objects.count(), 1)
+
+
 class ClearLogTests(TestCase):
     def setUp(self):
         self.rater_id = f"@R{randint(100000, 999999)}"
@@ -357,3 +482,56 @@ class ClearLogTests(TestCase):
         self.assertEqual(
             Interaction.objects.filter(ratee__user_id=self.rater_id).count(), 20
         )
+
+
+class DoLogsCacheTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.rater_id = f"@R{randint(100000, 999999)}"
+        create_interactions(self.rater_id, ("@U1", Interaction.POSITIVE))
+
+    def test_repeat_served_from_cache(self):
+        """test that a repeated command skips the logs query"""
+        logs = do_logs(self.rater_id, "90")
+        with self.assertNumQueries(1):
+            self.assertEqual(do_logs(self.rater_id, "90"), logs)
+        self.assertEqual(metrics.snapshot("response_cache."),
+                         {"response_cache.miss": 1, "response_cache.hit.responses": 1})
+
+    def test_keyed_on_request(self):
+        """test that different days, aggregates and filters are cached apart"""
+        for text in ["90", "30", "90 person", "90 person +", "90 -"]:
+            do_logs(self.rater_id, text)
+        self.assertEqual(metrics.snapshot("response_cache."),
+                         {"response_cache.miss": 5})
+
+    def test_keyed_on_day(self):
+        """test that "last N days" results aren't served past midnight"""
+        self.assertEqual(len(do_logs(self.rater_id, "1")), 1)
+        with mock.patch("django.utils.timezone.now",
+                        return_value=timezone.now() + timedelta(days=2)):
+            self.assertEqual(do_logs(self.rater_id, "1"), [])
+        self.assertEqual(metrics.snapshot("response_cache."),
+                         {"response_cache.miss": 2})
+
+    def test_create_invalidates(self):
+        """test that new interactions are seen right away"""
+        self.assertEqual(len(do_logs(self.rater_id, "")), 1)
+        create_interactions(self.rater_id, ("@U2", Interaction.NEGATIVE))
+        self.assertEqual(len(do_logs(self.rater_id, "")), 2)
+
+    def test_clear_invalidates(self):
+        do_logs(self.rater_id, "person")
+        clear_logs(self.rater_id)
+        self.assertEqual(do_logs(self.rater_id, "person"), {})
+
+    def test_file_tier(self):
+        """test that the file tier answers when the in-process tier is gone, as in a
+        fresh process on a warm container"""
+        logs = do_logs(self.rater_id, "")
+        caches["responses"].clear()
+        self.assertEqual(do_logs(self.rater_id, ""), logs)
+        self.assertEqual(do_logs(self.rater_id, ""), logs)
+        self.assertEqual(metrics.snapshot("response_cache.hit"),
+                         {"response_cache.hit.responses_file": 1,
+                          "response_cache.hit.responses": 1})
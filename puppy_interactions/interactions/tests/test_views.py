@@ -1,13 +1,19 @@
+import json
 import uuid
 from datetime import timedelta
 from random import choice, randint
 from unittest import mock
 from puppy_interactions.interactions.help_message import HELP_MESSAGE
 
-from django.test import TestCase, Client
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse_lazy
 from django.utils import timezone
 
+from puppy_interactions.interactions import metrics
+from puppy_interactions.interactions.caches import display_names
 from puppy_interactions.interactions.models import Interaction, Person
 
 """
@@ -118,6 +124,61 @@ class InteractionViewTests(TestCase):
             Interaction.objects.filter(rater__user_id=f"<@{self.user_id}>").count(), 0
         )
 
+    def test_undo(self):
+        """test that undo removes the last command's interactions, and says which"""
+        count = Interaction.objects.count()
+        self.client.post(path=reverse_lazy("interactions"),
+                         data=self.make_payload("<@U23787> - Trisha +"))
+        response = self.client.post(path=reverse_lazy("interactions"),
+                                    data=dict(self.make_payload("undo"),
+                                              trigger_id="undo"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Trisha +", response.json()["text"])
+        self.assertEqual(Interaction.objects.count(), count)
+
+    def test_conversations(self):
+        """test returns 200 and an attachment per conversation"""
+        self.client.post(path=reverse_lazy("interactions"),
+                         data=self.make_payload("<@U23787> - Trisha +"))
+        response = self.client.post(path=reverse_lazy("interactions"),
+                                    data=dict(self.make_payload("conversations 7"),
+                                              trigger_id="conversations"))
+        self.assertEqual(response.status_code, 200)
+        attachments = response.json()["attachments"]
+        self.assertEqual(len(attachments), 1)
+        self.assertIn("*Trisha* :slightly_smiling_face:", attachments[0]["text"])
+
+    def test_top(self):
+        """test returns 200 and an attachment per person"""
+        response = self.client.post(
+            path=reverse_lazy("interactions"),
+            data=self.make_payload("top 3 90 -")
+        )
+        self.assertEqual(response.status_code, 200)
+        json_data = response.json()
+        self.assertLessEqual(len(json_data.get("attachments", [])), 3)
+
+    def test_trend(self):
+        """test returns 200 and a score per person"""
+        self.client.post(path=reverse_lazy("interactions"),
+                         data=self.make_payload("<@U23787> + Trisha -"))
+        response = self.client.post(
+            path=reverse_lazy("interactions"),
+            data=self.make_payload("trend")
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["attachments"],
+                         [{"text": "*@U23787*:: +1.0"}, {"text": "*Trisha*:: -1.0"}])
+
+    def test_find(self):
+        self.client.post(path=reverse_lazy("interactions"),
+                         data=self.make_payload("Joseph Curtin + Josephine -"))
+        response = self.client.post(path=reverse_lazy("interactions"),
+                                    data=self.make_payload("find joseph"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["attachments"][0],
+                         {"text": "*Joseph Curtin*:: 1 interactions"})
+
     def test_help(self):
         response = self.client.post(
             path=reverse_lazy("interactions"),
@@ -125,3 +186,112 @@ class InteractionViewTests(TestCase):
         )
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), HELP_MESSAGE)
+
+
+@override_settings(INTERACTIONS_BATCH_TOKEN="s3cret")
+class BatchInteractionViewTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.path = reverse_lazy("interactions-batch")
+
+    def post(self, payloads, token="s3cret"):
+        return self.client.post(self.path, data=json.dumps(payloads),
+                                content_type="application/json",
+                                HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def make_payloads(self, count, user_id="U2147483697"):
+        return [{"user_id": user_id, "text": f"<@U{num}> + Random Guy -",
+                 "trigger_id": f"1.2.{num}"} for num in range(count)]
+
+    def test_forbidden(self):
+        """test that a wrong or missing token is refused"""
+        self.assertEqual(self.post([], token="nope").status_code, 403)
+        self.assertEqual(self.client.post(self.path, data="[]",
+                                          content_type="application/json").status_code,
+                         403)
+        with override_settings(INTERACTIONS_BATCH_TOKEN=""):
+            self.assertEqual(self.post([], token="").status_code, 403)
+
+    def test_bad_body(self):
+        self.assertEqual(self.post({"text": "help"}).status_code, 400)
+
+    def test_bad_payload_fields(self):
+        """test that a payload with a field of the wrong type is a 400 naming it,
+        not a 500 for the whole batch"""
+        payloads = self.make_payloads(2)
+        payloads[1]["text"] = 5
+        response = self.post(payloads)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("payload 1: text", response.json()["error"])
+        self.assertEqual(Interaction.objects.count(), 0)
+
+    def test_results_in_order(self):
+        """test a result per payload, in the order given"""
+        payloads = [{"user_id": "U1", "text": "help"},
+                    {"user_id": "U1", "text": "<@U2> +"},
+                    {"user_id": "U1", "text": "<@U1> +"},
+                    {"user_id": "U1", "text": ";sadlfkjs;ldfj"},
+                    {"user_id": "U1", "text": ""}]
+        results = self.post(payloads).json()["results"]
+        self.assertEqual(results[0]["response"], HELP_MESSAGE)
+        self.assertEqual(results[1]["response"]["text"],
+                         "We logged 1 interactions for you. Thanks!")
+        self.assertFalse(results[2]["ok"])
+        self.assertIn("We don't know that one!", results[3]["response"]["text"])
+        # the logs see the create before them
+        self.assertEqual(len(results[4]["response"]["attachments"]), 2)
+
+    def test_creates_in_constant_queries(self):
+        """test that the queries for a batch of creates don't grow with its size
+        (short of SQLite's per-statement parameter limit)"""
+        with CaptureQueriesContext(connection) as small:
+            self.post(self.make_payloads(5))
+        with CaptureQueriesContext(connection) as large:
+            self.post(self.make_payloads(60, user_id="R2"))
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(
+            Interaction.objects.filter(rater__user_id="@R2").count(), 120
+        )
+
+    def test_retries_applied_once(self):
+        """test that payloads repeated in or across batches are applied once"""
+        payloads = self.make_payloads(3)
+        first = self.post(payloads + payloads).json()["results"]
+        second = self.post(payloads).json()["results"]
+        self.assertEqual(first[:3], first[3:])
+        self.assertEqual(first[:3], second)
+        self.assertEqual(
+            Interaction.objects.filter(rater__user_id="@U2147483697").count(), 6
+        )
+
+
+class WarmUpViewTests(TestCase):
+    def setUp(self):
+        caches["responses"].clear()
+        display_names.clear()
+        metrics.reset()
+        rater = Person.objects.create(user_id="@R1")
+        ratee = Person.objects.create(user_id="@U1", display_name="Trisha")
+        Interaction.objects.create(conversation=uuid.uuid4(), rater=rater,
+                                   ratee=ratee, rating=Interaction.POSITIVE)
+
+    def tearDown(self):
+        display_names.clear()
+
+    def test_reports_steps(self):
+        response = self.client.get(reverse_lazy("interactions-warmup"))
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertTrue(report["complete"])
+        self.assertEqual([step["name"] for step in report["steps"]],
+                         ["database", "connect", "queries", "parsing",
+                          "display_names", "responses"])
+        self.assertEqual(display_names.get("@U1"), "Trisha")
+
+    def test_primes_response_cache(self):
+        """test that the first logs after a warm-up are served from the cache"""
+        self.client.get(reverse_lazy("interactions-warmup"))
+        response = self.client.post(path=reverse_lazy("interactions"),
+                                    data={"user_id": "R1", "text": ""})
+        self.assertEqual(len(response.json()["attachments"]), 2)
+        self.assertEqual(metrics.snapshot()["response_cache.hit.responses"], 1)
@@ -1,20 +1,63 @@
+import heapq
 import uuid
 from collections import defaultdict
-from datetime import timedelta
-from typing import List, Tuple, Optional, Pattern, Union
+from datetime import datetime, timedelta
+from typing import (
+    Dict, Iterable, List, NamedTuple, Sequence, Tuple, Optional, Pattern, Union
+)
 
+from django.db.models import (
+    Aggregate, Case, CharField, Count, F, Max, Min, Q, QuerySet, Subquery, Value,
+    When
+)
+from django.db.models.functions import Concat
 from django.utils import timezone
 
+from puppy_interactions.interactions.bulk import LOOKUP_BATCH_SIZE
+from puppy_interactions.interactions.caches import display_names, response_cache
 from puppy_interactions.interactions.exceptions import (
     UnrecognizedCommandException, CheaterException
 )
-from puppy_interactions.interactions.models import Person, Interaction
+from puppy_interactions.interactions.identity import (
+    get_or_create_person, find_person, lookup_people, normalize_user_id
+)
+from puppy_interactions.interactions.models import Person, Interaction, PairScore
 from puppy_interactions.interactions.regex import (
     create_pattern, logs_pattern, clear_pattern, interaction_pattern, days_pattern,
-    aggregate_pattern, filter_pattern, help_pattern
+    aggregate_pattern, filter_pattern, help_pattern, top_pattern, trend_pattern,
+    find_pattern, undo_pattern, conversations_pattern, mutual_pattern,
+    token_pattern
 )
+from puppy_interactions.interactions.scores import forget_ratings, record_ratings
+from puppy_interactions.interactions.search import index_people
+from puppy_interactions.interactions.sqlite import write_transaction
 
 DEFAULT_LOG_DAYS = 30
+DEFAULT_TOP_PEOPLE = 5
+MAX_TOP_PEOPLE = 50
+CONVERSATIONS_SHOWN = 10
+# between participants in `GroupConcat`, since names can hold commas
+PARTICIPANT_SEPARATOR = "\x1f"
+
+
+class LogRecord(NamedTuple):
+    """a lightweight, read-only row of the interaction log, ready for rendering"""
+    ratee: str
+    rating: str
+    created: datetime
+
+
+class Conversation(NamedTuple):
+    """the interactions logged by one command, as `(ratee, rating)` participants"""
+    started: datetime
+    participants: List[Tuple[str, str]]
+
+
+class GroupConcat(Aggregate):
+    """SQLite's `group_concat(expression, separator)`"""
+    function = "GROUP_CONCAT"
+    output_field = CharField()
+
 
 """
 Sample data from [Slack API docs](https://api.slack.com/slash-commands) 2019-01-27:
@@ -55,11 +98,27 @@ def parse_webhook_text(text: str) -> str:
     * logs
     * clear
     * help
+    * top
+    * trend
+    * find
+    * undo
+    * conversations
+    * mutual
+    * token
     """
-    pattern_list = [create_pattern, logs_pattern, clear_pattern, help_pattern]
+    pattern_list = [create_pattern, logs_pattern, clear_pattern, help_pattern,
+                    trend_pattern, undo_pattern, conversations_pattern, mutual_pattern,
+                    token_pattern]
 
     text = text.strip()
-    if exclusive_match(clear_pattern, pattern_list, text):
+    # `top` and `find` take their own arguments, but `top +` rates someone named
+    # "top" and `find Random +` someone named "find Random"
+    rates = create_pattern.match(text)
+    if top_pattern.match(text) and not rates:
+        return "top"
+    elif find_pattern.match(text) and not rates:
+        return "find"
+    elif exclusive_match(clear_pattern, pattern_list, text):
         return "clear"
     elif exclusive_match(create_pattern, pattern_list, text):
         return "create"
@@ -67,6 +126,16 @@ def parse_webhook_text(text: str) -> str:
         return "logs"
     elif exclusive_match(help_pattern, pattern_list, text):
         return "help"
+    elif exclusive_match(trend_pattern, pattern_list, text):
+        return "trend"
+    elif exclusive_match(undo_pattern, pattern_list, text):
+        return "undo"
+    elif exclusive_match(conversations_pattern, pattern_list, text):
+        return "conversations"
+    elif exclusive_match(mutual_pattern, pattern_list, text):
+        return "mutual"
+    elif exclusive_match(token_pattern, pattern_list, text):
+        return "token"
     else:
         raise UnrecognizedCommandException(text)
 
@@ -81,26 +150,103 @@ def text_to_interaction_tuples(text: str) -> List[Tuple[str, str]]:
     return interactions
 
 
+def validate_interaction_tuples(rater_user_id: str,
+                                tuples: Sequence[Tuple[str, str]]) -> None:
+    """raise if any `(ratee, rating)` tuple can't be logged by the rater. whether the
+    ratee is the rater is checked once both are resolved to Persons, since different
+    spellings or aliases can name the same one (see `create_interactions_batch`)"""
+    for ratee_user_id, rating in tuples:
+        if rating not in [Interaction.POSITIVE, Interaction.NEGATIVE]:
+            raise TypeError(f"Invalid arg for rating - use '{Interaction.POSITIVE}' or "
+                            f"'{Interaction.NEGATIVE}'.")
+
+
+def resolve_persons(user_ids: Iterable[str]) -> Dict[str, Person]:
+    """fetch Persons by `user_id` (see `identity.lookup_people`), creating any that
+    don't exist yet - a query per `LOOKUP_BATCH_SIZE` ids plus a single bulk insert,
+    however many there are. spellings of one new name share one new Person"""
+    wanted = list(dict.fromkeys(user_ids))
+    persons = lookup_people(wanted)
+    missing = {}  # type: Dict[str, Person]
+    for user_id in wanted:
+        if user_id not in persons:
+            key = normalize_user_id(user_id)
+            if key not in missing:
+                missing[key] = Person(user_id=user_id, normalized_id=key)
+            persons[user_id] = missing[key]
+    if missing:
+        Person.objects.bulk_create(missing.values())
+        index_people(missing.values())
+    return persons
+
+
 def create_interactions(rater_user_id: str,
                         *args: Tuple[str, str]) -> List[Interaction]:
     """create Interactions from one or many tuple(s) containing the ratee and rating,
     like: `("Somebody Galguy", "+")` """
-    rater, _ = Person.objects.get_or_create(user_id=rater_user_id)
-    conversation = uuid.uuid4()
-    interactions = []
-    for interaction in args:
-        ratee, _ = Person.objects.get_or_create(user_id=interaction[0])
-        rating = interaction[1]
+    return create_interactions_batch([(rater_user_id, args)], raise_errors=True)[0]
 
-        if ratee == rater:
-            raise CheaterException("You can't rate yourself.")
 
-        if rating not in [Interaction.POSITIVE, Interaction.NEGATIVE]:
-            raise TypeError(f"Invalid arg for rating - use '{Interaction.POSITIVE}' or "
-                            f"'{Interaction.NEGATIVE}'.")
-        interactions.append(Interaction(rater=rater, ratee=ratee, rating=rating,
-                                        conversation=conversation))
-    return Interaction.objects.bulk_create(interactions)
+def create_interactions_batch(items: Sequence[Tuple[str, Sequence[Tuple[str, str]]]],
+                              raise_errors: bool = False
+                              ) -> List[Union[List[Interaction], Exception]]:
+    """create Interactions for many `(rater_user_id, [(ratee, rating), ...])` items
+    at once: every Person is resolved in one pass and every Interaction is written
+    with one `bulk_create`. each item gets its own conversation.
+
+    returns a result per item, in order: its Interactions, or the exception that
+    rejected it (or raise that exception, with `raise_errors`)"""
+    results = []  # type: List[Union[List[Interaction], Exception]]
+    accepted = []
+    for rater_user_id, tuples in items:
+        try:
+            validate_interaction_tuples(rater_user_id, tuples)
+        except (CheaterException, TypeError) as e:
+            if raise_errors:
+                raise
+            results.append(e)
+            continue
+        results.append([])
+        accepted.append((len(results) - 1, rater_user_id, tuples))
+
+    def write():
+        persons = resolve_persons(
+            user_id for _, rater_user_id, tuples in accepted
+            for user_id in [rater_user_id] + [ratee for ratee, _ in tuples]
+        )
+        interactions = []
+        raters = []
+        for index, rater_user_id, tuples in accepted:
+            rater = persons[rater_user_id]
+            if any(persons[ratee].pk == rater.pk for ratee, _ in tuples):
+                error = CheaterException("You can't rate yourself.")
+                if raise_errors:
+                    raise error
+                results[index] = error
+                continue
+            conversation = uuid.uuid4()
+            results[index] = [Interaction(rater=rater, ratee=persons[ratee_user_id],
+                                          rating=rating, conversation=conversation)
+                              for ratee_user_id, rating in tuples]
+            interactions.extend(results[index])
+            raters.append(rater)
+
+        Interaction.objects.bulk_create(interactions)
+        record_ratings(interactions)
+        bump_data_version(*raters)
+
+    write_transaction(write)
+    return results
+
+
+def bump_data_version(*persons: Person) -> None:
+    """mark the Persons' interactions as changed, so cached responses for them are no
+    longer used"""
+    pks = list({p.pk for p in persons})
+    for start in range(0, len(pks), LOOKUP_BATCH_SIZE):
+        Person.objects.filter(pk__in=pks[start:start + LOOKUP_BATCH_SIZE]).update(
+            data_version=F("data_version") + 1
+        )
 
 
 def parse_log_request_text(text: str) -> Tuple[int, Optional[str], Optional[str]]:
@@ -125,22 +271,57 @@ def parse_log_request_text(text: str) -> Tuple[int, Optional[str], Optional[str]
     )
 
 
-def retrieve_logs(rater: Person, days: int = DEFAULT_LOG_DAYS,
-                  filter: Optional[str] = None,
-                  offset: int = None, limit: int = None) -> List[Interaction]:
-    """retrieve the log of Interactions and return as a list"""
+def parse_conversations_request_text(text: str) -> int:
+    """the days of `conversations [days]`"""
+    numbers = days_pattern.findall(text)
+    return int(numbers[0]) if numbers else DEFAULT_LOG_DAYS
+
+
+def parse_top_request_text(text: str) -> Tuple[int, int, str]:
+    """turn `top [N] [days] [+|-]` into a tuple like (N, days, rating)"""
+    numbers = [int(number) for number in days_pattern.findall(text)]
+    ratings = filter_pattern.findall(text)
+    return (
+        min(numbers[0], MAX_TOP_PEOPLE) if numbers else DEFAULT_TOP_PEOPLE,
+        numbers[1] if len(numbers) > 1 else DEFAULT_LOG_DAYS,
+        ratings[0] if ratings else Interaction.POSITIVE,
+    )
+
+
+def _logs_queryset(rater: Person, days: int, filter: Optional[str]) -> QuerySet:
+    """the rater's Interactions for the last `days`, newest first"""
     since = timezone.now() - timedelta(days=days)
     qs = (Interaction.objects.filter(rater=rater, created__gte=since)
           .order_by("-created"))
     if filter is not None:
         qs = qs.filter(rating=filter)
+    return qs
 
+
+def _slice(qs: QuerySet, offset: Optional[int], limit: Optional[int]) -> QuerySet:
+    """apply `offset` and `limit` to a queryset"""
     if limit is not None:
         offset = offset or 0
-        qs = qs[offset:offset + limit]
+        return qs[offset:offset + limit]
     elif offset is not None:
-        qs = qs[offset:]
-    return list(qs)
+        return qs[offset:]
+    return qs
+
+
+def retrieve_logs(rater: Person, days: int = DEFAULT_LOG_DAYS,
+                  filter: Optional[str] = None,
+                  offset: int = None, limit: int = None) -> List[LogRecord]:
+    """retrieve the log of Interactions and return as a list of LogRecords
+
+    the ratee is joined into the same query so rendering never goes back to the
+    database for each row. ratees without a stored display name fall back to the
+    in-process display name cache, then to their `user_id`"""
+    qs = _logs_queryset(rater, days, filter).values_list(
+        "ratee__user_id", "ratee__display_name", "rating", "created"
+    )
+    return [LogRecord(display_name or display_names.get(user_id, user_id), rating,
+                      created)
+            for user_id, display_name, rating, created in _slice(qs, offset, limit)]
 
 
 def retrieve_aggregated_logs(rater: Person, days: int = DEFAULT_LOG_DAYS,
@@ -150,8 +331,8 @@ def retrieve_aggregated_logs(rater: Person, days: int = DEFAULT_LOG_DAYS,
     """aggregate a list of interactions by person of period of time and return info on
     the interactions for that aggregation type. for example, return the number of
     positive and negative interations for each week in a time period"""
-    interactions = retrieve_logs(rater=rater, days=days, filter=filter,
-                                 offset=offset, limit=limit)
+    qs = _logs_queryset(rater, days, filter).select_related("ratee")
+    interactions = list(_slice(qs, offset, limit))
 
     def get_dd_int():
         return defaultdict(int)
@@ -164,7 +345,7 @@ def retrieve_aggregated_logs(rater: Person, days: int = DEFAULT_LOG_DAYS,
             elif interaction.rating == Interaction.NEGATIVE:
                 aggregated[interaction.ratee]["negative"] += 1
 
-    if aggregate == "time":
+    if aggregate == "time" and interactions:
         if days < 14:
             delta = 1
         elif days < 60:
@@ -192,14 +373,144 @@ def retrieve_aggregated_logs(rater: Person, days: int = DEFAULT_LOG_DAYS,
                 elif interaction.rating == Interaction.NEGATIVE:
                     aggregated[key]["negative"] += 1
 
-    return aggregated
+    # plain dicts, so the result can be pickled into the response cache
+    return {key: {"positive": stats["positive"], "negative": stats["negative"]}
+            for key, stats in aggregated.items()}
+
+
+def retrieve_top_people(rater: Person, count: int = DEFAULT_TOP_PEOPLE,
+                        days: int = DEFAULT_LOG_DAYS,
+                        rating: str = Interaction.POSITIVE) -> dict:
+    """the `count` people the rater has had the most `rating` interactions with in
+    the last `days`, most first, shaped like `retrieve_aggregated_logs` by person
+
+    the database counts interactions per ratee and a bounded heap picks the top
+    rows as they stream in, so raters with thousands of ratees are never loaded
+    into a list or sorted in full. grouping by `ratee_id` alone (the names are
+    the same in each group, so `Max` just picks them) lets the rows come straight
+    from the (rater, ratee, created, rating) index, in order and without a
+    temporary B-tree"""
+    since = timezone.now() - timedelta(days=days)
+    rank = "positive" if rating == Interaction.POSITIVE else "negative"
+    rows = (Interaction.objects.filter(rater=rater, created__gte=since)
+            .order_by()
+            .values("ratee_id")
+            .annotate(user_id=Max("ratee__user_id"),
+                      display_name=Max("ratee__display_name"),
+                      positive=Count("rating", filter=Q(rating=Interaction.POSITIVE)),
+                      negative=Count("rating", filter=Q(rating=Interaction.NEGATIVE)))
+            .filter(**{f"{rank}__gt": 0})
+            .values_list("user_id", "display_name", "positive", "negative"))
+    column = 2 if rank == "positive" else 3
+    top = heapq.nsmallest(count, rows.iterator(),
+                          key=lambda row: (-row[column], row[0]))
+    return {display_name or display_names.get(user_id, user_id):
+            {"positive": positive, "negative": negative}
+            for user_id, display_name, positive, negative in top}
+
+
+def retrieve_conversations(rater: Person, days: int = DEFAULT_LOG_DAYS,
+                           limit: int = CONVERSATIONS_SHOWN) -> List[Conversation]:
+    """the rater's latest `limit` conversations in the last `days`, newest first
+
+    the database groups the interactions by conversation and joins each group's
+    participants into one string, so one row comes back per conversation however
+    many people were in it. the rows come from a range of the (rater, created)
+    index and are grouped in a temporary B-tree: only `days` of one rater's
+    interactions, where walking the (rater, conversation) index would read them
+    all"""
+    since = timezone.now() - timedelta(days=days)
+    name = Case(When(ratee__display_name="", then=F("ratee__user_id")),
+                default=F("ratee__display_name"))
+    rows = (Interaction.objects.filter(rater=rater, created__gte=since)
+            .order_by()
+            .values("conversation")
+            .annotate(started=Min("created"),
+                      participants=GroupConcat(
+                          Concat("rating", name, output_field=CharField()),
+                          Value(PARTICIPANT_SEPARATOR)))
+            .order_by("-started")
+            .values_list("started", "participants")[:limit])
+    return [Conversation(started, [(display_names.get(participant[1:],
+                                                      participant[1:]),
+                                    participant[0])
+                                   for participant in participants.split(
+                                       PARTICIPANT_SEPARATOR)])
+            for started, participants in rows]
+
+
+def undo_last_conversation(rater_user_id: str) -> List[Tuple[str, str]]:
+    """delete the rater's most recently logged conversation and take its ratings
+    back out of the pair scores. returns the `(ratee, rating)`s undone, if any
+
+    the latest conversation is read from the (rater, created) index and deleted
+    with one DELETE on the (rater, conversation) index"""
+    def write():
+        rater = find_person(rater_user_id)
+        if rater is None:
+            return []
+        latest = (Interaction.objects.filter(rater=rater).order_by("-created")
+                  .values("conversation")[:1])
+        interactions = list(Interaction.objects.select_related("ratee")
+                            .filter(rater=rater, conversation=Subquery(latest)))
+        if not interactions:
+            return []
+        Interaction.objects.filter(
+            rater=rater, conversation=interactions[0].conversation).delete()
+        forget_ratings(interactions)
+        bump_data_version(rater)
+        return [(interaction.ratee.display_name
+                 or display_names.get(interaction.ratee.user_id,
+                                      interaction.ratee.user_id),
+                 interaction.rating)
+                for interaction in interactions]
+
+    return write_transaction(write)
 
 
 def clear_logs(rater_user_id: str) -> int:
     """clear the database of rater created Interactions"""
-    person = Person.objects.get(user_id=rater_user_id)
-    Interaction.objects.filter(rater=person).delete()
-    return Interaction.objects.filter(rater=person).count()
+    def write():
+        person = find_person(rater_user_id)
+        if person is None:
+            raise Person.DoesNotExist(rater_user_id)
+        Interaction.objects.filter(rater=person).delete()
+        PairScore.objects.filter(rater=person).delete()
+        bump_data_version(person)
+        return Interaction.objects.filter(rater=person).count()
+
+    return write_transaction(write)
+
+
+def _delete_chunk(interactions: QuerySet, chunk_size: int) -> int:
+    pks = list(interactions.values_list("pk", flat=True)[:chunk_size])
+    Interaction.objects.filter(pk__in=pks).delete()
+    return len(pks)
+
+
+def purge_person(person: Person, chunk_size: int = LOOKUP_BATCH_SIZE) -> int:
+    """delete every interaction `person` made or received, then the Person with its
+    pair scores and aliases. interactions go `chunk_size` per transaction, so other
+    writers get the lock in between. returns how many interactions were deleted"""
+    interactions = Interaction.objects.filter(Q(rater=person) | Q(ratee=person))
+    # the raters whose logs name the person, whose cached responses go stale
+    raters = list(Person.objects.filter(pk__in=Interaction.objects.filter(
+        ratee=person).exclude(rater=person).values("rater_id")))
+    deleted = 0
+    while True:
+        count = write_transaction(_delete_chunk, interactions, chunk_size)
+        deleted += count
+        if count < chunk_size:
+            break
+
+    def finish():
+        # and any logged since the last chunk
+        interactions.delete()
+        bump_data_version(*raters)
+        person.delete()
+
+    write_transaction(finish)
+    return deleted
 
 
 def do_create(rater_user_id: str, text: str) -> int:
@@ -208,13 +519,39 @@ def do_create(rater_user_id: str, text: str) -> int:
     return len(created)
 
 
-def do_logs(rater_user_id: str, text: str, limit: int = 5) -> Union[list, dict]:
+def do_logs(rater_user_id: str, text: str,
+            limit: int = 5) -> Union[List[LogRecord], dict]:
+    """logs or aggregates for the rater, served from the response cache until the
+    rater's interactions change"""
     log_request = parse_log_request_text(text)
-    rater, _ = Person.objects.get_or_create(user_id=rater_user_id)
-    if log_request[1] is None:
-        return retrieve_logs(rater=rater, days=log_request[0], filter=log_request[2],
-                             limit=limit)
-    else:
-        return retrieve_aggregated_logs(rater=rater, days=log_request[0],
-                                        aggregate=log_request[1],
-                                        filter=log_request[2], limit=limit)
+    rater = get_or_create_person(rater_user_id)
+
+    def compute():
+        if log_request[1] is None:
+            return retrieve_logs(rater=rater, days=log_request[0],
+                                 filter=log_request[2], limit=limit)
+        else:
+            return retrieve_aggregated_logs(rater=rater, days=log_request[0],
+                                            aggregate=log_request[1],
+                                            filter=log_request[2], limit=limit)
+
+    key = response_cache.key(rater, *log_request, limit)
+    return response_cache.get_or_compute(key, compute)
+
+
+def do_top(rater_user_id: str, count: int, days: int, rating: str) -> dict:
+    """the rater's top people, served from the response cache like `do_logs`"""
+    rater = get_or_create_person(rater_user_id)
+    key = response_cache.key(rater, "top", count, days, rating)
+    return response_cache.get_or_compute(
+        key, lambda: retrieve_top_people(rater, count, days, rating)
+    )
+
+
+def do_conversations(rater_user_id: str, days: int) -> List[Conversation]:
+    """the rater's conversations, served from the response cache like `do_logs`"""
+    rater = get_or_create_person(rater_user_id)
+    key = response_cache.key(rater, "conversations", days)
+    return response_cache.get_or_compute(
+        key, lambda: retrieve_conversations(rater, days)
+    )
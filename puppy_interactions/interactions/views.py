@@ -1,18 +1,75 @@
+import json
 import logging
+from abc import ABCMeta, abstractmethod
+from collections import defaultdict
+from math import ceil
+from typing import Optional
 
+from django.conf import settings
+from django.db import transaction
 from django.http.response import JsonResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import method_decorator
 from django.views.generic import View
 
+from puppy_interactions.interactions import api
+from puppy_interactions.interactions.caches import response_cache
 from puppy_interactions.interactions.exceptions import UnrecognizedCommandException
-from puppy_interactions.interactions.help_message import HELP_MESSAGE
+from puppy_interactions.interactions.handlers import (
+    UNRECOGNIZED_MESSAGE, ERROR_MESSAGE, handle_command, handle_batch
+)
+from puppy_interactions.interactions.idempotency import (
+    IDEMPOTENT_WRITE_COMMANDS, RETRY_HEADER, WRITE_COMMANDS, find_receipt,
+    receipt_keys
+)
+from puppy_interactions.interactions.models import Person
+from puppy_interactions.interactions.profiling import profiled
+from puppy_interactions.interactions.ratelimit import throttle
+from puppy_interactions.interactions.sharding import use_team_shard
+from puppy_interactions.interactions.sqlite import write_transaction
 from puppy_interactions.interactions.utils import (
-    parse_webhook_text, do_create, do_logs, clear_logs
+    DEFAULT_LOG_DAYS, DEFAULT_TOP_PEOPLE, MAX_TOP_PEOPLE, parse_webhook_text,
+    retrieve_aggregated_logs, retrieve_logs, retrieve_top_people
 )
+from puppy_interactions.interactions.warmup import STEPS, warm_up
 
 logger = logging.getLogger('puppy_interactions')
 
 
+def command_name(request) -> str:
+    """the slash command a request runs, for profiles"""
+    try:
+        return parse_webhook_text(request.POST.get("text") or "")
+    except UnrecognizedCommandException:
+        return "unrecognized"
+
+
+# fields a batch payload must have, and those it may have, as strings
+REQUIRED_FIELDS = ("user_id", "text")
+OPTIONAL_FIELDS = ("team_id", "enterprise_id", "trigger_id")
+
+
+def payload_error(payload: dict) -> Optional[str]:
+    """what's wrong with a batch payload's fields, if anything"""
+    for name in REQUIRED_FIELDS:
+        if not isinstance(payload.get(name), str):
+            return f"{name} must be a string"
+    for name in OPTIONAL_FIELDS:
+        if not isinstance(payload.get(name, ""), (str, type(None))):
+            return f"{name} must be a string"
+    return None
+
+
 class InteractionView(View):
+    # nothing before `handle_command` but a Slack retry's receipt lookup may touch
+    # the database, so throttled requests stay cheap - the transaction is opened
+    # there instead of per request
+    @method_decorator(transaction.non_atomic_requests)
+    def dispatch(self, request, *args, **kwargs):
+        return super().dispatch(request, *args, **kwargs)
+
+    @profiled(command_name)
     def post(self, request, *args, **kwargs):
         try:
             try:
@@ -20,56 +77,205 @@ class InteractionView(View):
                 rater_uid = f"@{request.POST.get('user_id')}"
                 command = parse_webhook_text(text)
             except UnrecognizedCommandException:
-                data = HELP_MESSAGE
-                data["text"] = "We don't know that one! Try these: "
-                return JsonResponse(data=data)
-
-            if command == "create":
-                created_count = do_create(rater_user_id=rater_uid, text=text)
-                data = {
-                    "response_type": "ephemeral",
-                    "text": f"We logged {created_count} interactions for you. Thanks!",
-                }
-
-            elif command == "logs":
-                logs = do_logs(rater_user_id=rater_uid, text=text)
-                if isinstance(logs, list):
-                    data = {"response_type": "ephemeral",
-                            "text": "These are some of your interaction logs!",
-                            "attachments": [{"text": str(interaction)}
-                                            for interaction in logs]}
-                    data["attachments"].append(
-                        {"text": "See more by adding an aggregation term"
-                                 " like `/interactions 90 person`."})
-                elif isinstance(logs, dict):
-                    data = {
-                        "response_type": "ephemeral",
-                        "text": "These are your aggregated interaction logs!",
-                        "attachments": [
-                            {"text": f"{key}:: *positive* {stats['positive']} / *negative* {stats['negative']}"}
-                            for key, stats in logs
-                        ]
-                    }
-                else:
-                    data = None
+                return JsonResponse(data=UNRECOGNIZED_MESSAGE)
 
-            elif command == "clear":
-                clear_logs(rater_user_id=rater_uid)
-                data = {"response_type": "ephemeral",
-                        "text": "You're all clear. Thanks!"}
+            keys = receipt_keys(request.POST, command)
+            if keys and request.META.get(RETRY_HEADER):
+                # a retry of a write already applied gets its stored answer
+                # without spending the budget the first attempt spent
+                with use_team_shard(request.POST.get("team_id"),
+                                    request.POST.get("enterprise_id")):
+                    receipt = find_receipt(*keys)
+                if receipt is not None:
+                    return JsonResponse(data=receipt)
 
-            elif command == "help":
-                data = HELP_MESSAGE
-
-            else:
-                data = None
+            wait = throttle(command, rater_uid)
+            if wait:
+                return JsonResponse(data={
+                    "response_type": "ephemeral",
+                    "text": f"Whoa, slow down! Try that again in {ceil(wait)} seconds."
+                })
 
+            with use_team_shard(request.POST.get("team_id"),
+                                request.POST.get("enterprise_id")) as alias:
+                if command in WRITE_COMMANDS + IDEMPOTENT_WRITE_COMMANDS:
+                    # retried from the top while the database is locked, receipt
+                    # and all
+                    data = write_transaction(handle_command, request.POST, command)
+                else:
+                    with transaction.atomic(using=alias):
+                        data = handle_command(request.POST, command)
             return JsonResponse(data=data)
 
         except Exception as e:
             logger.exception("InteractionsView Exception!")
-            return JsonResponse(data={"response_type": "ephemeral",
-                                      "text": "Sorry, that didn't work. :-( "})
+            return JsonResponse(data=ERROR_MESSAGE)
 
     def get(self, request, *args, **kwargs):
         return HttpResponse(status=200)
+
+
+class BatchInteractionView(View):
+    """
+    apply a JSON array of slash command payloads in one database session, for queue
+    driven and replay ingestion. answers `{"results": [...]}` with a result per
+    payload, in order (see `handle_batch`).
+
+    callers authenticate with `Authorization: Bearer <INTERACTIONS_BATCH_TOKEN>`;
+    the endpoint is disabled while that setting is empty. payloads are applied per
+    team shard (see `sharding`), in a transaction each.
+    """
+
+    @method_decorator(transaction.non_atomic_requests)
+    def dispatch(self, request, *args, **kwargs):
+        return super().dispatch(request, *args, **kwargs)
+
+    def post(self, request, *args, **kwargs):
+        token = settings.INTERACTIONS_BATCH_TOKEN
+        if not token or not constant_time_compare(
+                request.META.get("HTTP_AUTHORIZATION", ""), f"Bearer {token}"):
+            return JsonResponse(data={"error": "forbidden"}, status=403)
+
+        try:
+            payloads = json.loads(request.body.decode())
+        except ValueError:
+            payloads = None
+        if not isinstance(payloads, list) or not all(isinstance(p, dict)
+                                                     for p in payloads):
+            return JsonResponse(data={"error": "expected a JSON array of payloads"},
+                                status=400)
+        for index, payload in enumerate(payloads):
+            error = payload_error(payload)
+            if error:
+                return JsonResponse(data={"error": f"payload {index}: {error}"},
+                                    status=400)
+
+        teams = defaultdict(list)  # (team_id, enterprise_id) -> payload indexes
+        for index, payload in enumerate(payloads):
+            teams[payload.get("team_id"), payload.get("enterprise_id")].append(index)
+        results = [None] * len(payloads)
+        for (team_id, enterprise_id), indexes in teams.items():
+            with use_team_shard(team_id, enterprise_id):
+                team_results = write_transaction(handle_batch,
+                                                 [payloads[i] for i in indexes])
+            for index, result in zip(indexes, team_results):
+                results[index] = result
+        return JsonResponse(data={"results": results})
+
+
+class ReadAPIView(View, metaclass=ABCMeta):
+    """
+    a GET endpoint of the read API, see `api`. subclasses name the slash `command`
+    whose rate limit they share, read their query with `parse` and answer with
+    `compute`, which is cached in `response_cache` like the slash commands. a 304
+    costs one query, the rater's row by primary key, for its `data_version`.
+    """
+    command = None  # type: str
+
+    @method_decorator(transaction.non_atomic_requests)
+    def dispatch(self, request, *args, **kwargs):
+        return super().dispatch(request, *args, **kwargs)
+
+    @abstractmethod
+    def parse(self, query) -> dict:
+        """the keyword arguments for `compute`; raises ValueError on a bad query"""
+
+    @abstractmethod
+    def compute(self, rater: Person, **params) -> dict:
+        """the JSON response for the rater"""
+
+    def get(self, request, *args, **kwargs):
+        token = api.read_token(request.META.get("HTTP_AUTHORIZATION", ""))
+        if token is None:
+            return JsonResponse(data={"error": "unauthorized"}, status=401)
+        try:
+            params = self.parse(request.GET)
+        except ValueError as e:
+            return JsonResponse(data={"error": str(e)}, status=400)
+        wait = throttle(self.command, token.user_id)
+        if wait:
+            response = JsonResponse(data={"error": "rate limited"}, status=429)
+            response["Retry-After"] = str(ceil(wait))
+            return response
+
+        with use_team_shard(token.team_id, token.enterprise_id) as alias:
+            rater = Person.objects.filter(pk=token.person).first()
+            if rater is None:
+                # merged into someone else or purged since
+                return JsonResponse(data={"error": "unauthorized"}, status=401)
+            tag = api.etag(rater, request.get_full_path())
+            response = get_conditional_response(request, etag=tag)
+            if response is None:
+                key = response_cache.key(rater, "api", self.command, *params.values())
+                with transaction.atomic(using=alias):
+                    data = response_cache.get_or_compute(
+                        key, lambda: self.compute(rater, **params))
+                response = JsonResponse(data=data)
+        return api.cacheable(response, tag)
+
+
+class LogsAPIView(ReadAPIView):
+    """
+    `?days=30&rating=positive&limit=50&offset=0`: the rater's interactions, newest
+    first. with `aggregate=person` or `aggregate=time`, positive and negative
+    counts per person or per period instead, over the whole window.
+    """
+    command = "logs"
+
+    def parse(self, query) -> dict:
+        return {
+            "days": api.int_param(query, "days", DEFAULT_LOG_DAYS, 1, api.MAX_DAYS),
+            "aggregate": api.choice_param(query, "aggregate", ["person", "time"]),
+            "rating": api.rating_param(query),
+            "limit": api.int_param(query, "limit", 50, 1, api.MAX_LIMIT),
+            "offset": api.int_param(query, "offset", 0, 0, 10 ** 6),
+        }
+
+    def compute(self, rater: Person, days, aggregate, rating, limit, offset) -> dict:
+        if aggregate is None:
+            logs = retrieve_logs(rater, days=days, filter=rating, offset=offset,
+                                 limit=limit)
+            return {"days": days, "logs": api.logs_json(logs)}
+        totals = retrieve_aggregated_logs(rater, days=days, aggregate=aggregate,
+                                          filter=rating)
+        return {"days": days, "aggregate": aggregate,
+                "totals": api.totals_json(totals)}
+
+
+class TopAPIView(ReadAPIView):
+    """`?count=5&days=30&rating=positive`: the people the rater has had the most
+    interactions of that rating with, most first"""
+    command = "top"
+
+    def parse(self, query) -> dict:
+        return {
+            "count": api.int_param(query, "count", DEFAULT_TOP_PEOPLE, 1,
+                                   MAX_TOP_PEOPLE),
+            "days": api.int_param(query, "days", DEFAULT_LOG_DAYS, 1, api.MAX_DAYS),
+            "rating": api.rating_param(query, default="positive"),
+        }
+
+    def compute(self, rater: Person, count, days, rating) -> dict:
+        top = retrieve_top_people(rater, count=count, days=days, rating=rating)
+        return {"days": days, "rating": rating, "top": api.totals_json(top)}
+
+
+class WarmUpView(View):
+    """
+    do a cold container's setup (see `warmup`) and answer with what was warmed and
+    how long each step took, for keep-warm pings that should leave the container
+    ready for a slash command rather than just running. anyone can request it, so it
+    only warms the default database; `scheduled_warmup` warms every shard.
+    """
+
+    @method_decorator(transaction.non_atomic_requests)
+    def dispatch(self, request, *args, **kwargs):
+        return super().dispatch(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        steps = warm_up()
+        return JsonResponse(data={
+            "steps": [step._asdict() for step in steps],
+            "ms": round(sum(step.ms for step in steps), 1),
+            "complete": len(steps) == len(STEPS),
+        })
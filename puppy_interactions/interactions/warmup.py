@@ -0,0 +1,145 @@
+"""
+do a cold container's setup before the first slash command has to.
+
+`warm_up` syncs the database from its replica, opens the connection, runs the
+queries behind `logs`, `top` and `trend` once, matches every command pattern,
+loads display names into `caches.display_names` and fills the response cache for
+the most recently active raters. steps that touch the database do it for the
+default database, and from `scheduled_warmup` for every shard too (see
+`sharding.each_database`). it reports each step and how long it took, for
+`WarmUpView` and `scheduled_warmup`.
+"""
+import logging
+import time
+from typing import Callable, Iterator, List, NamedTuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from puppy_interactions.interactions import metrics, replication
+from puppy_interactions.interactions.caches import display_names
+from puppy_interactions.interactions.models import Interaction, Person
+from puppy_interactions.interactions.scores import retrieve_trend
+from puppy_interactions.interactions.sharding import each_database, use_shard
+from puppy_interactions.interactions.utils import (
+    DEFAULT_LOG_DAYS, do_logs, parse_webhook_text, retrieve_aggregated_logs,
+    retrieve_logs, retrieve_top_people, text_to_interaction_tuples
+)
+
+logger = logging.getLogger('puppy_interactions')
+
+# one of each command, so every pattern has been matched once
+SAMPLE_TEXTS = ["<@U2147483698> + <@U2147483699> -", "30 person +", "top 5 30 +",
+                "trend", "clear", "help"]
+
+
+class Step(NamedTuple):
+    name: str
+    ms: float
+    warmed: int  # step-specific count: queries run, names loaded, ...
+
+
+Databases = Callable[[], Iterator[str]]
+
+
+def default_database() -> Iterator[str]:
+    """route this app's queries to the default database, like `each_database` does
+    to each one in turn"""
+    with use_shard(DEFAULT_DB_ALIAS):
+        yield DEFAULT_DB_ALIAS
+
+
+def _timed(steps: List[Step], name: str, func: Callable[[Databases], int],
+           databases: Databases) -> None:
+    start = time.perf_counter()
+    warmed = func(databases)
+    steps.append(Step(name, round((time.perf_counter() - start) * 1000, 1), warmed))
+
+
+def _sync_database(databases: Databases) -> int:
+    """how many replicas were checked; missing or stale files are restored from
+    them"""
+    return sum(replication.prepare(alias) is not None for alias in databases())
+
+
+def _connect(databases: Databases) -> int:
+    count = 0
+    for alias in databases():
+        connections[alias].ensure_connection()
+        count += 1
+    return count
+
+
+def _recent_raters(count: int) -> List[Person]:
+    ids = (Interaction.objects.order_by("-created")
+           .values_list("rater_id", flat=True)[:count * 20])
+    unique = list(dict.fromkeys(ids))[:count]
+    return list(Person.objects.filter(guid__in=unique))
+
+
+def _run_queries(databases: Databases) -> int:
+    count = 0
+    for alias in databases():
+        raters = _recent_raters(1)
+        if not raters:
+            continue
+        rater = raters[0]
+        with transaction.atomic(using=alias):
+            retrieve_logs(rater, days=DEFAULT_LOG_DAYS, limit=5)
+            retrieve_aggregated_logs(rater, days=DEFAULT_LOG_DAYS, aggregate="person",
+                                     limit=5)
+            retrieve_top_people(rater)
+            retrieve_trend(rater)
+        count += 4
+    return count
+
+
+def _parse(databases: Databases) -> int:
+    for text in SAMPLE_TEXTS:
+        if parse_webhook_text(text) == "create":
+            text_to_interaction_tuples(text)
+    return len(SAMPLE_TEXTS)
+
+
+def _load_display_names(databases: Databases) -> int:
+    for _ in databases():
+        display_names.load(Person.objects.exclude(display_name="")
+                           .values_list("user_id", "display_name").iterator())
+    return len(display_names)
+
+
+def _prime_responses(databases: Databases) -> int:
+    count = 0
+    for alias in databases():
+        raters = _recent_raters(settings.INTERACTIONS_WARMUP_RATERS)
+        with transaction.atomic(using=alias):
+            for rater in raters:
+                do_logs(rater_user_id=rater.user_id, text="")
+        count += len(raters)
+    return count
+
+
+STEPS = [("database", _sync_database), ("connect", _connect),
+         ("queries", _run_queries), ("parsing", _parse),
+         ("display_names", _load_display_names), ("responses", _prime_responses)]
+
+
+def warm_up(databases: Databases = default_database) -> List[Step]:
+    """run every step in order against `databases`, stopping at the first that
+    fails"""
+    steps = []  # type: List[Step]
+    for name, func in STEPS:
+        try:
+            _timed(steps, name, func, databases)
+        except Exception:
+            logger.exception(f"Warm-up step {name} failed!")
+            metrics.incr("warmup.failed")
+            break
+    metrics.incr("warmup.runs")
+    return steps
+
+
+def scheduled_warmup(event=None, context=None) -> List[Step]:
+    """entry point for a Zappa scheduled event, see `zappa_settings.json` `events`.
+    unlike `WarmUpView`, which anyone can request, it warms every shard"""
+    return warm_up(each_database)